@@ -0,0 +1,201 @@
+import os
+import git
+import posixpath
+import hashlib
+import logging
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import List, Dict, Optional, Tuple, Iterator
+from dotenv import load_dotenv
+
+from app.utils import (
+    is_code_extension, is_binary_content, get_file_extension,
+    normalize_code, MAX_FILE_SIZE_BYTES
+)
+from app.clone_and_process import iter_commit_files, get_normalized_path
+from app.repository_layout import record_files
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Archives are uploaded to, or referenced from (e.g. a mounted volume), this directory
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.getcwd(), "archives"))
+ARCHIVE_UPLOAD_MAX_MB = int(os.getenv("ARCHIVE_UPLOAD_MAX_MB", "2048"))  # Largest /upload-archive body (0 = unbounded)
+
+# Archive suffixes and the reader handling them
+ARCHIVE_FORMATS = {
+    ".tar.gz": "tar",
+    ".tgz": "tar",
+    ".tar.bz2": "tar",
+    ".tar.xz": "tar",
+    ".tar": "tar",
+    ".zip": "zip",
+    ".bundle": "bundle",
+}
+
+def get_archive_format(archive_path: str) -> Optional[str]:
+    """Returns "tar", "zip" or "bundle" for a supported archive name, otherwise None."""
+    name = archive_path.lower()
+    for suffix, archive_format in ARCHIVE_FORMATS.items():
+        if name.endswith(suffix):
+            return archive_format
+    return None
+
+def get_archive_slug(archive_path: str) -> str:
+    """
+    Build a stable, filesystem-safe name for an archive.
+
+    The readable part is the file name without its archive suffix and the
+    suffix a hash of the resolved path, so dumps named alike never collide.
+    """
+    name = os.path.basename(archive_path)
+    for suffix in ARCHIVE_FORMATS:
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    name = "".join(c if c.isalnum() or c in "._-" else "-" for c in name) or "archive"
+    digest = hashlib.sha1(os.path.realpath(archive_path).encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{digest}"
+
+def resolve_archive_path(archive_path: str) -> str:
+    """
+    Resolve an archive reference to a file inside ARCHIVE_DIR.
+
+    Relative paths are taken relative to ARCHIVE_DIR; absolute paths must point
+    inside it, so the API cannot be used to read arbitrary files.
+
+    Raises:
+        ValueError: If the path is outside ARCHIVE_DIR, missing or not a supported archive.
+    """
+    root = os.path.realpath(ARCHIVE_DIR)
+    resolved = os.path.realpath(os.path.join(root, archive_path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Archive {archive_path} is outside {ARCHIVE_DIR}")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"Archive {archive_path} not found")
+    if get_archive_format(resolved) is None:
+        raise ValueError(
+            f"Unsupported archive {archive_path}, expected one of: {', '.join(ARCHIVE_FORMATS)}"
+        )
+    return resolved
+
+def clean_member_path(member_path: str) -> str:
+    """Normalize an archive member name, dropping "./" and leading slashes."""
+    return posixpath.normpath(member_path.replace("\\", "/")).lstrip("/")
+
+def is_code_member(member_path: str) -> bool:
+    """Checks whether a cleaned archive member name may be a code file, from its name alone."""
+    parts = member_path.split("/")
+    # Skip hidden directories and macOS resource forks, same as the working tree walk
+    if any(part.startswith(".") or part == "__MACOSX" for part in parts[:-1]):
+        return False
+    return is_code_extension(member_path)
+
+def iter_tar_members(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream the code files of a tarball in a single forward pass.
+
+    The archive is opened in stream mode, so compressed tarballs are never
+    seeked or unpacked to disk.
+    """
+    with tarfile.open(archive_path, "r|*") as tar:
+        for member in tar:
+            member_path = clean_member_path(member.name)
+            if not member.isfile() or not is_code_member(member_path):
+                continue
+            if member.size > MAX_FILE_SIZE_BYTES:
+                logger.warning(f"File {member_path} is too large (>1MB), skipping")
+                continue
+
+            data = tar.extractfile(member).read()
+            if is_binary_content(data):
+                continue
+            yield member_path, data
+
+def iter_zip_members(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """Stream the code files of a zip archive, decompressing one member at a time."""
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            member_path = clean_member_path(info.filename)
+            if info.is_dir() or not is_code_member(member_path):
+                continue
+            if info.file_size > MAX_FILE_SIZE_BYTES:
+                logger.warning(f"File {member_path} is too large (>1MB), skipping")
+                continue
+
+            # Never trust the declared size of a member
+            with archive.open(info) as f:
+                data = f.read(MAX_FILE_SIZE_BYTES + 1)
+            if len(data) > MAX_FILE_SIZE_BYTES or is_binary_content(data):
+                continue
+            yield member_path, data
+
+def iter_bundle_members(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream the code files of a git bundle's HEAD commit.
+
+    A bundle is a pack file, which git has to index before any object can be
+    read, so it is cloned bare into a temporary directory; no working tree is
+    checked out and the blobs are read from the object database.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        git.Git().clone("--bare", "--", archive_path, temp_dir)
+        with git.Repo(temp_dir) as repo:
+            try:
+                commit_sha = repo.head.commit.hexsha
+            except ValueError:
+                # Bundles created without HEAD: fall back to their first ref
+                commit_sha = repo.refs[0].commit.hexsha
+            yield from iter_commit_files(repo, commit_sha)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def iter_archive_files(archive_path: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream (member_path, data) for every valid, non-binary code file of an archive.
+
+    Raises:
+        ValueError: If the archive format is not supported.
+    """
+    archive_format = get_archive_format(archive_path)
+    if archive_format == "tar":
+        return iter_tar_members(archive_path)
+    if archive_format == "zip":
+        return iter_zip_members(archive_path)
+    if archive_format == "bundle":
+        return iter_bundle_members(archive_path)
+    raise ValueError(f"Unsupported archive {archive_path}")
+
+def extract_archive(archive_path: str, base_dir: str) -> Dict[str, List[str]]:
+    """
+    Write normalized copies of an archive's code files into base_dir.
+
+    Members are normalized straight from the archive stream; the raw files
+    are never written to disk.
+
+    Returns:
+        The normalized copy paths per file extension.
+    """
+    categorized_files = {}
+    archive_name = get_archive_slug(archive_path)
+
+    for member_path, data in iter_archive_files(archive_path):
+        new_file_path = get_normalized_path(base_dir, archive_name, member_path)
+        try:
+            normalized_code = normalize_code(data.decode('utf-8', errors='replace'), get_file_extension(member_path))
+            os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+            with open(new_file_path, 'w', encoding='utf-8') as f:
+                f.write(normalized_code)
+
+            categorized_files.setdefault(get_file_extension(member_path), []).append(new_file_path)
+        except Exception as e:
+            logger.error(f"Error processing file {member_path}: {str(e)}")
+
+    record_files(base_dir, added=[path for paths in categorized_files.values() for path in paths])
+    return categorized_files
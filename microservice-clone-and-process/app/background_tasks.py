@@ -11,6 +11,9 @@ logger = logging.getLogger(__name__)
 # Progress file path
 PROGRESS_FILE = os.path.join(os.getcwd(), "progress.json")
 
+# Guards the read-modify-write cycle on the progress file across worker threads
+_progress_lock = threading.RLock()
+
 # Initialize progress data
 def init_progress():
     progress_data = {
@@ -19,7 +22,8 @@ def init_progress():
         "total_files": 0,
         "current_file": "",
         "start_time": None,
-        "last_update": time.time()
+        "last_update": time.time(),
+        "repositories": {}
     }
     save_progress(progress_data)
     return progress_data
@@ -29,7 +33,9 @@ def load_progress() -> Dict:
     try:
         if os.path.exists(PROGRESS_FILE):
             with open(PROGRESS_FILE, 'r') as f:
-                return json.load(f)
+                progress_data = json.load(f)
+            progress_data.setdefault("repositories", {})
+            return progress_data
         else:
             return init_progress()
     except Exception as e:
@@ -46,30 +52,50 @@ def save_progress(progress_data: Dict):
 
 # Update progress
 def update_progress(status=None, processed_files=None, total_files=None, current_file=None):
-    progress_data = load_progress()
-    
-    if status is not None:
-        progress_data["status"] = status
-    if processed_files is not None:
-        progress_data["processed_files"] = processed_files
-    if total_files is not None:
-        progress_data["total_files"] = total_files
-    if current_file is not None:
-        progress_data["current_file"] = current_file
-    
-    # Update timestamp
-    progress_data["last_update"] = time.time()
-    
-    # Set start time if this is the beginning of a process
-    if status in ["cloning", "embedding"] and progress_data.get("start_time") is None:
-        progress_data["start_time"] = time.time()
-    
-    # Reset start time if process is complete
-    if status == "idle":
-        progress_data["start_time"] = None
-    
-    save_progress(progress_data)
-    return progress_data
+    with _progress_lock:
+        progress_data = load_progress()
+        
+        if status is not None:
+            progress_data["status"] = status
+        if processed_files is not None:
+            progress_data["processed_files"] = processed_files
+        if total_files is not None:
+            progress_data["total_files"] = total_files
+        if current_file is not None:
+            progress_data["current_file"] = current_file
+        
+        # Update timestamp
+        progress_data["last_update"] = time.time()
+        
+        # Set start time if this is the beginning of a process
+        if status in ["cloning", "embedding"] and progress_data.get("start_time") is None:
+            progress_data["start_time"] = time.time()
+        
+        # Reset start time if process is complete
+        if status == "idle":
+            progress_data["start_time"] = None
+        
+        save_progress(progress_data)
+        return progress_data
+
+# Update the per-repository entry of the progress data
+def update_repo_progress(repo_url: str, fields: Dict):
+    with _progress_lock:
+        progress_data = load_progress()
+        entry = progress_data["repositories"].setdefault(repo_url, {})
+        entry.update(fields)
+        entry["last_update"] = time.time()
+        progress_data["last_update"] = time.time()
+        save_progress(progress_data)
+        return progress_data
+
+# Clear the per-repository entries before a new clone job
+def reset_repo_progress(repo_urls: Optional[List[str]] = None):
+    with _progress_lock:
+        progress_data = load_progress()
+        progress_data["repositories"] = {url: {"status": "queued"} for url in (repo_urls or [])}
+        save_progress(progress_data)
+        return progress_data
 
 # Format time (seconds)
 def format_time(seconds):
@@ -81,8 +107,43 @@ def format_time(seconds):
     else:
         return f"{seconds / 3600:.1f} hours"
     
+def run_ingestion_pipeline(sources, reuse_embeddings: Optional[Dict[str, List[float]]] = None) -> Dict:
+    """
+    Stream sources through the staged ingestion pipeline into the shared vector store.
+    
+    Args:
+        sources: Iterable of pipeline sources (see app.pipeline).
+        reuse_embeddings: Vectors of retired chunks by chunk_hash, reused instead of embedding again.
+    
+    Returns:
+        The pipeline counters.
+    """
+    # Import here to avoid circular imports
+    from app.pipeline import IngestionPipeline
+    from app.main import vector_store
+    
+    update_progress(status="embedding", total_files=0, processed_files=0, current_file="Discovering files")
+    pipeline = IngestionPipeline(
+        vector_store,
+        progress_callback=lambda fields: update_progress(**fields),
+        reuse_embeddings=reuse_embeddings
+    )
+    stats = pipeline.run(sources)
+    logger.info(
+        f"Indexed {stats['indexed_chunks']} chunks ({stats['reused_chunks']} reused) from "
+        f"{stats['processed_files']} files in {format_time(stats['duration'])} ({stats['errors']} errors)"
+    )
+    return stats
+
 # Thread functions
-def run_clone_thread(repo_urls: Optional[List[str]] = None, embed: bool = True):
+def run_clone_thread(
+    repo_urls: Optional[List[str]] = None,
+    embed: bool = True,
+    clone_workers: Optional[int] = None,
+    clone_timeout: Optional[int] = None,
+    clone_strategy: Optional[str] = None,
+    source_mode: Optional[str] = None
+):
     """
     Thread function to handle repository cloning and embedding.
     """
@@ -91,51 +152,64 @@ def run_clone_thread(repo_urls: Optional[List[str]] = None, embed: bool = True):
         update_progress(status="cloning", current_file="Initializing")
         
         # Import here to avoid circular imports
-        from app.clone_and_process import clone_repositories
+        from app.clone_and_process import (
+            clone_repositories, get_repository_urls, create_directory_structure,
+            list_commit_entries, extract_changed_files, SOURCE_MODE
+        )
+        from app.mirror_cache import get_repository_slug
         from app.cleanup import cleanup_repositories
-        from app.utils import get_all_code_files
-        from app.codebert_embedder import create_code_embeddings
+        from app.utils import clear_binary_cache
+        from app.pipeline import file_source, iter_commit_sources
+        
+        # File classifications are memoized for the duration of this job only
+        clear_binary_cache()
         
         # Set repository URLs if provided
         if repo_urls:
             os.environ["GITHUB_REPOSITORIES"] = ",".join(repo_urls)
         
-        # Clone repositories
-        repo_paths = clone_repositories()
+        # Clone repositories, reporting each one in the progress data
+        reset_repo_progress(repo_urls or get_repository_urls())
+        results = clone_repositories(
+            repo_urls,
+            max_workers=clone_workers,
+            timeout=clone_timeout,
+            progress_callback=update_repo_progress,
+            strategy=clone_strategy,
+            source_mode=source_mode
+        )
+        cloned = [result for result in results if result["path"]]
+        repo_paths = [result["path"] for result in cloned]
         logger.info(f"Cloned {len(repo_paths)} repositories")
         
-        if embed:
-            # Count files for progress tracking
-            repos_dir = os.path.join(os.getcwd(), "repositories")
-            files = get_all_code_files(repos_dir)
-            total_files = len(files)
-            update_progress(total_files=total_files, current_file="Found code files")
-            
-            # Process embeddings
-            update_progress(status="embedding")
-            processed_files = 0
-            all_embeddings = []
-            
-            # Import vector_store here to avoid circular imports
-            from app.main import vector_store
-            
-            for file in files:
-                current = os.path.basename(file)
-                update_progress(current_file=current, processed_files=processed_files)
-                logger.info(f"Processing {current} ({processed_files}/{total_files})")
-                
-                # Create embeddings
-                file_embeddings = create_code_embeddings(file)
-                all_embeddings.extend(file_embeddings)
-                processed_files += 1
-                update_progress(processed_files=processed_files)
+        if (source_mode or SOURCE_MODE) == "objects":
+            # Bare clones: read blobs from the object database, never from extracted copies
+            import git
+            sources = []
+            for result in cloned:
+                with git.Repo(result["path"]) as repo:
+                    sources.append((result["path"], result["url"], repo.head.commit.hexsha))
             
-            # Add to vector store
-            if all_embeddings:
-                update_progress(current_file="Saving to vector store")
-                vector_store.add_embeddings(all_embeddings)
-                vector_store.save()
-                logger.info(f"Added {len(all_embeddings)} embeddings to vector store")
+            if embed:
+                run_ingestion_pipeline(
+                    source
+                    for repo_path, repo_url, commit_sha in sources
+                    for source in iter_commit_sources(repo_path, repo_url, commit_sha)
+                )
+            else:
+                # Without embedding, normalized copies are written from the objects directly
+                base_dir = create_directory_structure()
+                for repo_path, repo_url, commit_sha in sources:
+                    with git.Repo(repo_path) as repo:
+                        paths = [blob.path for blob in list_commit_entries(repo, commit_sha)]
+                        extract_changed_files(repo, commit_sha, paths, [], base_dir, get_repository_slug(repo_url))
+        elif embed:
+            # Tagged with their repository so incremental updates can find and retire them
+            run_ingestion_pipeline(
+                file_source(path, {"repo_url": result["url"]})
+                for result in cloned
+                for path in result["extracted"]
+            )
         
         # Clean up
         update_progress(current_file="Cleaning up")
@@ -151,6 +225,154 @@ def run_clone_thread(repo_urls: Optional[List[str]] = None, embed: bool = True):
         time.sleep(5)
         update_progress(status="idle")
 
+def run_incremental_thread(
+    repo_urls: Optional[List[str]] = None,
+    embed: bool = True,
+    clone_workers: Optional[int] = None,
+    clone_timeout: Optional[int] = None,
+    source_mode: Optional[str] = None
+):
+    """
+    Thread function to refresh repositories from their mirrors and re-embed only changed files.
+    """
+    try:
+        logger.info("Starting incremental repository update in thread")
+        update_progress(status="cloning", current_file="Fetching mirrors")
+        
+        # Import here to avoid circular imports
+        from app.clone_and_process import update_repositories, get_repository_urls, SOURCE_MODE
+        from app.mirror_cache import record_ingested_commit
+        from app.utils import clear_binary_cache
+        from app.pipeline import iter_commit_sources, file_source
+        
+        # File classifications are memoized for the duration of this job only
+        clear_binary_cache()
+        
+        urls = repo_urls or get_repository_urls()
+        def belongs_to(meta, repo_url):
+            return meta.get("repo_url") == repo_url
+        
+        missing_urls = set()
+        if embed:
+            from app.main import vector_store
+            # A repository the store holds nothing of is ingested whole, whatever was ingested before
+            missing_urls = {
+                url for url in urls if not vector_store.has_provenance(lambda meta: belongs_to(meta, url))
+            }
+        
+        reset_repo_progress(urls)
+        results = update_repositories(
+            repo_urls,
+            max_workers=clone_workers,
+            timeout=clone_timeout,
+            progress_callback=update_repo_progress,
+            source_mode=source_mode,
+            full_urls=missing_urls
+        )
+        updated = [result for result in results if result["status"] == "done"]
+        logger.info(f"Updated {len(updated)} of {len(results)} repositories")
+        
+        if embed and updated:
+            # Retire chunks of changed and deleted files before adding the new ones
+            retired = {path for result in updated for path in result["retired"]}
+            full_urls = [result["url"] for result in updated if result["full"]]
+            update_progress(current_file="Retiring stale embeddings")
+            def is_stale(meta):
+                return meta.get("file_path") in retired or any(belongs_to(meta, url) for url in full_urls)
+            
+            # Unchanged chunks of changed files get their vectors back instead of being re-embedded
+            reusable = vector_store.export_embeddings(is_stale)
+            removed = vector_store.remove_embeddings(is_stale)
+            logger.info(f"Retired {removed} stale embeddings")
+            
+            if (source_mode or SOURCE_MODE) == "objects":
+                # Changed blobs are streamed from the mirrors without extracted copies
+                sources = (
+                    source
+                    for result in updated
+                    for source in iter_commit_sources(
+                        result["path"], result["url"], result["commit"], result["changed"]
+                    )
+                )
+            else:
+                sources = (
+                    file_source(path, {"repo_url": result["url"]})
+                    for result in updated
+                    for path in result["files"]
+                )
+            stats = run_ingestion_pipeline(sources, reusable)
+            if removed and not stats["indexed_chunks"]:
+                vector_store.save()
+            
+            # Only now does the vector store reflect these commits
+            for result in updated:
+                record_ingested_commit(result["url"], result["commit"])
+        
+        update_progress(status="idle", current_file="Complete")
+        logger.info("Incremental update completed")
+    except Exception as e:
+        logger.error(f"Error in incremental update: {str(e)}")
+        update_progress(status="error", current_file=f"Error: {str(e)}")
+        # Reset after a few seconds
+        time.sleep(5)
+        update_progress(status="idle")
+
+def run_archive_thread(archive_paths: List[str], embed: bool = True):
+    """
+    Thread function to ingest tarballs, zip archives and git bundles.
+    """
+    try:
+        logger.info(f"Starting ingestion of {len(archive_paths)} archives in thread")
+        update_progress(status="cloning", current_file="Reading archives")
+
+        # Import here to avoid circular imports
+        from app.archive_sources import extract_archive
+        from app.clone_and_process import create_directory_structure
+        from app.utils import clear_binary_cache
+        from app.pipeline import iter_archive_sources
+
+        # File classifications are memoized for the duration of this job only
+        clear_binary_cache()
+
+        reset_repo_progress(archive_paths)
+        base_dir = create_directory_structure()
+
+        def sources():
+            # One unreadable archive is reported and skipped, the others are still ingested
+            for archive_path in archive_paths:
+                update_repo_progress(archive_path, {"status": "reading"})
+                try:
+                    yield from iter_archive_sources(archive_path, base_dir)
+                    update_repo_progress(archive_path, {"status": "done"})
+                except Exception as e:
+                    logger.error(f"Error reading archive {archive_path}: {str(e)}")
+                    update_repo_progress(archive_path, {"status": "failed", "error": str(e)})
+
+        if embed:
+            run_ingestion_pipeline(sources())
+        else:
+            # Without embedding, normalized copies are written from the archive members directly
+            for archive_path in archive_paths:
+                update_repo_progress(archive_path, {"status": "reading"})
+                try:
+                    files = extract_archive(archive_path, base_dir)
+                    update_repo_progress(archive_path, {
+                        "status": "done",
+                        "files": {ext: len(paths) for ext, paths in files.items()}
+                    })
+                except Exception as e:
+                    logger.error(f"Error reading archive {archive_path}: {str(e)}")
+                    update_repo_progress(archive_path, {"status": "failed", "error": str(e)})
+
+        update_progress(status="idle", current_file="Complete")
+        logger.info("Archive ingestion completed")
+    except Exception as e:
+        logger.error(f"Error in archive ingestion: {str(e)}")
+        update_progress(status="error", current_file=f"Error: {str(e)}")
+        # Reset after a few seconds
+        time.sleep(5)
+        update_progress(status="idle")
+
 def run_embedding_thread():
     """
     Thread function to handle embedding process.
@@ -159,48 +381,21 @@ def run_embedding_thread():
         logger.info("Starting embedding process in thread")
         
         # Import here to avoid circular imports
-        from app.utils import get_all_code_files
-        from app.codebert_embedder import create_code_embeddings
-        from app.main import vector_store
+        from app.utils import clear_binary_cache
+        from app.pipeline import iter_directory_sources
+        
+        # File classifications are memoized for the duration of this job only
+        clear_binary_cache()
         
-        # Count and collect code files for processing
         repositories_dir = os.path.join(os.getcwd(), "repositories")
-        all_code_files = get_all_code_files(repositories_dir)
-        total_files = len(all_code_files)
-        update_progress(total_files=total_files, current_file="Found code files")
-        
-        if total_files > 0:
-            # Process files individually to track progress
-            all_embeddings = []
-            for index, file_path in enumerate(all_code_files):
-                filename = os.path.basename(file_path)
-                logger.info(f"Processing file: {filename} ({index+1}/{total_files})")
-                update_progress(processed_files=index+1, current_file=filename)
-                
-                # Create embeddings for this file
-                file_embeddings = create_code_embeddings(file_path)
-                all_embeddings.extend(file_embeddings)
-                
-                # Log progress at certain intervals
-                if (index + 1) % 10 == 0 or (index + 1) == total_files:
-                    percentage = (index + 1) / total_files * 100
-                    logger.info(f"Progress: {index+1}/{total_files} files ({percentage:.1f}%)")
-            
-            # Save embeddings to vector store
-            if all_embeddings:
-                update_progress(current_file="Adding embeddings to vector store")
-                vector_store.add_embeddings(all_embeddings)
-                
-                update_progress(current_file="Saving vector store")
-                vector_store.save()
-                logger.info(f"Created embeddings for {len(all_embeddings)} code chunks")
-            else:
-                logger.warning("No embeddings were created")
-        else:
+        stats = run_ingestion_pipeline(iter_directory_sources(repositories_dir))
+        if not stats["total_files"]:
             logger.warning("No code files found to process")
+        elif not stats["indexed_chunks"]:
+            logger.warning("No embeddings were created")
         
         # Mark process as complete
-        update_progress(status="idle", processed_files=total_files, current_file="Complete")
+        update_progress(status="idle", processed_files=stats["processed_files"], current_file="Complete")
         logger.info("Embedding process completed successfully")
     except Exception as e:
         logger.error(f"Error in embedding process: {str(e)}")
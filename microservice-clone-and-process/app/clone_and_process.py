@@ -3,10 +3,21 @@ import git
 import tempfile
 import logging
 import shutil
-from typing import List, Dict
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable, Any, Tuple, Iterator, Set
 from dotenv import load_dotenv
 
-from app.utils import is_valid_code_file, get_file_extension, normalize_code
+from app.utils import (
+    is_valid_code_file, is_code_extension, is_binary_content,
+    get_file_extension, normalize_code, MAX_FILE_SIZE_BYTES
+)
+from app.repository_layout import get_layout_path, record_files
+from app.mirror_cache import (
+    sync_mirror, get_repository_slug, get_last_ingested_commit, diff_commits
+)
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +25,32 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Cloning configuration
+CLONE_WORKERS = int(os.getenv("CLONE_WORKERS", "4"))  # Repositories cloned and extracted concurrently
+CLONE_TIMEOUT = int(os.getenv("CLONE_TIMEOUT", "600"))  # Seconds before a single clone is killed
+CLONE_STRATEGY = os.getenv("CLONE_STRATEGY", "full")
+# "checkout" extracts normalized copies from a working tree, "objects" streams blobs
+# from a bare clone straight into normalization without writing any files
+SOURCE_MODE = os.getenv("SOURCE_MODE", "checkout")
+SOURCE_MODES = {"checkout", "objects"}
+# Extraction configuration: files are read, validated and normalized in a process pool
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # 1 extracts in-process
+EXTRACT_CHUNKSIZE = int(os.getenv("EXTRACT_CHUNKSIZE", "32"))  # Files sent to a worker per task
+
+# Shared by every repository extracted concurrently, so the process count stays at EXTRACT_WORKERS
+_extract_pool: Optional[ProcessPoolExecutor] = None
+_extract_pool_lock = threading.Lock()
+
+# git clone options per strategy. The pipeline only reads the working tree, so
+# history and oversized blobs can be left on the remote.
+CLONE_STRATEGIES = {
+    "full": {},
+    "shallow": {"depth": 1},  # --depth implies --single-branch
+    "single-branch": {"single_branch": True},
+    "partial": {"filter": f"blob:limit={MAX_FILE_SIZE_BYTES}"},
+    "shallow-partial": {"depth": 1, "filter": f"blob:limit={MAX_FILE_SIZE_BYTES}"},
+}
+
 def get_repository_urls() -> List[str]:
     """
     Retrieve repository URLs from the GITHUB_REPOSITORIES environment variable.
@@ -30,20 +67,48 @@ def create_directory_structure() -> str:
         os.makedirs(base_dir)
     return base_dir
 
-def clone_repository(repo_url: str) -> str:
+def get_clone_options(strategy: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Resolve a clone strategy name into git clone keyword options.
+    
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    strategy = strategy or CLONE_STRATEGY
+    if strategy not in CLONE_STRATEGIES:
+        raise ValueError(
+            f"Unknown clone strategy '{strategy}', expected one of: {', '.join(CLONE_STRATEGIES)}"
+        )
+    return dict(CLONE_STRATEGIES[strategy])
+
+def clone_repository(
+    repo_url: str,
+    timeout: Optional[int] = None,
+    strategy: Optional[str] = None,
+    bare: bool = False
+) -> str:
     """
     Clone a single GitHub repository into a temporary directory.
     
     Args:
         repo_url: The GitHub URL to clone.
+        timeout: Seconds after which the git process is killed (defaults to CLONE_TIMEOUT).
+        strategy: One of CLONE_STRATEGIES (defaults to CLONE_STRATEGY). Shallow and
+            partial clones need a file:// URL rather than a plain path for local repositories.
+            Partial clones skip historical blobs above MAX_FILE_SIZE_BYTES; blobs needed by
+            the checkout are still fetched.
+        bare: Clone without a working tree, for reading blobs from the object database.
         
     Returns:
         Path to the cloned repository, or None if failed.
     """
+    options = get_clone_options(strategy)
+    if bare:
+        options["bare"] = True
     temp_dir = tempfile.mkdtemp()
     try:
-        logger.info(f"Cloning repository: {repo_url}")
-        git.Repo.clone_from(repo_url, temp_dir)
+        logger.info(f"Cloning repository: {repo_url} ({strategy or CLONE_STRATEGY})")
+        git.Git().clone("--", repo_url, temp_dir, kill_after_timeout=CLONE_TIMEOUT if timeout is None else timeout, **options)
         return temp_dir
     except Exception as e:
         logger.error(f"Failed to clone repository {repo_url}: {str(e)}")
@@ -51,14 +116,91 @@ def clone_repository(repo_url: str) -> str:
         return None
 
 
+def get_normalized_path(base_dir: str, repo_name: str, rel_path: str) -> str:
+    """
+    Returns where the normalized copy of a repository file is stored.
+    
+    The name is flattened to <repo_name>_<relpath> inside the extension directory,
+    below its hashed shard directories unless REPOSITORY_LAYOUT is flat.
+    """
+    ext = get_file_extension(rel_path)
+    flat_name = rel_path.replace(os.sep, '_').replace('/', '_')
+    return get_layout_path(base_dir, ext, f"{repo_name}_{flat_name}")
+
+def get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the shared extraction process pool, creating it on first use.
+    
+    Workers are spawned rather than forked, since the service process holds
+    threads (and possibly a loaded model) that a fork would copy in an unsafe state.
+    """
+    global _extract_pool
+    if EXTRACT_WORKERS <= 1:
+        return None
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extract_pool
+
+def reset_extract_pool():
+    """Shut the extraction pool down; the next extraction starts a fresh one."""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False, cancel_futures=True)
+            _extract_pool = None
 
-def extract_code_files(repo_path: str, base_dir: str) -> Dict[str, List[str]]:
+def _extract_file(task: Tuple[str, str]) -> Optional[str]:
+    """
+    Validate, read, normalize and write one file. Runs inside an extraction worker.
+    
+    Args:
+        task: (source file path, normalized copy path).
+        
+    Returns:
+        The normalized copy path, or None when the file was skipped or failed.
+    """
+    file_path, new_file_path = task
+    if not is_valid_code_file(file_path, memoize=False):
+        return None
+
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            normalized_code = normalize_code(f.read(), get_file_extension(file_path))
+
+        os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+        with open(new_file_path, 'w', encoding='utf-8') as f:
+            f.write(normalized_code)
+        return new_file_path
+    except Exception as e:
+        logger.error(f"Error processing file {file_path}: {str(e)}")
+        return None
+
+def extract_code_files(repo_path: str, base_dir: str, repo_name: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Write normalized copies of a working tree's code files into base_dir.
+    
+    The tree is walked here and the per-file work is fanned out to the
+    extraction process pool in chunks of EXTRACT_CHUNKSIZE files.
+    
+    Args:
+        repo_path: The cloned working tree.
+        base_dir: Directory receiving the categorized, normalized files.
+        repo_name: Prefix of the normalized file names (defaults to the working tree's name).
+        
+    Returns:
+        The normalized copy paths per file extension.
+    """
     categorized_files = {}
     if not repo_path:
         return categorized_files
 
-    repo_name = os.path.basename(repo_path)
+    repo_name = repo_name or os.path.basename(repo_path)
 
+    tasks = []
     for root, _, files in os.walk(repo_path):
         # Skip hidden directories like .git
         if any(part.startswith('.') for part in root.split(os.sep)):
@@ -66,58 +208,425 @@ def extract_code_files(repo_path: str, base_dir: str) -> Dict[str, List[str]]:
 
         for file in files:
             file_path = os.path.join(root, file)
-            if not is_valid_code_file(file_path):
+            if not is_code_extension(file_path):
                 continue
+            rel_path = os.path.relpath(file_path, repo_path)
+            tasks.append((file_path, get_normalized_path(base_dir, repo_name, rel_path)))
 
-            ext = get_file_extension(file)
-            ext_dir = os.path.join(base_dir, ext)
-            os.makedirs(ext_dir, exist_ok=True)
+    # Repositories that fit in a single chunk are not worth the round trip to a worker
+    pool = get_extract_pool() if len(tasks) > EXTRACT_CHUNKSIZE else None
+    results = None
+    if pool is not None:
+        try:
+            results = list(pool.map(_extract_file, tasks, chunksize=max(1, EXTRACT_CHUNKSIZE)))
+        except Exception as e:
+            logger.error(f"Extraction pool failed, extracting {repo_name} in-process: {str(e)}")
+            reset_extract_pool()
+    if results is None:
+        results = [_extract_file(task) for task in tasks]
 
-            # Read and normalize the file content
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    normalized_code = normalize_code(f.read())
-                
-                rel_path = os.path.relpath(file_path, repo_path)
-                new_file_name = f"{repo_name}_{rel_path.replace(os.sep, '_')}"
-                new_file_path = os.path.join(ext_dir, new_file_name)
-
-                # Write normalized code
-                with open(new_file_path, 'w', encoding='utf-8') as f:
-                    f.write(normalized_code)
-
-                categorized_files.setdefault(ext, []).append(new_file_path)
-            except Exception as e:
-                logger.error(f"Error processing file {file_path}: {str(e)}")
+    for new_file_path in results:
+        if new_file_path:
+            categorized_files.setdefault(get_file_extension(new_file_path), []).append(new_file_path)
 
+    record_files(base_dir, added=[path for paths in categorized_files.values() for path in paths])
     return categorized_files
 
-def clone_repositories() -> List[str]:
+def clone_and_extract_repository(
+    repo_url: str,
+    base_dir: str,
+    timeout: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    strategy: Optional[str] = None,
+    source_mode: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    Clone all repositories defined in the environment and extract code files.
+    Clone one repository and extract its code files into base_dir.
+    
+    In "objects" source mode the repository is cloned bare and nothing is
+    extracted; its blobs are read later with iter_commit_files.
     
+    Args:
+        repo_url: The GitHub URL to clone.
+        base_dir: Directory receiving the categorized, normalized files.
+        timeout: Per-repository clone timeout in seconds.
+        progress_callback: Called with (repo_url, fields) on every state change.
+        strategy: Clone strategy name (see CLONE_STRATEGIES).
+        source_mode: "checkout" or "objects" (defaults to SOURCE_MODE).
+        
     Returns:
-        A list of local paths to successfully cloned repositories.
+        A result dict with the repository status, local path, file counts, the
+        normalized files to embed and error.
     """
-    repo_urls = get_repository_urls()
+    report = progress_callback or (lambda url, fields: None)
+    start = time.time()
+    result = {"url": repo_url, "status": "cloning", "path": None, "files": {}, "extracted": [], "error": None}
+    report(repo_url, {"status": "cloning"})
+
+    objects_mode = (source_mode or SOURCE_MODE) == "objects"
+    repo_path = clone_repository(repo_url, timeout=timeout, strategy=strategy, bare=objects_mode)
+    if not repo_path:
+        result.update(status="failed", error="Clone failed or timed out")
+        report(repo_url, {"status": "failed", "error": result["error"], "duration": time.time() - start})
+        return result
+
+    if objects_mode:
+        result.update(status="cloned", path=repo_path)
+        report(repo_url, {"status": "cloned", "duration": time.time() - start})
+        return result
+
+    result.update(status="extracting", path=repo_path)
+    report(repo_url, {"status": "extracting"})
+    try:
+        # Named like incremental updates name them, so those can retire these files' chunks
+        categorized = extract_code_files(repo_path, base_dir, get_repository_slug(repo_url))
+    except Exception as e:
+        logger.error(f"Failed to extract code files from {repo_url}: {str(e)}")
+        result.update(status="failed", error=str(e))
+        report(repo_url, {"status": "failed", "error": str(e), "duration": time.time() - start})
+        return result
+
+    for ext, files in categorized.items():
+        logger.info(f"Extracted {len(files)} {ext} files from {repo_url}")
+
+    result.update(
+        status="done",
+        files={ext: len(files) for ext, files in categorized.items()},
+        extracted=[path for files in categorized.values() for path in files]
+    )
+    report(repo_url, {
+        "status": "done",
+        "files": result["files"],
+        "duration": time.time() - start
+    })
+    return result
+
+def _run_per_repository(
+    worker: Callable[[str], Dict[str, Any]],
+    repo_urls: List[str],
+    workers: int
+) -> List[Dict[str, Any]]:
+    """Runs worker(url) for every repository on a bounded thread pool and collects the results."""
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clone") as executor:
+        futures = {executor.submit(worker, url): url for url in repo_urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Unexpected error processing repository {url}: {str(e)}")
+    return results
+
+def clone_repositories(
+    repo_urls: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    strategy: Optional[str] = None,
+    source_mode: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Clone all repositories and extract code files using a bounded worker pool.
+    
+    Each worker clones one repository and immediately extracts it, so the
+    extraction of one repository overlaps with the clones of the others and a
+    slow remote only occupies a single worker.
+    
+    Args:
+        repo_urls: URLs to clone (defaults to the GITHUB_REPOSITORIES environment variable).
+        max_workers: Number of concurrent clone workers (defaults to CLONE_WORKERS).
+        timeout: Per-repository clone timeout in seconds (defaults to CLONE_TIMEOUT).
+        progress_callback: Called with (repo_url, fields) whenever a repository changes state.
+        strategy: Clone strategy name (defaults to CLONE_STRATEGY).
+        source_mode: "checkout" extracts normalized files, "objects" only clones bare
+            repositories for iter_commit_files (defaults to SOURCE_MODE).
+    
+    Returns:
+        One result dict per repository (see clone_and_extract_repository).
+    """
+    repo_urls = repo_urls or get_repository_urls()
     if not repo_urls:
         logger.warning("No repository URLs found in environment variables")
         return []
 
+    get_clone_options(strategy)  # Fail fast on an unknown strategy
     base_dir = create_directory_structure()
-    cloned_paths = []
+    workers = max(1, min(max_workers or CLONE_WORKERS, len(repo_urls)))
+
+    logger.info(f"Cloning {len(repo_urls)} repositories with {workers} workers")
+    return _run_per_repository(
+        lambda url: clone_and_extract_repository(
+            url, base_dir, timeout, progress_callback, strategy, source_mode
+        ),
+        repo_urls,
+        workers
+    )
 
-    for url in repo_urls:
-        repo_path = clone_repository(url)
-        if not repo_path:
+def get_missing_blobs(repo: git.Repo, commit_sha: str) -> Set[str]:
+    """
+    Returns the blobs of a commit's tree that a partial clone filtered out.
+    
+    Asking for the size of such a blob would make git lazily fetch it, so they
+    are identified up front; they are all above the filter's size limit anyway.
+    """
+    try:
+        repo.git.config("--get", "remote.origin.partialclonefilter")
+    except git.GitCommandError:
+        return set()
+
+    listing = repo.git.rev_list("--objects", "--no-walk", "--missing=print", commit_sha)
+    return {line[1:].strip() for line in listing.splitlines() if line.startswith("?")}
+
+def list_commit_entries(
+    repo: git.Repo,
+    commit_sha: str = "HEAD",
+    paths: Optional[List[str]] = None
+) -> List[git.Blob]:
+    """
+    List the tree entries of a commit that may be code files, without reading any blob.
+    
+    Args:
+        repo: The (usually bare) repository holding the commit.
+        commit_sha: The commit whose tree is read.
+        paths: Only consider these paths (e.g. a diff); defaults to the whole tree.
+    """
+    tree = repo.commit(commit_sha).tree
+    if paths is None:
+        entries = (item for item in tree.traverse() if item.type == "blob")
+    else:
+        entries = []
+        for rel_path in paths:
+            try:
+                entries.append(tree / rel_path)
+            except KeyError:
+                logger.warning(f"{rel_path} not found in {commit_sha}")
+
+    return [
+        blob for blob in entries
+        # Skip hidden directories like .git, same as the working tree walk
+        if not any(part.startswith('.') for part in blob.path.split('/')[:-1])
+        and is_code_extension(blob.path)
+    ]
+
+def iter_commit_files(
+    repo: git.Repo,
+    commit_sha: str = "HEAD",
+    paths: Optional[List[str]] = None,
+    entries: Optional[List[git.Blob]] = None
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Stream the code files of a commit straight from the object database.
+    
+    Hidden directories, extensions and sizes are filtered on tree entries before
+    any blob content is read, so no working tree or temporary copy is needed.
+    
+    Args:
+        repo: The (usually bare) repository holding the commit.
+        commit_sha: The commit whose tree is read.
+        paths: Only read these paths (e.g. a diff); defaults to the whole tree.
+        entries: Entries already returned by list_commit_entries.
+    
+    Yields:
+        (rel_path, data) for every valid, non-binary code file.
+    """
+    if entries is None:
+        entries = list_commit_entries(repo, commit_sha, paths)
+    missing = get_missing_blobs(repo, repo.commit(commit_sha).hexsha)
+
+    for blob in entries:
+        if blob.hexsha in missing or blob.size > MAX_FILE_SIZE_BYTES:
+            logger.warning(f"File {blob.path} is too large (>1MB), skipping")
+            continue
+
+        try:
+            data = blob.data_stream.read()
+        except Exception as e:
+            logger.error(f"Error reading blob {blob.path}: {str(e)}")
+            continue
+        if is_binary_content(data):
+            continue
+
+        yield blob.path, data
+
+def extract_changed_files(
+    repo: git.Repo,
+    commit_sha: str,
+    changed: List[str],
+    deleted: List[str],
+    base_dir: str,
+    repo_name: str,
+    write: bool = True
+) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Extract changed files of a commit straight from a bare repository.
+    
+    Args:
+        repo: The (bare) repository holding the commit.
+        commit_sha: The commit to read file contents from.
+        changed: Paths added or modified since the last ingestion.
+        deleted: Paths removed since the last ingestion.
+        base_dir: Directory receiving the categorized, normalized files.
+        repo_name: Stable prefix for the normalized file names.
+        write: Write normalized copies; when False the changed files are only
+            filtered and left to be streamed again with iter_commit_files.
+    
+    Returns:
+        (categorized_files, retired_files): the normalized files written, and the
+        normalized paths whose previous embeddings are now stale.
+    """
+    categorized_files = {}
+    retired_files = []
+    removed_files = []
+
+    for rel_path in deleted:
+        if not is_code_extension(rel_path):
             continue
+        old_path = get_normalized_path(base_dir, repo_name, rel_path)
+        retired_files.append(old_path)
+        if os.path.exists(old_path):
+            os.remove(old_path)
+            removed_files.append(old_path)
+
+    # Changed files always retire their previous chunks, even if now skipped
+    retired_files.extend(
+        get_normalized_path(base_dir, repo_name, rel_path)
+        for rel_path in changed if is_code_extension(rel_path)
+    )
+    if not write:
+        record_files(base_dir, removed=removed_files)
+        return categorized_files, retired_files
+
+    for rel_path, data in iter_commit_files(repo, commit_sha, changed):
+        new_file_path = get_normalized_path(base_dir, repo_name, rel_path)
+        try:
+            normalized_code = normalize_code(data.decode('utf-8', errors='replace'), get_file_extension(rel_path))
+            os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+            with open(new_file_path, 'w', encoding='utf-8') as f:
+                f.write(normalized_code)
+
+            categorized_files.setdefault(get_file_extension(rel_path), []).append(new_file_path)
+        except Exception as e:
+            logger.error(f"Error processing file {rel_path}: {str(e)}")
+
+    record_files(
+        base_dir,
+        added=[path for paths in categorized_files.values() for path in paths],
+        removed=removed_files
+    )
+    return categorized_files, retired_files
+
+def update_repository(
+    repo_url: str,
+    base_dir: str,
+    timeout: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    source_mode: Optional[str] = None,
+    full: bool = False
+) -> Dict[str, Any]:
+    """
+    Fetch a repository into its mirror and extract only what changed since the last ingestion.
+    
+    Args:
+        repo_url: The repository URL.
+        base_dir: Directory receiving the categorized, normalized files.
+        timeout: Per-repository fetch timeout in seconds.
+        progress_callback: Called with (repo_url, fields) on every state change.
+        source_mode: In "objects" mode nothing is written; the changed paths are
+            returned under "changed" to be streamed from the mirror at "path".
+        full: Extract the whole tree even if a commit was ingested before, e.g. when
+            the vector store no longer holds the repository.
+    
+    Returns:
+        A result dict with the repository status, the ingested commit, the normalized
+        files to embed, the normalized paths to retire and whether the ingestion was full.
+    """
+    report = progress_callback or (lambda url, fields: None)
+    start = time.time()
+    result = {
+        "url": repo_url, "status": "fetching", "path": None, "commit": None, "files": [],
+        "changed": [], "retired": [], "full": False, "error": None
+    }
+    report(repo_url, {"status": "fetching"})
+
+    try:
+        repo = sync_mirror(repo_url, timeout=CLONE_TIMEOUT if timeout is None else timeout)
+        head = repo.head.commit.hexsha
+        last = None if full else get_last_ingested_commit(repo_url)
+        result.update(commit=head, path=repo.git_dir)
 
-        cloned_paths.append(repo_path)
-        categorized = extract_code_files(repo_path, base_dir)
-        for ext, files in categorized.items():
-            logger.info(f"Extracted {len(files)} {ext} files from {url}")
+        if head == last:
+            result.update(status="unchanged")
+            report(repo_url, {"status": "unchanged", "commit": head, "duration": time.time() - start})
+            return result
+
+        result["status"] = "extracting"
+        report(repo_url, {"status": "extracting", "commit": head})
+        changed, deleted, full = diff_commits(repo, last, head)
+        categorized, retired = extract_changed_files(
+            repo, head, changed, deleted, base_dir, get_repository_slug(repo_url),
+            write=(source_mode or SOURCE_MODE) != "objects"
+        )
+    except Exception as e:
+        logger.error(f"Failed to update repository {repo_url}: {str(e)}")
+        result.update(status="failed", error=str(e))
+        report(repo_url, {"status": "failed", "error": str(e), "duration": time.time() - start})
+        return result
+
+    result.update(
+        status="done",
+        files=[path for files in categorized.values() for path in files],
+        changed=changed,
+        retired=retired,
+        full=full
+    )
+    report(repo_url, {
+        "status": "done",
+        "commit": head,
+        "previous_commit": last,
+        "changed_files": len(changed),
+        "deleted_files": len(deleted),
+        "files": {ext: len(files) for ext, files in categorized.items()},
+        "duration": time.time() - start
+    })
+    return result
+
+def update_repositories(
+    repo_urls: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[int] = None,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    source_mode: Optional[str] = None,
+    full_urls: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Incrementally refresh all repositories from their persistent mirrors.
+    
+    Args:
+        repo_urls: URLs to refresh (defaults to the GITHUB_REPOSITORIES environment variable).
+        max_workers: Number of concurrent fetch workers (defaults to CLONE_WORKERS).
+        timeout: Per-repository fetch timeout in seconds (defaults to CLONE_TIMEOUT).
+        progress_callback: Called with (repo_url, fields) whenever a repository changes state.
+        source_mode: "checkout" or "objects" (defaults to SOURCE_MODE).
+        full_urls: Repositories whose whole tree is extracted regardless of the last ingested commit.
+    
+    Returns:
+        One result dict per repository (see update_repository).
+    """
+    repo_urls = repo_urls or get_repository_urls()
+    if not repo_urls:
+        logger.warning("No repository URLs found in environment variables")
+        return []
+
+    base_dir = create_directory_structure()
+    workers = max(1, min(max_workers or CLONE_WORKERS, len(repo_urls)))
 
-    return cloned_paths
+    logger.info(f"Updating {len(repo_urls)} repositories with {workers} workers")
+    return _run_per_repository(
+        lambda url: update_repository(url, base_dir, timeout, progress_callback, source_mode, url in (full_urls or ())),
+        repo_urls,
+        workers
+    )
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
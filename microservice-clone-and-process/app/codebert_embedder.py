@@ -1,12 +1,24 @@
 import os
+import re
+import time
+import bisect
+import hashlib
 import logging
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import numpy as np
 import torch
-from transformers import AutoTokenizer, AutoModel
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 
 from dotenv import load_dotenv
-from app.utils import get_all_code_files, chunk_code, num_tokens_from_string
+from app.utils import (
+    get_all_code_files, chunk_code, chunk_token_spans, content_defined_spans,
+    count_line_tokens, normalize_code, get_file_extension
+)
+from app.structural_chunking import split_units
+from app.inference_backend import load_encoder, get_embedding_space, Encoder
+from app.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.embedding_pool import EmbeddingPool, get_api_threads
 
 # Load environment variables
 load_dotenv()
@@ -18,98 +30,591 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = os.getenv("EMBEDDING_MODEL", "microsoft/codebert-base")
 MAX_TOKENS_PER_CHUNK = int(os.getenv("MAX_TOKENS_PER_CHUNK", "510"))  # CodeBERT has 512 token limit (including special tokens)
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+CHUNK_MODE = os.getenv("CHUNK_MODE", "tokens")  # "tokens", "structural" (one chunk per function/class) or "content"
+CDC_MIN_TOKENS = int(os.getenv("CDC_MIN_TOKENS", "256"))  # Content-defined chunks: no boundary before this many tokens
+CDC_BOUNDARY_BITS = int(os.getenv("CDC_BOUNDARY_BITS", "3"))  # Past the minimum, a boundary every ~2**bits lines
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # Max chunks per forward pass
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8192"))  # Max padded tokens per forward pass
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
-# Initialize tokenizer and model
-try:
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModel.from_pretrained(MODEL_NAME).to(DEVICE)
-    model.eval()  # Set model to evaluation mode
-    logger.info(f"Loaded CodeBERT model {MODEL_NAME} on {DEVICE}")
-except Exception as e:
-    logger.error(f"Failed to load CodeBERT model: {str(e)}")
-    tokenizer = None
-    model = None
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_embedding(text: str) -> List[float]:
+# Leave the cores of the embedding processes to them
+if get_api_threads():
+    torch.set_num_threads(get_api_threads())
+
+EMBEDDING_MODEL_OFFLINE = os.getenv("EMBEDDING_MODEL_OFFLINE", "false").lower() == "true"  # Never download the model
+# sha256sum-style manifest verified before a local model directory is loaded (default: SHA256SUMS inside it)
+EMBEDDING_MODEL_CHECKSUMS = os.getenv("EMBEDDING_MODEL_CHECKSUMS")
+WARM_UP_CODE = "def warm_up(items):\n    return [item for item in items if item]"
+
+class ModelNotReadyError(RuntimeError):
+    """The model is still loading or failed to load."""
+
+# Loaded by load_model, on first use or in the background at startup
+tokenizer = None
+model = None
+encoder = None
+INFERENCE_BACKEND = None
+_model_lock = threading.Lock()
+_model_status = {"status": "not_loaded", "error": None, "timings": {}}
+
+def _verify_model_checksums(model_dir: str, manifest_path: str):
     """
-    Retrieve an embedding for the given code text using CodeBERT.
+    Check the files of a model directory against a sha256sum manifest.
+    
+    Raises:
+        ValueError: If a listed file is missing or its checksum differs.
     """
-    if tokenizer is None or model is None:
-        logger.error("CodeBERT model not initialized correctly.")
-        return []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = [line.split(None, 1) for line in f if line.strip()]
+    if not entries:
+        raise ValueError(f"Checksum manifest {manifest_path} is empty")
 
-    try:
-        # Truncate text if too long (optional, as chunking should handle this)
+    for expected, name in entries:
+        file_path = os.path.join(model_dir, name.strip().lstrip('*'))
+        if not os.path.exists(file_path):
+            raise ValueError(f"Model file {file_path} listed in {manifest_path} is missing")
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        if digest.hexdigest() != expected.lower():
+            raise ValueError(f"Checksum mismatch for model file {file_path}")
+    logger.info(f"Verified {len(entries)} model files against {manifest_path}")
+
+def load_model() -> bool:
+    """
+    Load the tokenizer, model and inference backend, then run a warm-up inference.
+    
+    Loads once: concurrent callers wait for the first one, and later calls
+    return right away. A failure is kept (see get_model_status) rather than
+    retried on every call. The time taken by each step is recorded.
+    
+    Returns:
+        Whether the model is ready.
+    """
+    global tokenizer, model, encoder, INFERENCE_BACKEND
+    with _model_lock:
+        if _model_status["status"] in ("ready", "failed"):
+            return _model_status["status"] == "ready"
+        _model_status["status"] = "loading"
+        timings = _model_status["timings"]
+        start = time.perf_counter()
+        step = start
+
+        def lap(name: str):
+            nonlocal step
+            now = time.perf_counter()
+            timings[name] = round(now - step, 3)
+            step = now
+
+        try:
+            # Import here, it is slow and only needed to load the model
+            from transformers import AutoTokenizer, AutoModel
+            lap("import")
+
+            if os.path.isdir(MODEL_NAME):
+                manifest = EMBEDDING_MODEL_CHECKSUMS or os.path.join(MODEL_NAME, "SHA256SUMS")
+                if EMBEDDING_MODEL_CHECKSUMS or os.path.exists(manifest):
+                    _verify_model_checksums(MODEL_NAME, manifest)
+                    lap("verify_checksums")
+            elif EMBEDDING_MODEL_CHECKSUMS:
+                raise ValueError("EMBEDDING_MODEL_CHECKSUMS needs EMBEDDING_MODEL to be a local model directory")
+
+            loaded_tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, local_files_only=EMBEDDING_MODEL_OFFLINE)
+            lap("tokenizer")
+            loaded_model = AutoModel.from_pretrained(MODEL_NAME, local_files_only=EMBEDDING_MODEL_OFFLINE).to(DEVICE)
+            loaded_model.eval()  # Set model to evaluation mode
+            lap("model")
+            logger.info(f"Loaded CodeBERT model {MODEL_NAME} on {DEVICE}")
+            tokenizer, model = loaded_tokenizer, loaded_model
+            encoder, INFERENCE_BACKEND = load_encoder(model, MODEL_NAME, DEVICE)
+            lap("backend")
+            logger.info(f"Running inference with the {INFERENCE_BACKEND} backend")
+
+            # The first forward pass allocates buffers and picks kernels; pay for it now
+            _embed_id_batches(_text_ids([WARM_UP_CODE]))
+            lap("warm_up")
+            _model_status["status"] = "ready"
+        except Exception as e:
+            logger.error(f"Failed to load CodeBERT model: {str(e)}")
+            tokenizer = None
+            model = None
+            encoder = None
+            INFERENCE_BACKEND = None
+            _model_status["status"] = "failed"
+            _model_status["error"] = str(e)
+        timings["total"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Model load {_model_status['status']} in {timings['total']}s: {timings}")
+        return _model_status["status"] == "ready"
+
+def _require_model():
+    """Load the model if needed, raising ModelNotReadyError if it cannot be loaded."""
+    if _model_status["status"] != "ready" and not load_model():
+        raise ModelNotReadyError(f"CodeBERT model could not be loaded: {_model_status['error']}")
+
+def is_model_ready() -> bool:
+    """Whether the model is loaded, without loading it."""
+    return _model_status["status"] == "ready"
+
+def get_model_status() -> Dict[str, Any]:
+    """Load status of the model (not_loaded, loading, ready or failed), its error and step timings in seconds."""
+    return {
+        "status": _model_status["status"],
+        "model_name": MODEL_NAME,
+        "device": DEVICE,
+        "backend": INFERENCE_BACKEND,
+        "offline": EMBEDDING_MODEL_OFFLINE,
+        "error": _model_status["error"],
+        "timings": dict(_model_status["timings"])
+    }
+
+# Vectors of different precisions never share chunk hashes or an index
+EMBEDDING_SPACE = get_embedding_space(MODEL_NAME)
+
+def _batch_by_length(lengths: List[int]) -> List[List[int]]:
+    """
+    Group input indices into batches of similar length.
+    
+    Inputs are sorted by length, and a batch is closed when it has
+    EMBED_BATCH_SIZE inputs or when padding all of them to the longest one
+    would exceed EMBED_BATCH_TOKENS tokens.
+    """
+    batches = []
+    batch = []
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        # Sorted ascending, so the new input is the longest of the batch
+        if batch and (len(batch) >= EMBED_BATCH_SIZE or (len(batch) + 1) * lengths[index] > EMBED_BATCH_TOKENS):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _embed_id_batches(id_lists: List[List[int]], encode: Optional[Encoder] = None) -> np.ndarray:
+    """
+    Embed inputs that are already tokenized (with special tokens), in length-bucketed batches.
+    
+    Args:
+        id_lists: Token ids per input.
+        encode: The encoder to run (defaults to the configured backend).
+    
+    Returns:
+        The normalized [CLS] embeddings as a float32 matrix, in input order.
+    """
+    encode = encode or encoder
+    embeddings = np.zeros((len(id_lists), model.config.hidden_size), dtype=np.float32)
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+    for batch in _batch_by_length([len(ids) for ids in id_lists]):
+        # Pad only to the longest input of this batch
+        max_length = len(id_lists[batch[-1]])
+        input_ids = np.full((len(batch), max_length), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch), max_length), dtype=np.int64)
+        for row, index in enumerate(batch):
+            ids = id_lists[index]
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+
+        # Use the [CLS] token embedding as the code representation, normalized for inner product search
+        cls = encode(input_ids, attention_mask)
+        norms = np.linalg.norm(cls, axis=1, keepdims=True)
+        embeddings[batch] = cls / np.maximum(norms, 1e-12)
+
+    return embeddings
+
+def _text_ids(texts: List[str]) -> List[List[int]]:
+    """
+    Tokenize texts for the model, truncated to the window chunks are cut to
+    (MAX_TOKENS_PER_CHUNK plus the special tokens); the caller's list is left as it is.
+    """
+    truncated = []
+    for text in texts:
         if len(text) > 10000:  # Arbitrary limit to prevent very long texts
             logger.warning(f"Text too long ({len(text)} chars), truncating")
             text = text[:10000]
-        
-        # Tokenize and get model inputs
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, 
-                          max_length=MAX_TOKENS_PER_CHUNK, padding=True)
-        inputs = {key: val.to(DEVICE) for key, val in inputs.items()}
-        
-        # Get embeddings with no gradient calculation needed
-        with torch.no_grad():
-            outputs = model(**inputs)
-            
-        # Use the [CLS] token embedding as the code representation
-        embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()[0]
-        
-        # Convert to standard Python list and normalize (optional)
-        embedding_list = embeddings.tolist()
-        
-        # Normalize the embedding 
-        norm = torch.norm(torch.tensor(embedding_list), p=2).item()
-        if norm > 0:
-            embedding_list = [x / norm for x in embedding_list]
-            
-        return embedding_list
+        truncated.append(text)
+    texts = truncated
+    if not texts:
+        return []
+    max_length = MAX_TOKENS_PER_CHUNK + tokenizer.num_special_tokens_to_add()
+    return tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+
+def _chunk_ids(input_ids: List[int]) -> List[int]:
+    """Wrap the token ids of a chunk in the model's special tokens."""
+    return [tokenizer.cls_token_id] + list(input_ids[:MAX_TOKENS_PER_CHUNK]) + [tokenizer.sep_token_id]
+
+def _embed_cached(
+    texts: List[str],
+    kind: str,
+    to_ids: Callable[[List[int]], List[List[int]]],
+    pool: Optional[EmbeddingPool] = None
+) -> np.ndarray:
+    """
+    Embed inputs through the persistent embedding cache.
+    
+    Only the inputs missing from the cache are tokenized and run through the
+    model, and their vectors are stored for next time.
+    
+    Args:
+        texts: The text of each input, which the cache is keyed by.
+        kind: How the inputs are tokenized ("ids" for chunks carrying their own
+            token ids, "text" for raw texts), since the two can differ for the same text.
+        to_ids: Returns the token ids (with special tokens) of the inputs at the given indices.
+        pool: Embedding processes to run the model on instead of this process.
+    
+    Returns:
+        A float32 matrix with one normalized embedding per input, in input order.
+    """
+    def embed(id_lists: List[List[int]]) -> np.ndarray:
+        return pool.embed(id_lists, model.config.hidden_size) if pool else _embed_id_batches(id_lists)
+
+    cache = get_embedding_cache()
+    if cache is None:
+        return embed(to_ids(list(range(len(texts)))))
+
+    config = f"{EMBEDDING_SPACE}|{MAX_TOKENS_PER_CHUNK}|{kind}"
+    keys = [EmbeddingCache.make_key(config, text) for text in texts]
+    cached = cache.get_many(keys)
+    embeddings = np.zeros((len(texts), model.config.hidden_size), dtype=np.float32)
+    misses = []
+    for i, key in enumerate(keys):
+        if key in cached:
+            embeddings[i] = cached[key]
+        else:
+            misses.append(i)
+
+    if misses:
+        embeddings[misses] = embed(to_ids(misses))
+        cache.put_many({keys[i]: embeddings[i] for i in misses})
+    return embeddings
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    retry=retry_if_not_exception_type(ModelNotReadyError)
+)
+def get_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Retrieve embeddings for many code texts at once.
+    
+    The texts are tokenized together, sorted by token length and run through
+    the model in batches padded only to their own longest text, so short
+    chunks do not pay for long ones.
+    
+    Returns:
+        A float32 matrix with one normalized embedding per text, in input order.
+    
+    Raises:
+        ModelNotReadyError: If the model cannot be loaded.
+    """
+    _require_model()
+
+    try:
+        return _embed_cached(texts, "text", lambda indices: _text_ids([texts[i] for i in indices]))
     except Exception as e:
         logger.error(f"Embedding request failed: {str(e)}")
         raise
 
-def create_code_embeddings(file_path: str) -> List[Dict[str, Any]]:
+def get_embedding(text: str) -> List[float]:
     """
-    Generate embeddings for the content of a given code file.
+    Retrieve an embedding for the given code text using CodeBERT.
     """
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
-        return []
+    return get_embeddings([text])[0].tolist()
+
+def get_embedding_from_ids(input_ids: List[int]) -> List[float]:
+    """
+    Retrieve an embedding for a chunk that is already tokenized, without tokenizing it again.
+    
+    Args:
+        input_ids: Token ids of the chunk without special tokens, at most MAX_TOKENS_PER_CHUNK.
+    """
+    return embed_chunks([{"input_ids": input_ids}])[0].tolist()
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    retry=retry_if_not_exception_type(ModelNotReadyError)
+)
+def embed_chunks(
+    chunks: List[Dict[str, Any]],
+    reuse_embeddings: Optional[Dict[str, List[float]]] = None,
+    pool: Optional[EmbeddingPool] = None
+) -> np.ndarray:
+    """
+    Embed chunks from split_code in batches, reusing their token ids when they have them.
+    
+    Args:
+        chunks: The chunks.
+        reuse_embeddings: Existing vectors by chunk_hash; chunks found here are not embedded again.
+        pool: Embedding processes to run the model on (see get_embedding_pool); defaults to this process.
+    
+    Returns:
+        A float32 matrix with one normalized embedding per chunk, in input order.
+    
+    Raises:
+        ModelNotReadyError: If the model cannot be loaded.
+    """
+    _require_model()
 
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            code = f.read()
+        embeddings = np.zeros((len(chunks), model.config.hidden_size), dtype=np.float32)
+        pending = []
+        for i, chunk in enumerate(chunks):
+            if reuse_embeddings and chunk.get("chunk_hash") in reuse_embeddings:
+                embeddings[i] = reuse_embeddings[chunk["chunk_hash"]]
+            else:
+                pending.append(i)
+
+        with_ids = [i for i in pending if chunks[i].get("input_ids") is not None]
+        without_ids = [i for i in pending if chunks[i].get("input_ids") is None]
+        if with_ids:
+            embeddings[with_ids] = _embed_cached(
+                # Chunks tokenized by the caller may come without their text
+                [chunks[i].get("text") or ",".join(map(str, chunks[i]["input_ids"])) for i in with_ids], "ids",
+                lambda indices: [_chunk_ids(chunks[with_ids[j]]["input_ids"]) for j in indices], pool
+            )
+        if without_ids:
+            embeddings[without_ids] = _embed_cached(
+                [chunks[i]["text"] for i in without_ids], "text",
+                lambda indices: _text_ids([chunks[without_ids[j]]["text"] for j in indices]), pool
+            )
+        return embeddings
+    except Exception as e:
+        logger.error(f"Embedding request failed: {str(e)}")
+        raise
+
+def embed_chunk(chunk: Dict[str, Any], reuse_embeddings: Optional[Dict[str, List[float]]] = None) -> List[float]:
+    """
+    Embed a single chunk from split_code (see embed_chunks).
+    """
+    return embed_chunks([chunk], reuse_embeddings)[0].tolist()
 
-        file_name = os.path.basename(file_path)
-        file_extension = os.path.splitext(file_name)[1][1:]  # Remove dot
-        file_size = os.path.getsize(file_path)
+def count_tokens(text: str) -> int:
+    """Count tokens with the CodeBERT tokenizer (different from tiktoken)."""
+    _require_model()
+    return len(tokenizer.encode(text))
 
-        # Use CodeBERT tokenizer to count tokens (different from tiktoken)
-        def count_tokens(text):
-            return len(tokenizer.encode(text))
+def get_chunk_hash(text: str) -> str:
+    """Identify a chunk's embedding: the same text in the same embedding space gets the same vector."""
+    return hashlib.sha1(f"{EMBEDDING_SPACE}\0{text}".encode('utf-8')).hexdigest()
 
-        chunks = chunk_code(code, MAX_TOKENS_PER_CHUNK, CHUNK_OVERLAP)
-        logger.info(f"Split {file_path} into {len(chunks)} chunks")
+def _token_chunk(code: str, ids: List[int], offsets: List[Tuple[int, int]], newlines: List[int], start: int, end: int) -> Dict[str, Any]:
+    """Build the chunk dict for the token range [start, end) of tokenized code."""
+    first, last = offsets[start][0], offsets[end - 1][1]
+    return {
+        "text": code[first:last],
+        "input_ids": ids[start:end],
+        "token_count": end - start + 2,
+        "start_line": bisect.bisect_right(newlines, first - 1) + 1,
+        "end_line": bisect.bisect_right(newlines, last - 2) + 1
+    }
 
+def _tokenize_with_offsets(code: str) -> Tuple[List[int], List[Tuple[int, int]], List[int]]:
+    """Tokenize code once, returning its ids, their character offsets and the newline positions."""
+    encoding = tokenizer(code, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return encoding["input_ids"], encoding["offset_mapping"], [match.start() for match in re.finditer('\n', code)]
+
+def _split_windows(code: str) -> List[Dict[str, Any]]:
+    """Cut normalized code into token windows, each with its line span in the code."""
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        ids, offsets, newlines = _tokenize_with_offsets(code)
+        return [
+            _token_chunk(code, ids, offsets, newlines, start, end)
+            for start, end in chunk_token_spans(code, offsets, MAX_TOKENS_PER_CHUNK, CHUNK_OVERLAP)
+            if end > start
+        ] or [{
+            "text": code, "input_ids": [], "token_count": 2,
+            "start_line": 1, "end_line": len(newlines) + 1
+        }]
+
+    # Slow tokenizers have no offsets: size line-aligned chunks with the same tokenizer instead
+    chunks = []
+    search_from = 0
+    for text in chunk_code(code, MAX_TOKENS_PER_CHUNK, CHUNK_OVERLAP, token_counter=count_tokens):
+        first = code.find(text, search_from)
+        search_from = max(first, 0)
+        start_line = code.count('\n', 0, first) + 1 if first >= 0 else 1
+        chunks.append({
+            "text": text,
+            "input_ids": None,
+            "token_count": count_tokens(text),
+            "start_line": start_line,
+            "end_line": start_line + text.count('\n')
+        })
+    return chunks
+
+def _split_content_defined(code: str) -> List[Dict[str, Any]]:
+    """Cut normalized code into content-defined chunks of whole lines (see content_defined_spans)."""
+    lines = code.split('\n')
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        counts = count_line_tokens(lines, count_tokens)
         return [
             {
-                "chunk": chunk,
-                "embedding": get_embedding(chunk),
-                "metadata": {
-                    "file_path": file_path,
-                    "file_name": file_name,
-                    "file_extension": file_extension,
-                    "file_size": file_size,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "token_count": count_tokens(chunk)
-                }
+                "text": text,
+                "input_ids": None,
+                "token_count": count_tokens(text),
+                "start_line": start + 1,
+                "end_line": end
             }
-            for i, chunk in enumerate(chunks)
+            for start, end in content_defined_spans(lines, counts, CDC_MIN_TOKENS, MAX_TOKENS_PER_CHUNK, CDC_BOUNDARY_BITS)
+            for text in ['\n'.join(lines[start:end])]
         ]
+
+    ids, offsets, newlines = _tokenize_with_offsets(code)
+    if not ids:
+        return _split_windows(code)
+
+    # Token index at which every line starts (just after the token holding its newline)
+    starts = [start for start, _ in offsets]
+    line_starts = [0] + [bisect.bisect_right(starts, newline) for newline in newlines] + [len(ids)]
+    counts = [line_starts[i + 1] - line_starts[i] for i in range(len(lines))]
+
+    chunks = []
+    for start, end in content_defined_spans(lines, counts, CDC_MIN_TOKENS, MAX_TOKENS_PER_CHUNK, CDC_BOUNDARY_BITS):
+        first, last = line_starts[start], line_starts[end]
+        # A single line longer than the window is cut into full windows
+        for window in range(first, last, MAX_TOKENS_PER_CHUNK):
+            chunks.append(_token_chunk(code, ids, offsets, newlines, window, min(window + MAX_TOKENS_PER_CHUNK, last)))
+    return chunks
+
+def split_code(code: str, language: Optional[str] = None, normalized: bool = True) -> List[Dict[str, Any]]:
+    """
+    Split code into the chunks that are embedded.
+    
+    The code is tokenized once with the model's fast tokenizer and cut into
+    windows of its own token ids, so each chunk fills the model window without
+    being truncated and its ids are reused for inference. With CHUNK_MODE set to
+    "structural", supported languages get one chunk per top-level function,
+    method or class instead, and only units that do not fit the window are cut
+    into token windows. "content" cuts content-defined chunks of whole lines,
+    whose boundaries do not move when lines elsewhere in the file change.
+    
+    Args:
+        code: The code.
+        language: The file extension, used by structural chunking and normalization.
+        normalized: Whether the code is already normalized. Raw code is normalized
+            here, after structural chunking has found its units.
+    
+    Returns:
+        Dicts with the chunk text, its input_ids (None when the tokenizer has no
+        offset mapping and the text has to be tokenized again), token_count
+        (including the two special tokens, as counted before) and the 1-based
+        start_line and end_line of the chunk, or of its unit in structural mode,
+        and the chunk_hash under which its vector can be reused.
+    """
+    # Chunks are cut with the model's tokenizer
+    _require_model()
+    if CHUNK_MODE == "content":
+        chunks = _split_content_defined(code if normalized else normalize_code(code, language))
+    elif CHUNK_MODE == "structural":
+        prepare = (lambda text: text) if normalized else (lambda text: normalize_code(text, language))
+        try:
+            chunks = split_units(code, language, lambda text: _split_windows(prepare(text)), normalized)
+        except Exception as e:
+            logger.error(f"Structural chunking failed, falling back to token windows: {str(e)}")
+            chunks = None
+        if not chunks:
+            chunks = _split_windows(code if normalized else normalize_code(code, language))
+    else:
+        chunks = _split_windows(code if normalized else normalize_code(code, language))
+
+    for chunk in chunks:
+        chunk["chunk_hash"] = get_chunk_hash(chunk["text"])
+    return chunks
+
+def build_chunk_metadata(
+    chunk: str,
+    file_path: str,
+    file_size: int,
+    chunk_index: int,
+    total_chunks: int,
+    extra_metadata: Optional[Dict[str, Any]] = None,
+    token_count: Optional[int] = None,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    chunk_hash: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the vector store metadata for one chunk of a file."""
+    file_name = os.path.basename(file_path)
+    chunk_fields = {"start_line": start_line, "end_line": end_line} if start_line is not None else {}
+    if chunk_hash is not None:
+        chunk_fields["chunk_hash"] = chunk_hash
+    return {
+        "file_path": file_path,
+        "file_name": file_name,
+        "file_extension": os.path.splitext(file_name)[1][1:],  # Remove dot
+        "file_size": file_size,
+        "chunk_index": chunk_index,
+        "total_chunks": total_chunks,
+        "token_count": token_count if token_count is not None else count_tokens(chunk),
+        **chunk_fields,
+        **(extra_metadata or {})
+    }
+
+def embed_code(
+    code: str,
+    file_path: str,
+    file_size: Optional[int] = None,
+    extra_metadata: Optional[Dict[str, Any]] = None,
+    reuse_embeddings: Optional[Dict[str, List[float]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Generate embeddings for already normalized code.
+    
+    Args:
+        code: The normalized code.
+        file_path: Identity of the code in the vector store metadata.
+        file_size: Size of the source in bytes (defaults to the encoded code length).
+        extra_metadata: Additional fields stored with every chunk (e.g. repo_url).
+        reuse_embeddings: Existing vectors by chunk_hash (see CodeVectorStore.export_embeddings),
+            reused for chunks that did not change instead of embedding them again.
+    """
+    if file_size is None:
+        file_size = len(code.encode('utf-8'))
+
+    chunks = split_code(code, get_file_extension(file_path))
+    logger.info(f"Split {file_path} into {len(chunks)} chunks")
+    embeddings = embed_chunks(chunks, reuse_embeddings) if chunks else []
+
+    return [
+        {
+            "chunk": chunk["text"],
+            "embedding": embedding.tolist(),
+            "metadata": build_chunk_metadata(
+                chunk["text"], file_path, file_size, i, len(chunks), extra_metadata,
+                chunk["token_count"], chunk["start_line"], chunk["end_line"], chunk["chunk_hash"]
+            )
+        }
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+    ]
+
+def create_code_embeddings(
+    file_path: str,
+    extra_metadata: Optional[Dict[str, Any]] = None,
+    reuse_embeddings: Optional[Dict[str, List[float]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Generate embeddings for the content of a given code file.
+    
+    Chunks are cut as configured by CHUNK_MODE; with "content", chunks left
+    unchanged by an edit keep their hash and their vector is taken from
+    reuse_embeddings.
+    
+    Args:
+        file_path: The normalized code file to embed.
+        extra_metadata: Additional fields stored with every chunk (e.g. repo_url).
+        reuse_embeddings: Existing vectors by chunk_hash.
+    """
+    if not os.path.exists(file_path):
+        logger.error(f"File not found: {file_path}")
+        return []
+
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            code = f.read()
+
+        return embed_code(code, file_path, os.path.getsize(file_path), extra_metadata, reuse_embeddings)
     except Exception as e:
         logger.error(f"Failed to process {file_path}: {str(e)}")
         return []
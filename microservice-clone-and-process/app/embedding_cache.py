@@ -0,0 +1,166 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.getcwd(), "embedding_cache", "embeddings.sqlite"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+EVICTION_TARGET = 0.9  # Eviction frees space down to this fraction of the limit
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache in SQLite, keyed by a hash of the embedding
+    configuration and the embedded text.
+
+    Vectors are stored as float32 blobs with their last use time, and the least
+    recently used ones are evicted when the cache grows past its size limit.
+    Lookups and stores are batched, one transaction each.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Shared by the request and ingestion threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets other processes (e.g. a second worker) read while one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size_bytes = self._measure()
+
+    def _measure(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(config: str, text: str) -> bytes:
+        """Key a text under an embedding configuration (model, precision, window, input kind)."""
+        return hashlib.sha256(f"{config}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Look up vectors, marking the ones found as recently used.
+
+        Returns:
+            The float32 vectors found, by key.
+        """
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            try:
+                unique = list(dict.fromkeys(keys))
+                # Stay below SQLite's bound parameter limit
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+                if found:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                    )
+                    self._conn.commit()
+            except Exception as e:
+                logger.error(f"Error reading embedding cache: {str(e)}")
+            hits = sum(key in found for key in keys)
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+        return found
+
+    def put_many(self, vectors: Dict[bytes, np.ndarray]):
+        """Store vectors, evicting the least recently used ones if the cache grows too large."""
+        if not vectors:
+            return
+        with self._lock:
+            try:
+                now = time.time()
+                rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+                )
+                self._conn.commit()
+                self._size_bytes += sum(len(row[1]) for row in rows)
+                if self._size_bytes > self.max_bytes:
+                    self._evict()
+            except Exception as e:
+                logger.error(f"Error writing embedding cache: {str(e)}")
+
+    def _evict(self):
+        """Delete the least recently used vectors until the cache is back under EVICTION_TARGET of its limit."""
+        # Other processes may have written too
+        self._size_bytes = self._measure()
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if not count or self._size_bytes <= self.max_bytes:
+            return
+        entry_size = self._size_bytes / count
+        evict = min(count, int((self._size_bytes - self.max_bytes * EVICTION_TARGET) / entry_size) + 1)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (evict,)
+        )
+        self._conn.commit()
+        self._size_bytes = self._measure()
+        self._stats["evictions"] += evict
+        logger.info(f"Evicted {evict} embeddings from the cache")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters since startup, and the cache's current size."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0],
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "path": self.path
+            }
+
+    def clear(self):
+        """Delete every cached vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._size_bytes = 0
+
+_cache: Optional[EmbeddingCache] = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Returns the shared embedding cache, opening it on first use, or None when it is disabled or unusable."""
+    global _cache, _cache_failed
+    if not EMBEDDING_CACHE_ENABLED or _cache_failed:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+            except Exception as e:
+                logger.error(f"Failed to open embedding cache, continuing without it: {str(e)}")
+                _cache_failed = True
+                return None
+        return _cache
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from typing import List, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CPU_COUNT = os.cpu_count() or 1
+# Processes embedding chunks during ingestion, each with its own copy of the model (0 = embed in-process)
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+# Torch threads of each embedding process; by default the cores are shared out, keeping one for the API
+EMBED_THREADS_PER_PROCESS = int(os.getenv(
+    "EMBED_THREADS_PER_PROCESS", str(max(1, (CPU_COUNT - 1) // max(1, EMBED_PROCESSES)))
+))
+# Torch threads of the API process (searches and /get-embedding); 0 keeps torch's default, or
+# the cores the embedding processes leave free when they are enabled
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+
+def get_api_threads() -> Optional[int]:
+    """Returns the torch thread count for the API process, or None to keep torch's default."""
+    if TORCH_THREADS > 0:
+        return TORCH_THREADS
+    if EMBED_PROCESSES > 0:
+        return max(1, CPU_COUNT - EMBED_PROCESSES * EMBED_THREADS_PER_PROCESS)
+    return None
+
+def _init_worker(threads: int):
+    """Load the model once per worker process and pin its torch thread count."""
+    import torch
+    # Import here so each worker loads its own copy of the model
+    from app import codebert_embedder
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable before the first parallel work
+    if not codebert_embedder.load_model():
+        logger.error(f"Embedding worker {os.getpid()} could not load the model")
+
+def _embed_batch(id_lists: List[List[int]]) -> np.ndarray:
+    """Embed one padded batch in a worker process."""
+    from app.codebert_embedder import _embed_id_batches
+    return _embed_id_batches(id_lists)
+
+def _ping(_) -> int:
+    # Long enough that every worker gets one of a round of pings
+    time.sleep(0.05)
+    return os.getpid()
+
+class EmbeddingPool:
+    """
+    A pool of processes that each load the embedding model once and run it on
+    a fixed number of torch threads.
+
+    Inputs are grouped into the same length-bucketed batches as in-process
+    embedding; the batches are queued to the workers, and their vectors are
+    put back together in input order. Several threads may embed through one
+    pool at once.
+    """
+
+    def __init__(self, processes: int, threads_per_process: Optional[int] = None):
+        self.processes = processes
+        self.threads_per_process = threads_per_process or max(1, (CPU_COUNT - 1) // max(1, processes))
+        # Spawned, not forked: forking a process that already runs torch threads can deadlock
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(processes, initializer=_init_worker, initargs=(self.threads_per_process,))
+        logger.info(f"Started {processes} embedding processes with {self.threads_per_process} torch threads each")
+
+    def wait_ready(self):
+        """Block until every worker has loaded the model."""
+        # Workers take tasks only once their initializer has run
+        ready = set()
+        while len(ready) < self.processes:
+            ready.update(self._pool.map(_ping, range(self.processes * 2), chunksize=1))
+
+    def embed(self, id_lists: List[List[int]], dimension: int) -> np.ndarray:
+        """
+        Embed tokenized inputs (with special tokens) on the workers.
+
+        Args:
+            id_lists: Token ids per input.
+            dimension: The size of the model's embeddings.
+
+        Returns:
+            The normalized embeddings as a float32 matrix, in input order.
+        """
+        # Import here to avoid circular imports
+        from app.codebert_embedder import _batch_by_length
+
+        embeddings = np.zeros((len(id_lists), dimension), dtype=np.float32)
+        batches = _batch_by_length([len(ids) for ids in id_lists])
+        results = self._pool.imap(_embed_batch, [[id_lists[i] for i in batch] for batch in batches])
+        for batch, vectors in zip(batches, results):
+            embeddings[batch] = vectors
+        return embeddings
+
+    def close(self):
+        """Stop the worker processes once their queued batches are done."""
+        self._pool.close()
+        self._pool.join()
+
+_pool: Optional[EmbeddingPool] = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+def get_embedding_pool() -> Optional[EmbeddingPool]:
+    """Returns the shared embedding pool, starting it on first use, or None when embedding runs in-process."""
+    global _pool, _pool_failed
+    if EMBED_PROCESSES <= 0 or _pool_failed:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = EmbeddingPool(EMBED_PROCESSES, EMBED_THREADS_PER_PROCESS)
+            except Exception as e:
+                logger.error(f"Failed to start embedding processes, embedding in-process: {str(e)}")
+                _pool_failed = True
+                return None
+        return _pool
@@ -0,0 +1,191 @@
+import os
+import logging
+from typing import Optional, Tuple, Callable
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "torch" runs the model eagerly, "onnx" exports it once and runs it with onnxruntime
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = {"torch", "onnx"}
+# "int8" applies dynamic int8 quantization to the weights of either backend
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "none")
+EMBEDDING_QUANTIZATIONS = {"none", "int8"}
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(os.getcwd(), "onnx_models"))
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", str(os.cpu_count() or 1)))  # Threads inside one operator
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))  # Operators run in parallel (sequential graph)
+ONNX_OPSET = 17
+
+# Runs the model on padded (batch, sequence) int64 arrays and returns the [CLS] vectors
+Encoder = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+def get_backend() -> str:
+    """Returns the configured backend, falling back to torch for unknown values."""
+    if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{EMBEDDING_BACKEND}', using torch")
+        return "torch"
+    return EMBEDDING_BACKEND
+
+def get_quantization() -> str:
+    """Returns the configured quantization, falling back to none for unknown values."""
+    if EMBEDDING_QUANTIZE not in EMBEDDING_QUANTIZATIONS:
+        logger.warning(f"Unknown EMBEDDING_QUANTIZE '{EMBEDDING_QUANTIZE}', using none")
+        return "none"
+    return EMBEDDING_QUANTIZE
+
+def get_embedding_space(model_name: str, quantize: Optional[str] = None, backend: Optional[str] = None) -> str:
+    """
+    Name the vector space an embedder produces.
+
+    fp32 PyTorch and ONNX vectors agree to float precision and share a space.
+    int8 vectors do not, and PyTorch and ONNX Runtime quantize differently, so
+    they are tagged with both (e.g. "<model>:onnx-int8"). Vector stores, chunk
+    hashes and the embedding cache are keyed by this, so none of them mix.
+    """
+    quantize = quantize or get_quantization()
+    backend = backend or get_backend()
+    return model_name if quantize == "none" else f"{model_name}:{backend}-{quantize}"
+
+class _ClsModel(torch.nn.Module):
+    """Wraps a Hugging Face encoder to return only the [CLS] vectors, which is all ONNX has to output."""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0, :]
+
+class TorchEncoder:
+    """Runs a PyTorch model, optionally with dynamically int8-quantized linear layers."""
+
+    def __init__(self, model: torch.nn.Module, device: str = "cpu"):
+        self.model = model
+        self.device = device
+
+    def __call__(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        # Get embeddings with no gradient calculation needed
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=torch.from_numpy(input_ids).to(self.device),
+                attention_mask=torch.from_numpy(attention_mask).to(self.device)
+            )
+        return outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
+
+class OnnxEncoder:
+    """Runs an exported model with onnxruntime on the CPU."""
+
+    def __init__(self, model_path: str, intra_op_threads: Optional[int] = None, inter_op_threads: Optional[int] = None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = inter_op_threads or ONNX_INTER_OP_THREADS
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return self.session.run(["cls"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+def get_onnx_model_path(model_name: str, quantize: str = "none") -> str:
+    """Returns where the ONNX export of a model (or its quantized copy) is cached."""
+    slug = "".join(c if c.isalnum() or c in "._-" else "-" for c in model_name)
+    file_name = "model.onnx" if quantize == "none" else f"model.{quantize}.onnx"
+    return os.path.join(ONNX_CACHE_DIR, slug, file_name)
+
+def export_onnx_model(model: torch.nn.Module, model_path: str):
+    """Export a model to ONNX with dynamic batch and sequence axes, atomically."""
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    tmp_path = f"{model_path}.tmp"
+    dummy = torch.ones((2, 8), dtype=torch.long)
+    try:
+        torch.onnx.export(
+            _ClsModel(model).eval(),
+            (dummy, dummy),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["cls"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "cls": {0: "batch"}
+            },
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+        os.replace(tmp_path, model_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Exported ONNX model to {model_path}")
+
+def quantize_onnx_model(model_path: str, quantized_path: str):
+    """Apply dynamic int8 quantization to the weights of an ONNX model."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    tmp_path = f"{quantized_path}.tmp"
+    quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, quantized_path)
+    logger.info(f"Quantized ONNX model to {quantized_path}")
+
+def load_onnx_encoder(model: torch.nn.Module, model_name: str, quantize: str = "none") -> OnnxEncoder:
+    """Export (and quantize) the model on first use, then open it with onnxruntime."""
+    model_path = get_onnx_model_path(model_name)
+    if not os.path.exists(model_path):
+        export_onnx_model(model, model_path)
+    if quantize == "int8":
+        quantized_path = get_onnx_model_path(model_name, quantize)
+        if not os.path.exists(quantized_path):
+            quantize_onnx_model(model_path, quantized_path)
+        model_path = quantized_path
+    return OnnxEncoder(model_path)
+
+def load_encoder(
+    model: torch.nn.Module,
+    model_name: str,
+    device: str = "cpu",
+    backend: Optional[str] = None,
+    quantize: Optional[str] = None
+) -> Tuple[Encoder, str]:
+    """
+    Build the encoder for the configured backend and quantization.
+
+    If onnxruntime (or onnx, for the export) is unavailable, an fp32 model
+    runs with PyTorch instead, whose vectors share its embedding space. int8
+    vectors of the two backends differ, so an ONNX int8 model that cannot be
+    loaded is an error rather than a silent switch to PyTorch quantization.
+
+    Returns:
+        The encoder and the name of the backend actually used (e.g. "onnx-int8").
+
+    Raises:
+        RuntimeError: If the ONNX int8 model cannot be loaded.
+    """
+    backend = backend or get_backend()
+    quantize = quantize or get_quantization()
+    if backend not in EMBEDDING_BACKENDS:
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}', using torch")
+        backend = "torch"
+
+    suffix = "" if quantize == "none" else f"-{quantize}"
+    # int8 runs on the CPU with either backend
+    if backend == "onnx" and (device == "cpu" or quantize != "none"):
+        try:
+            return load_onnx_encoder(model, model_name, quantize), f"onnx{suffix}"
+        except Exception as e:
+            if quantize != "none":
+                raise RuntimeError(f"Failed to load the ONNX {quantize} model: {str(e)}") from e
+            logger.error(f"Failed to load ONNX backend, falling back to torch: {str(e)}")
+
+    if quantize == "int8":
+        # Dynamically quantized kernels are CPU only
+        device = "cpu"
+        model = torch.ao.quantization.quantize_dynamic(model.to(device), {torch.nn.Linear}, dtype=torch.qint8)
+    return TorchEncoder(model, device), f"torch{suffix}"
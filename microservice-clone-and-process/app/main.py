@@ -1,21 +1,44 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 import os
+import time
+import uuid
+import asyncio
 import logging
-from typing import List, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from dotenv import load_dotenv
 
-from app.clone_and_process import clone_repositories, get_repository_urls
+from app.clone_and_process import clone_repositories, get_repository_urls, CLONE_STRATEGIES, SOURCE_MODES
+from app.archive_sources import (
+    resolve_archive_path, get_archive_format, ARCHIVE_DIR, ARCHIVE_FORMATS, ARCHIVE_UPLOAD_MAX_MB
+)
 from app.cleanup import cleanup_processed_files
-from app.codebert_embedder import create_code_embeddings, get_embedding
+from app.repository_layout import load_manifest
+from app.utils import normalize_code, get_language_family
+from app.codebert_embedder import (
+    create_code_embeddings, get_embeddings, load_model, is_model_ready, get_model_status, EMBEDDING_SPACE
+)
 from app.vector_store import create_vector_store
+from app.embedding_cache import get_embedding_cache
+from app.wire_format import EMBEDDING_B64_MEDIA_TYPE, encode_embedding, decode_embedding, accepts_b64
+from app.micro_batcher import (
+    MicroBatcher, QueueFullError, INFERENCE_CONCURRENCY, INFERENCE_QUEUE_SIZE, SEARCH_CONCURRENCY, SEARCH_QUEUE_SIZE,
+    MAX_CODES_PER_REQUEST
+)
 from app.background_tasks import (
     init_progress,
     load_progress,
     update_progress,
     format_time,
     run_clone_thread,
+    run_incremental_thread,
+    run_archive_thread,
     run_embedding_thread
 )
 
@@ -29,8 +52,80 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Initialize vector store, only accepting vectors of the configured model and precision
+vector_store = create_vector_store(EMBEDDING_SPACE)
+
+# Initialize progress on startup
+init_progress()
+
+# Load state of the vector store; the model's is kept by codebert_embedder
+index_status = {"status": "not_loaded", "loaded_from_disk": False, "seconds": None}
+
+def load_in_background():
+    """Load the existing vector store, then the model, so the server answers while they load."""
+    start = time.perf_counter()
+    index_status["status"] = "loading"
+    loaded = vector_store.load()
+    # Without a saved store the index starts empty, which is ready too
+    index_status.update(status="ready", loaded_from_disk=loaded, seconds=round(time.perf_counter() - start, 3))
+    logger.info(f"Vector store {'loaded' if loaded else 'not found, starting empty'} in {index_status['seconds']}s")
+
+    load_model()
+
+def is_ready() -> bool:
+    """Whether the vector store and model are both loaded."""
+    return index_status["status"] == "ready" and is_model_ready()
+
+def require_ready(index: bool = True, model: bool = True):
+    """Reject a request with 503 until the parts it needs have loaded."""
+    if (index and index_status["status"] != "ready") or (model and not is_model_ready()):
+        failed = model and get_model_status()["status"] == "failed"
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding model failed to load" if failed else "Service is still loading",
+            headers=None if failed else {"Retry-After": "5"}
+        )
+
+def embed_batch(codes: List[str]) -> List[np.ndarray]:
+    """Embed the snippets of concurrent /get-embedding requests with one batched forward pass."""
+    return list(get_embeddings(codes))
+
+def search_batch(queries: List[Tuple[np.ndarray, int, Optional[int], Optional[int]]]) -> List[List[Dict[str, Any]]]:
+    """
+    Run the queries of concurrent search requests as one index search per nprobe/ef_search
+    setting, at the largest top_k of the setting's queries.
+    """
+    groups = {}
+    for i, (_, _, nprobe, ef_search) in enumerate(queries):
+        groups.setdefault((nprobe, ef_search), []).append(i)
+
+    results = [None] * len(queries)
+    for (nprobe, ef_search), rows in groups.items():
+        group_results = vector_store.search_batch(
+            [queries[i][0] for i in rows], max(queries[i][1] for i in rows), nprobe=nprobe, ef_search=ef_search
+        )
+        for i, query_results in zip(rows, group_results):
+            results[i] = query_results[:queries[i][1]]
+    return results
+
+# Concurrent requests are coalesced for a few milliseconds into one batched call, run on the
+# batchers' own threads so inference and search never block the event loop
+embedding_batcher = MicroBatcher(
+    "embedding", embed_batch, concurrency=INFERENCE_CONCURRENCY, max_queue=INFERENCE_QUEUE_SIZE
+)
+search_batcher = MicroBatcher("search", search_batch, concurrency=SEARCH_CONCURRENCY, max_queue=SEARCH_QUEUE_SIZE)
+
+def too_many_requests(e: QueueFullError) -> HTTPException:
+    """Turn a full batcher queue into a 429 telling the client when to retry."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    threading.Thread(target=load_in_background, name="startup-load", daemon=True).start()
+    yield
+
 # Initialize FastAPI app
-app = FastAPI(title="Repository Processing Microservice")
+app = FastAPI(title="Repository Processing Microservice", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -41,35 +136,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize vector store
-vector_store = create_vector_store()
-
-# Initialize progress on startup
-init_progress()
-
-# Try to load existing vector store
-try:
-    vector_store.load()
-    logger.info("Loaded existing vector store")
-except Exception as e:
-    logger.warning(f"Could not load vector store: {str(e)}")
-
 # Pydantic models
 class RepositoryRequest(BaseModel):
     repo_urls: List[str] = []
+    clone_workers: Optional[int] = None  # Defaults to CLONE_WORKERS
+    clone_timeout: Optional[int] = None  # Per-repository timeout in seconds, defaults to CLONE_TIMEOUT
+    clone_strategy: Optional[str] = None  # full, shallow, single-branch, partial or shallow-partial
+    incremental: bool = False  # Fetch into persistent mirrors and only re-embed changed files
+    source_mode: Optional[str] = None  # "checkout" or "objects" (stream blobs without a working tree)
+
+class ArchiveRequest(BaseModel):
+    archive_paths: List[str]  # .tar.gz, .zip or .bundle files, relative to ARCHIVE_DIR
 
 class EmbeddingRequest(BaseModel):
-    code: str
+    code: Optional[str] = None
+    codes: Optional[List[str]] = None  # Embedded in one batched call, up to MAX_CODES_PER_REQUEST
 
 class SimilaritySearchRequest(BaseModel):
-    embedding: List[float]
+    embedding: Optional[List[float]] = None
+    embedding_b64: Optional[str] = None  # Base64 of little-endian float32, as returned for EMBEDDING_B64_MEDIA_TYPE
+    top_k: int = 5
+    nprobe: Optional[int] = None  # IVF lists scanned, instead of IVF_NPROBE
+    ef_search: Optional[int] = None  # HNSW candidates kept, instead of HNSW_EF_SEARCH
+
+class CodeSearchRequest(BaseModel):
+    code: str
     top_k: int = 5
+    language: Optional[str] = None  # File extension or language family, used to strip comments correctly
+    normalize: bool = True  # Normalize the code like ingested files before embedding it
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
+def validate_search_options(request):
+    """Reject a search request's top_k, nprobe or ef_search if it is below 1."""
+    for option in ["top_k", "nprobe", "ef_search"]:
+        value = getattr(request, option)
+        if value is not None and value < 1:
+            raise HTTPException(status_code=400, detail=f"{option} must be at least 1")
 
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Liveness check endpoint: the server is up, though the model and index may still be loading"""
     return {"message": "Repository Processing Microservice", "status": "running"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness check endpoint: 200 once the vector store and model are loaded and warmed up, 503 before"""
+    return JSONResponse(
+        status_code=200 if is_ready() else 503,
+        content={"ready": is_ready(), "index": dict(index_status), "model": get_model_status()}
+    )
+
 @app.post("/clone-and-process")
 async def clone_and_process_repos(
     background_tasks: BackgroundTasks,
@@ -86,52 +203,286 @@ async def clone_and_process_repos(
                 "current_status": progress_data["status"]
             }
         
+        if request.clone_strategy and request.clone_strategy not in CLONE_STRATEGIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown clone strategy '{request.clone_strategy}', expected one of: {', '.join(CLONE_STRATEGIES)}"
+            )
+        
+        if request.source_mode and request.source_mode not in SOURCE_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown source mode '{request.source_mode}', expected one of: {', '.join(sorted(SOURCE_MODES))}"
+            )
+        
+        if embed:
+            require_ready()
+        
         # Set repository URLs
         if request.repo_urls:
             os.environ["GITHUB_REPOSITORIES"] = ",".join(request.repo_urls)
         
+        # Incremental refreshes reuse the mirror cache instead of cloning from scratch
+        if request.incremental:
+            background_tasks.add_task(
+                run_incremental_thread,
+                repo_urls=request.repo_urls,
+                embed=embed,
+                clone_workers=request.clone_workers,
+                clone_timeout=request.clone_timeout,
+                source_mode=request.source_mode
+            )
+            return {
+                "message": "Incremental repository update started",
+                "repositories": request.repo_urls,
+                "create_embeddings": embed
+            }
+        
         # Start clone process in background
-        background_tasks.add_task(run_clone_thread, repo_urls=request.repo_urls, embed=embed)
+        background_tasks.add_task(
+            run_clone_thread,
+            repo_urls=request.repo_urls,
+            embed=embed,
+            clone_workers=request.clone_workers,
+            clone_timeout=request.clone_timeout,
+            clone_strategy=request.clone_strategy,
+            source_mode=request.source_mode
+        )
         
         return {
             "message": "Repository cloning started",
             "repositories": request.repo_urls,
             "create_embeddings": embed
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error starting repository clone: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ingest-archives")
+async def ingest_archives(
+    background_tasks: BackgroundTasks,
+    request: ArchiveRequest,
+    embed: bool = True
+):
+    """Ingest tarballs, zip archives and git bundles already present in ARCHIVE_DIR"""
+    try:
+        progress_data = load_progress()
+        if progress_data["status"] != "idle":
+            return {
+                "message": "Another operation is already in progress",
+                "current_status": progress_data["status"]
+            }
+        
+        if embed:
+            require_ready()
+        
+        try:
+            archive_paths = [resolve_archive_path(path) for path in request.archive_paths]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not archive_paths:
+            raise HTTPException(status_code=400, detail="No archives given")
+        
+        background_tasks.add_task(run_archive_thread, archive_paths=archive_paths, embed=embed)
+        return {
+            "message": "Archive ingestion started",
+            "archives": archive_paths,
+            "create_embeddings": embed
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting archive ingestion: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/upload-archive")
+async def upload_archive(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    filename: str,
+    embed: bool = True
+):
+    """Receive an archive as the raw request body, up to ARCHIVE_UPLOAD_MAX_MB, store it in ARCHIVE_DIR and ingest it"""
+    try:
+        progress_data = load_progress()
+        if progress_data["status"] != "idle":
+            return {
+                "message": "Another operation is already in progress",
+                "current_status": progress_data["status"]
+            }
+        
+        if embed:
+            require_ready()
+        
+        if get_archive_format(filename) is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported archive {filename}, expected one of: {', '.join(ARCHIVE_FORMATS)}"
+            )
+        
+        max_bytes = ARCHIVE_UPLOAD_MAX_MB * 1024 * 1024
+        too_large = HTTPException(status_code=413, detail=f"Archive is larger than {ARCHIVE_UPLOAD_MAX_MB} MB")
+        declared = request.headers.get("content-length", "")
+        if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+            raise too_large
+
+        # The body is written as it arrives, never held in memory, on the threadpool
+        upload_dir = os.path.join(ARCHIVE_DIR, "uploads")
+        await run_in_threadpool(os.makedirs, upload_dir, exist_ok=True)
+        archive_path = os.path.join(upload_dir, f"{uuid.uuid4().hex[:8]}_{os.path.basename(filename)}")
+        size = 0
+        f = await run_in_threadpool(open, archive_path, "wb")
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise too_large
+                await run_in_threadpool(f.write, chunk)
+            await run_in_threadpool(f.close)
+        except BaseException:
+            # A partial upload is never ingested
+            await run_in_threadpool(f.close)
+            await run_in_threadpool(os.remove, archive_path)
+            raise
+        logger.info(f"Received archive {filename} ({size} bytes)")
+        
+        background_tasks.add_task(run_archive_thread, archive_paths=[archive_path], embed=embed)
+        return {
+            "message": "Archive ingestion started",
+            "archives": [archive_path],
+            "size": size,
+            "create_embeddings": embed
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error receiving archive: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/get-embedding")
-async def generate_embedding(request: EmbeddingRequest):
-    """Generate an embedding for the given code"""
+async def generate_embedding(request: EmbeddingRequest, http_request: Request):
+    """
+    Generate an embedding for the given code, or one per snippet of a batch.
+    
+    Embeddings are JSON float lists, or base64 float32 strings (embedding_b64,
+    embeddings_b64) when the Accept header includes EMBEDDING_B64_MEDIA_TYPE.
+    """
     try:
-        # Generate the embedding using the get_embedding function
-        embedding = get_embedding(request.code)
-        return {"embedding": embedding}
+        require_ready(index=False)
+        b64 = accepts_b64(http_request.headers.get("accept", ""))
+        if request.codes is not None:
+            if len(request.codes) > MAX_CODES_PER_REQUEST:
+                raise HTTPException(
+                    status_code=413, detail=f"At most {MAX_CODES_PER_REQUEST} codes can be embedded per request"
+                )
+            futures = embedding_batcher.submit_many(request.codes)
+            embeddings = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+            if b64:
+                return JSONResponse(
+                    {"embeddings_b64": [encode_embedding(embedding) for embedding in embeddings]},
+                    media_type=EMBEDDING_B64_MEDIA_TYPE
+                )
+            return {"embeddings": [embedding.tolist() for embedding in embeddings]}
+        if request.code is None:
+            raise HTTPException(status_code=400, detail="Either code or codes is required")
+
+        embedding = await asyncio.wrap_future(embedding_batcher.submit(request.code))
+        if b64:
+            return JSONResponse({"embedding_b64": encode_embedding(embedding)}, media_type=EMBEDDING_B64_MEDIA_TYPE)
+        return {"embedding": embedding.tolist()}
+    except QueueFullError as e:
+        raise too_many_requests(e)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/search-similar")
 async def search_similar_chunks(request: SimilaritySearchRequest):
-    """Search for similar code chunks based on embedding"""
+    """Search for similar code chunks based on an embedding, given as a float list or base64 (embedding_b64)"""
     try:
-        # Ensure vector store is loaded
-        if vector_store.index is None:
-            vector_store.load()
+        require_ready(model=False)
+        if (request.embedding is None) == (request.embedding_b64 is None):
+            raise HTTPException(status_code=400, detail="Exactly one of embedding or embedding_b64 is required")
+        try:
+            embedding = (
+                np.asarray(request.embedding, dtype=np.float32) if request.embedding is not None
+                else decode_embedding(request.embedding_b64)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Queries are searched together, so each must fit the index
+        if vector_store.index is not None and len(embedding) != vector_store.index.d:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Embedding has {len(embedding)} dimensions, expected {vector_store.index.d}"
+            )
+        validate_search_options(request)
         
         # Perform similarity search
-        results = vector_store.search(request.embedding, request.top_k)
+        results = await asyncio.wrap_future(
+            search_batcher.submit((embedding, request.top_k, request.nprobe, request.ef_search))
+        )
         return {"similar_chunks": results}
+    except QueueFullError as e:
+        raise too_many_requests(e)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching similar chunks: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def embed_and_search(code: str, request: CodeSearchRequest) -> List[Dict[str, Any]]:
+    """Embed code and search for it, both through the micro-batchers, coalesced with concurrent requests."""
+    embedding = await asyncio.wrap_future(embedding_batcher.submit(code))
+    return await asyncio.wrap_future(
+        search_batcher.submit((embedding, request.top_k, request.nprobe, request.ef_search))
+    )
+
+@app.post("/search-code")
+async def search_code(request: CodeSearchRequest):
+    """
+    Normalize, embed and search code in one call, returning the similar chunks without an embedding round trip.
+    
+    Code without a language is normalized like the file of its closest match
+    was at ingestion, so query and corpus lose the same comments: when that
+    differs from normalizing with every comment style, it is searched again.
+    """
+    try:
+        require_ready()
+        validate_search_options(request)
+        
+        if not request.normalize:
+            return {"similar_chunks": await embed_and_search(request.code, request)}
+
+        code = await run_in_threadpool(normalize_code, request.code, request.language)
+        results = await embed_and_search(code, request)
+        if not request.language and results:
+            family = get_language_family(results[0]["metadata"].get("file_extension"))
+            matched_code = await run_in_threadpool(normalize_code, request.code, family)
+            if matched_code != code:
+                results = await embed_and_search(matched_code, request)
+        return {"similar_chunks": results}
+    except QueueFullError as e:
+        raise too_many_requests(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching code: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Blocking handlers are plain functions, which FastAPI runs on its threadpool instead of the event loop
 @app.post("/cleanup")
-async def cleanup(clear_vector_store: Optional[bool] = False):
+def cleanup(clear_vector_store: Optional[bool] = False):
     """Clean up processed files"""
     try:
+        if clear_vector_store:
+            require_ready(model=False)
+        
         # Cleanup processed files
         cleanup_processed_files()
         
@@ -144,12 +495,24 @@ async def cleanup(clear_vector_store: Optional[bool] = False):
             "message": "Cleanup completed",
             "vector_store_cleared": clear_vector_store
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during cleanup: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
+def get_service_stats() -> Dict[str, Any]:
+    """Readiness, embedding cache and micro-batching metrics, reported by /status whether or not repositories were processed."""
+    # Embedding cache counters, None when the cache is disabled
+    embedding_cache = get_embedding_cache()
+    return {
+        "readiness": {"ready": is_ready(), "index": dict(index_status), "model": get_model_status()},
+        "embedding_cache_stats": embedding_cache.get_stats() if embedding_cache else None,
+        "micro_batching": {"embedding": embedding_batcher.get_stats(), "search": search_batcher.get_stats()}
+    }
+
 @app.get("/status")
-async def get_status():
+def get_status():
     """
     Get the status of processed repositories and vector store.
     """
@@ -160,22 +523,32 @@ async def get_status():
         # Check if repositories directory exists
         if not os.path.exists(repositories_dir):
             logger.warning(f"Repositories directory does not exist at: {os.path.abspath(repositories_dir)}")
-            return {"status": "No repositories processed yet", "directory_checked": os.path.abspath(repositories_dir)}
+            return {
+                "status": "No repositories processed yet",
+                "directory_checked": os.path.abspath(repositories_dir),
+                **get_service_stats()
+            }
         
         # List all items in the repository directory
         all_items = os.listdir(repositories_dir)
         logger.info(f"Items in repositories directory: {all_items}")
         
-        # Get all extensions and file counts
-        extensions = {}
-        for item in all_items:
-            item_path = os.path.join(repositories_dir, item)
-            if os.path.isdir(item_path):
-                try:
-                    file_count = len(os.listdir(item_path))
-                    extensions[item] = file_count
-                except Exception as e:
-                    logger.error(f"Error accessing directory {item_path}: {str(e)}")
+        # File counts come from the manifest; only directories written before it existed are listed
+        manifest = load_manifest(repositories_dir)
+        if manifest is not None:
+            layout = manifest.get("layout")
+            extensions = manifest.get("file_extensions", {})
+        else:
+            layout = "flat"
+            extensions = {}
+            for item in all_items:
+                item_path = os.path.join(repositories_dir, item)
+                if os.path.isdir(item_path):
+                    try:
+                        file_count = len(os.listdir(item_path))
+                        extensions[item] = file_count
+                    except Exception as e:
+                        logger.error(f"Error accessing directory {item_path}: {str(e)}")
         
         # Get vector store statistics
         vector_store_stats = vector_store.get_stats()
@@ -187,9 +560,11 @@ async def get_status():
             "status": "Repositories processed",
             "directory_checked": os.path.abspath(repositories_dir),
             "items_in_directory": all_items,
+            "layout": layout,
             "file_extensions": extensions,
             "total_files": sum(extensions.values()) if extensions else 0,
             "vector_store_stats": vector_store_stats,
+            **get_service_stats(),
             "current_working_directory": os.getcwd(),
             "processing_status": progress_data["status"]
         }
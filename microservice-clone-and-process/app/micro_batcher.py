@@ -0,0 +1,187 @@
+import os
+import math
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Callable
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "5"))  # How long a batch waits for more requests
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))  # Requests per batch
+# Batches run at once, and requests allowed to wait, before new ones are turned away
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "256"))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "2"))
+SEARCH_QUEUE_SIZE = int(os.getenv("SEARCH_QUEUE_SIZE", "1024"))
+# Snippets one /get-embedding request may submit; kept below INFERENCE_QUEUE_SIZE so one fits in the queue
+MAX_CODES_PER_REQUEST = int(os.getenv("MAX_CODES_PER_REQUEST", "128"))
+METRICS_WINDOW = 1000  # Recent requests the latency percentiles are computed over
+
+class QueueFullError(RuntimeError):
+    """The batcher already has as many requests waiting as it accepts."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches processed with one call.
+
+    A worker thread takes the first waiting request, then collects more for up
+    to max_wait_ms or until max_batch_size requests are in, and runs the batch
+    function on all of them at once. Each caller gets a future resolved with
+    its own result, or with the batch's exception.
+
+    The worker threads are the batcher's executor: concurrency of them run
+    batches in parallel, off the asyncio event loop, and once max_queue
+    requests are waiting new ones are refused with QueueFullError.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+        max_wait_ms: float = MICRO_BATCH_WAIT_MS,
+        concurrency: int = 1,
+        max_queue: int = 0
+    ):
+        """
+        Args:
+            name: Name of the batcher in logs and metrics.
+            process: Turns a list of request items into a list of results, in the same order.
+            max_batch_size: Max requests per batch.
+            max_wait_ms: How long the first request of a batch waits for others.
+            concurrency: Batches processed at once, each on its own worker thread.
+            max_queue: Requests allowed to wait for a batch (0 = unbounded).
+        """
+        self.name = name
+        self.process = process
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stats = {"requests": 0, "batches": 0, "errors": 0, "rejected": 0}
+        self._queue_waits = deque(maxlen=METRICS_WINDOW)
+        self._compute_times = deque(maxlen=METRICS_WINDOW)
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue one request; the future resolves with its result once its batch has run.
+
+        Raises:
+            QueueFullError: If max_queue requests are already waiting.
+        """
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: List[Any]) -> List[Future]:
+        """
+        Queue the requests of one caller together, all or none of them.
+
+        Raises:
+            QueueFullError: If adding the requests would leave more than max_queue waiting.
+        """
+        with self._lock:
+            if self.max_queue and self._queue.qsize() + len(items) > self.max_queue:
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"Too many {self.name} requests waiting", self._retry_after())
+            while len(self._workers) < self.concurrency:
+                worker = threading.Thread(
+                    target=self._run, name=f"batcher-{self.name}-{len(self._workers)}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+            futures = []
+            queued = time.perf_counter()
+            for item in items:
+                future = Future()
+                self._queue.put((item, future, queued))
+                futures.append(future)
+            return futures
+
+    def _retry_after(self) -> int:
+        """Seconds until the waiting requests should be done, from recent batch compute times."""
+        compute = sum(self._compute_times) / len(self._compute_times) if self._compute_times else 0.0
+        batches = self._queue.qsize() / self.max_batch_size / self.concurrency
+        return max(1, math.ceil(batches * (compute + self.max_wait)))
+
+    def _collect(self) -> List[tuple]:
+        """Block for a request, then gather the ones arriving within the wait window."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Requests already queued are taken even once the window is over
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that gave up on their request are dropped; the rest can no longer cancel
+            batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                results = self.process([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(batch)} requests")
+            except Exception as e:
+                logger.error(f"Error processing {self.name} batch of {len(batch)}: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._lock:
+                    self._stats["errors"] += 1
+                continue
+            compute = time.perf_counter() - start
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._queue_waits.extend(start - queued for _, _, queued in batch)
+                self._compute_times.append(compute)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request and batch counts, and queue wait vs. compute time (ms) over recent requests."""
+        def summarize(samples) -> Dict[str, float]:
+            if not samples:
+                return {"mean": 0.0, "p50": 0.0, "p99": 0.0}
+            values = np.array(samples) * 1000
+            return {
+                "mean": round(float(values.mean()), 3),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p99": round(float(np.percentile(values, 99)), 3)
+            }
+
+        with self._lock:
+            return {
+                **self._stats,
+                "mean_batch_size": self._stats["requests"] / self._stats["batches"] if self._stats["batches"] else 0.0,
+                "queued": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "queue_wait_ms": summarize(self._queue_waits),
+                "compute_ms": summarize(self._compute_times)
+            }
@@ -0,0 +1,129 @@
+import os
+import re
+import git
+import json
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Mirror cache configuration
+MIRROR_CACHE_DIR = os.getenv("MIRROR_CACHE_DIR", os.path.join(os.getcwd(), "mirrors"))
+INGEST_STATE_FILE = os.path.join(MIRROR_CACHE_DIR, "ingest_state.json")
+
+# Guards the ingest state file across clone worker threads
+_state_lock = threading.Lock()
+
+def get_repository_slug(repo_url: str) -> str:
+    """
+    Build a stable, filesystem-safe name for a repository URL.
+
+    The readable part comes from the last path component and the suffix from a
+    hash of the full URL, so two forks named alike never collide.
+    """
+    name = repo_url.rstrip("/").split("/")[-1]
+    if name.endswith(".git"):
+        name = name[:-4]
+    name = re.sub(r"[^A-Za-z0-9._-]", "-", name) or "repo"
+    digest = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{digest}"
+
+def get_mirror_path(repo_url: str) -> str:
+    """Returns the location of the bare mirror for a repository URL."""
+    return os.path.join(MIRROR_CACHE_DIR, f"{get_repository_slug(repo_url)}.git")
+
+def sync_mirror(repo_url: str, timeout: Optional[int] = None) -> git.Repo:
+    """
+    Create the bare mirror for a repository, or fetch new objects into it.
+
+    Args:
+        repo_url: The repository URL to mirror.
+        timeout: Seconds after which the git process is killed.
+
+    Returns:
+        The mirrored repository.
+    """
+    mirror_path = get_mirror_path(repo_url)
+    if os.path.exists(mirror_path):
+        logger.info(f"Fetching into mirror: {repo_url}")
+        repo = git.Repo(mirror_path)
+        repo.git.fetch("--prune", "origin", kill_after_timeout=timeout)
+        return repo
+
+    os.makedirs(MIRROR_CACHE_DIR, exist_ok=True)
+    logger.info(f"Creating mirror: {repo_url}")
+    git.Git().clone("--mirror", "--", repo_url, mirror_path, kill_after_timeout=timeout)
+    return git.Repo(mirror_path)
+
+def load_ingest_state() -> Dict[str, Dict]:
+    """Load the last ingested commit per repository URL."""
+    try:
+        if os.path.exists(INGEST_STATE_FILE):
+            with open(INGEST_STATE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading ingest state: {str(e)}")
+    return {}
+
+def get_last_ingested_commit(repo_url: str) -> Optional[str]:
+    """Returns the commit SHA last ingested for the repository, if any."""
+    return load_ingest_state().get(repo_url, {}).get("commit")
+
+def record_ingested_commit(repo_url: str, commit_sha: str):
+    """Persist the commit SHA that the vector store now reflects for a repository."""
+    with _state_lock:
+        state = load_ingest_state()
+        state[repo_url] = {"commit": commit_sha, "slug": get_repository_slug(repo_url)}
+        os.makedirs(MIRROR_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{INGEST_STATE_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, INGEST_STATE_FILE)
+
+def list_tree_files(commit: git.Commit) -> List[str]:
+    """Lists every blob path in a commit's tree."""
+    return [item.path for item in commit.tree.traverse() if item.type == "blob"]
+
+def diff_commits(repo: git.Repo, old_sha: Optional[str], new_sha: str) -> Tuple[List[str], List[str], bool]:
+    """
+    Compute the files to (re)process and the files to retire between two commits.
+
+    Args:
+        repo: The mirrored repository.
+        old_sha: The last ingested commit, or None for a first ingestion.
+        new_sha: The commit to ingest.
+
+    Returns:
+        (changed, deleted, full) where changed holds added or modified paths in
+        new_sha, deleted holds paths gone since old_sha, and full is True when
+        no usable previous commit exists and the whole tree must be ingested.
+    """
+    new_commit = repo.commit(new_sha)
+    old_commit = None
+    if old_sha:
+        try:
+            repo.git.cat_file("-e", f"{old_sha}^{{commit}}")
+            old_commit = repo.commit(old_sha)
+        except git.GitCommandError:
+            logger.warning(f"Last ingested commit {old_sha} no longer exists, re-ingesting fully")
+
+    if old_commit is None:
+        return list_tree_files(new_commit), [], True
+
+    changed, deleted = [], []
+    for diff in old_commit.diff(new_commit):
+        if diff.change_type == "D":
+            deleted.append(diff.a_path)
+        elif diff.change_type == "R":
+            deleted.append(diff.a_path)
+            changed.append(diff.b_path)
+        else:
+            changed.append(diff.b_path)
+    return changed, deleted, False
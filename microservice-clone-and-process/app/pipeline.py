@@ -0,0 +1,428 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
+from dotenv import load_dotenv
+
+from app.utils import iter_code_files, normalize_code, get_file_extension
+from app.embedding_pool import get_embedding_pool
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Pipeline configuration
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))  # Items buffered between two stages
+PIPELINE_READ_WORKERS = int(os.getenv("PIPELINE_READ_WORKERS", "4"))
+PIPELINE_CHUNK_WORKERS = int(os.getenv("PIPELINE_CHUNK_WORKERS", "2"))
+PIPELINE_EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", "1"))
+PIPELINE_INDEX_BATCH = int(os.getenv("PIPELINE_INDEX_BATCH", "256"))  # Chunks added to the index at once
+PIPELINE_SAVE_INTERVAL = float(os.getenv("PIPELINE_SAVE_INTERVAL", "60"))  # Seconds between vector store saves
+PROGRESS_INTERVAL = 0.5  # Seconds between progress reports
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def iter_directory_sources(
+    directory: str,
+    extra_metadata: Optional[Dict[str, Any]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield pipeline sources for the normalized code files below a directory.
+    """
+    for file_path in iter_code_files(directory):
+        yield file_source(file_path, extra_metadata)
+
+def file_source(file_path: str, extra_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build a pipeline source for an already normalized code file.
+    """
+    def read() -> str:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+
+    return {
+        "file_path": file_path,
+        "read": read,
+        "file_size": None,
+        "normalized": True,
+        "metadata": extra_metadata or {}
+    }
+
+def iter_commit_sources(
+    repo_path: str,
+    repo_url: str,
+    commit_sha: str = "HEAD",
+    paths: Optional[List[str]] = None,
+    base_dir: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield pipeline sources for the code files of a commit, read from the object database.
+
+    Blobs are read here, on the discovery thread, because a repository's object
+    database reader is not safe to share between threads. Chunks are stored under
+    the path the normalized copy would have had, so checkout and object ingestion
+    of the same repository retire each other.
+
+    Args:
+        repo_path: The (usually bare) repository holding the commit.
+        repo_url: The repository URL, stored with every chunk.
+        commit_sha: The commit whose tree is read.
+        paths: Only read these paths (e.g. a diff); defaults to the whole tree.
+        base_dir: The normalized repositories directory used for chunk identities.
+    """
+    import git
+    from app.clone_and_process import iter_commit_files, get_normalized_path
+    from app.mirror_cache import get_repository_slug
+
+    base_dir = base_dir or os.path.join(os.getcwd(), "repositories")
+    repo_name = get_repository_slug(repo_url)
+    with git.Repo(repo_path) as repo:
+        for rel_path, data in iter_commit_files(repo, commit_sha, paths):
+            yield {
+                "file_path": get_normalized_path(base_dir, repo_name, rel_path),
+                "read": lambda data=data: data.decode('utf-8', errors='replace'),
+                "file_size": len(data),
+                "normalized": False,
+                "metadata": {"repo_url": repo_url, "source_path": rel_path}
+            }
+
+def iter_archive_sources(archive_path: str, base_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield pipeline sources for the code files of a tarball, zip archive or git bundle.
+
+    Members are read here, on the discovery thread, in archive order: tarballs
+    are streamed in a single forward pass and nothing is unpacked to disk.
+
+    Args:
+        archive_path: The archive to read.
+        base_dir: The normalized repositories directory used for chunk identities.
+    """
+    from app.archive_sources import iter_archive_files, get_archive_slug
+    from app.clone_and_process import get_normalized_path
+
+    base_dir = base_dir or os.path.join(os.getcwd(), "repositories")
+    archive_name = get_archive_slug(archive_path)
+    for member_path, data in iter_archive_files(archive_path):
+        yield {
+            "file_path": get_normalized_path(base_dir, archive_name, member_path),
+            "read": lambda data=data: data.decode('utf-8', errors='replace'),
+            "file_size": len(data),
+            "normalized": False,
+            "metadata": {"archive": os.path.basename(archive_path), "source_path": member_path}
+        }
+
+class IngestionPipeline:
+    """
+    Streams code sources through read, chunk, embed and index stages.
+
+    Stages run concurrently on their own worker threads and are connected by
+    bounded queues, so a slow stage blocks the ones feeding it instead of
+    letting work pile up in memory. The index stage adds embeddings to the
+    vector store in small batches, which makes them searchable as they arrive.
+    Chunks are deduplicated by chunk_hash: only the first copy of a chunk is
+    embedded, and its copies are stored as extra provenances of it.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        read_workers: Optional[int] = None,
+        chunk_workers: Optional[int] = None,
+        embed_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        index_batch: Optional[int] = None,
+        save_interval: Optional[float] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        reuse_embeddings: Optional[Dict[str, List[float]]] = None
+    ):
+        self.vector_store = vector_store
+        self.read_workers = max(1, read_workers or PIPELINE_READ_WORKERS)
+        self.chunk_workers = max(1, chunk_workers or PIPELINE_CHUNK_WORKERS)
+        # Embedding processes, if enabled; each embed worker keeps one of them busy
+        self.embedding_pool = get_embedding_pool()
+        pool_processes = self.embedding_pool.processes if self.embedding_pool else 1
+        self.embed_workers = max(pool_processes, embed_workers or PIPELINE_EMBED_WORKERS)
+        self.queue_size = max(1, queue_size or PIPELINE_QUEUE_SIZE)
+        self.index_batch = max(1, index_batch or PIPELINE_INDEX_BATCH)
+        self.save_interval = save_interval if save_interval is not None else PIPELINE_SAVE_INTERVAL
+        self.progress_callback = progress_callback
+        # Vectors of retired chunks by chunk_hash, reused for chunks that come back unchanged
+        self.reuse_embeddings = reuse_embeddings or {}
+
+        self._lock = threading.Lock()
+        self._pending_chunks: Dict[str, int] = {}
+        # Hashes of the chunks embedded by this run; their copies are only indexed as provenances
+        self._claimed_hashes = set()
+        self._stats = {}
+        self._last_progress = 0.0
+
+    def run(self, sources: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Ingest every source and block until all chunks are indexed and saved.
+
+        Args:
+            sources: Dicts with file_path, read (returns the code), file_size,
+                normalized (whether read returns normalized code) and metadata.
+
+        Returns:
+            Counters for discovered and processed files, indexed, reused and
+            deduplicated chunks, and errors.
+        """
+        # Import here to avoid loading the model before a pipeline actually runs
+        from app.codebert_embedder import split_code, embed_chunks, build_chunk_metadata, CHUNK_MODE, EMBED_BATCH_SIZE
+
+        self._pending_chunks = {}
+        self._claimed_hashes = set()
+        self._stats = {"total_files": 0, "processed_files": 0, "indexed_chunks": 0, "reused_chunks": 0, "deduplicated_chunks": 0, "errors": 0}
+        self._last_progress = 0.0
+        start = time.time()
+
+        read_queue = queue.Queue(self.queue_size)
+        chunk_queue = queue.Queue(self.queue_size)
+        embed_queue = queue.Queue(self.queue_size)
+        index_queue = queue.Queue(self.queue_size)
+
+        def read(source):
+            code = source["read"]()
+            source["language"] = get_file_extension(source["file_path"])
+            # Structural chunking finds units in the raw source and normalizes each one itself
+            if not source["normalized"] and CHUNK_MODE != "structural":
+                code = normalize_code(code, source["language"])
+                source["normalized"] = True
+            if source["file_size"] is None:
+                source["file_size"] = len(code.encode('utf-8'))
+            source["code"] = code
+            self._report(current_file=os.path.basename(source["file_path"]))
+            return [source]
+
+        def chunk(source):
+            chunks = split_code(source.pop("code"), source["language"], source["normalized"])
+            with self._lock:
+                file_path = source["file_path"]
+                if not chunks:
+                    # Empty after normalization (blank or only comments): done, with nothing to index
+                    self._stats["processed_files"] += 1
+                    return []
+                self._pending_chunks[file_path] = self._pending_chunks.get(file_path, 0) + len(chunks)
+            return [
+                {"chunk": chunk, "chunk_index": i, "total_chunks": len(chunks), "source": source}
+                for i, chunk in enumerate(chunks)
+            ]
+
+        def embed(items):
+            # Chunks already in the store, or embedded earlier in this run, are not embedded again
+            duplicates = []
+            for item in items:
+                chunk_hash = item["chunk"]["chunk_hash"]
+                with self._lock:
+                    duplicate = chunk_hash in self._claimed_hashes
+                    self._claimed_hashes.add(chunk_hash)
+                duplicates.append(duplicate or self.vector_store.has_chunk(chunk_hash))
+
+            unique = [item["chunk"] for item, duplicate in zip(items, duplicates) if not duplicate]
+            with self._lock:
+                self._stats["deduplicated_chunks"] += len(items) - len(unique)
+                self._stats["reused_chunks"] += sum(chunk["chunk_hash"] in self.reuse_embeddings for chunk in unique)
+            # One batched forward pass for every unique chunk drained from the queue
+            embeddings = iter(embed_chunks(unique, self.reuse_embeddings, self.embedding_pool) if unique else [])
+
+            outputs = []
+            for item, duplicate in zip(items, duplicates):
+                source = item["source"]
+                chunk = item["chunk"]
+                outputs.append({
+                    "chunk": chunk["text"],
+                    "embedding": None if duplicate else next(embeddings),
+                    "metadata": build_chunk_metadata(
+                        chunk["text"], source["file_path"], source["file_size"],
+                        item["chunk_index"], item["total_chunks"], source["metadata"],
+                        chunk["token_count"], chunk["start_line"], chunk["end_line"], chunk["chunk_hash"]
+                    )
+                })
+            return outputs
+
+        stages = [
+            self._start_stage("read", read, read_queue, chunk_queue, self.read_workers, self.chunk_workers),
+            self._start_stage("chunk", chunk, chunk_queue, embed_queue, self.chunk_workers, self.embed_workers),
+            self._start_stage("embed", embed, embed_queue, index_queue, self.embed_workers, 1, EMBED_BATCH_SIZE),
+        ]
+        indexer = threading.Thread(target=self._index, args=(index_queue,), name="pipeline-index", daemon=True)
+        indexer.start()
+
+        # Discovery runs on the calling thread and blocks when the read stage falls behind
+        try:
+            for source in sources:
+                with self._lock:
+                    self._stats["total_files"] += 1
+                read_queue.put(source)
+        except Exception as e:
+            logger.error(f"Error discovering sources: {str(e)}")
+            self._stats["errors"] += 1
+        finally:
+            for _ in range(self.read_workers):
+                read_queue.put(_DONE)
+
+        for workers in stages:
+            for worker in workers:
+                worker.join()
+        indexer.join()
+
+        self._report(force=True)
+        self._stats["duration"] = time.time() - start
+        logger.info(f"Pipeline finished: {self._stats}")
+        return dict(self._stats)
+
+    def _start_stage(
+        self,
+        name: str,
+        fn: Callable[[Any], List[Any]],
+        in_queue: queue.Queue,
+        out_queue: queue.Queue,
+        workers: int,
+        next_workers: int,
+        batch_size: Optional[int] = None
+    ) -> List[threading.Thread]:
+        """
+        Start the worker threads of one stage; the last one to finish signals the next stage.
+        
+        With a batch_size, fn is called with a list of up to batch_size items: a
+        worker takes whatever is already queued after the item it waited for.
+        """
+        finished = [0]
+
+        def work():
+            while True:
+                items = [in_queue.get()]
+                while batch_size and len(items) < batch_size and items[-1] is not _DONE:
+                    try:
+                        items.append(in_queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                done = items[-1] is _DONE
+                if done:
+                    items.pop()
+                if items:
+                    try:
+                        for output in fn(items if batch_size else items[0]):
+                            out_queue.put(output)
+                    except Exception as e:
+                        logger.error(f"Pipeline {name} stage failed: {str(e)}")
+                        for item in items:
+                            if "source" not in item:
+                                with self._lock:
+                                    self._stats["errors"] += 1
+                            self._forget(item)
+
+                if done:
+                    with self._lock:
+                        finished[0] += 1
+                        last = finished[0] == workers
+                    if last:
+                        for _ in range(next_workers):
+                            out_queue.put(_DONE)
+                    return
+
+        threads = [
+            threading.Thread(target=work, name=f"pipeline-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _index(self, index_queue: queue.Queue):
+        """Add embedded chunks to the vector store in batches and save it periodically."""
+        batch = []
+        # Duplicates waiting for the first copy of their chunk, which another worker is still embedding
+        deferred = []
+        last_save = time.time()
+        dirty = False
+
+        while True:
+            item = index_queue.get()
+            done = item is _DONE
+            if not done:
+                batch.append(item)
+
+            if batch and (done or len(batch) >= self.index_batch):
+                embedded = [item for item in batch if item["embedding"] is not None]
+                batch_hashes = {item["metadata"].get("chunk_hash") for item in embedded}
+                duplicates, deferred = self._split_ready(deferred + [item for item in batch if item["embedding"] is None], batch_hashes)
+                # First copies go first, so the store knows them when their duplicates arrive
+                ready = embedded + duplicates
+                indexed = self.vector_store.add_embeddings(ready) if ready else False
+                dirty = dirty or indexed
+                self._finish_chunks([item["metadata"]["file_path"] for item in ready], indexed)
+                batch = []
+
+            if dirty and (done or time.time() - last_save >= self.save_interval):
+                self.vector_store.save()
+                last_save = time.time()
+                dirty = False
+
+            if done:
+                if deferred:
+                    # Their first copy failed to embed
+                    logger.warning(f"Dropping {len(deferred)} duplicate chunks whose first copy was not indexed")
+                    self._finish_chunks([item["metadata"]["file_path"] for item in deferred], indexed=False)
+                return
+
+    def _split_ready(self, duplicates: List[Dict[str, Any]], batch_hashes: set):
+        """Split duplicates into those whose chunk is stored or in the batch, and those still waiting."""
+        ready, waiting = [], []
+        for item in duplicates:
+            chunk_hash = item["metadata"].get("chunk_hash")
+            if chunk_hash in batch_hashes or self.vector_store.has_chunk(chunk_hash):
+                ready.append(item)
+            else:
+                waiting.append(item)
+        return ready, waiting
+
+    def _finish_chunks(self, file_paths: List[str], indexed: bool = True):
+        """Count finished chunks, and files whose last chunk just finished."""
+        with self._lock:
+            if indexed:
+                self._stats["indexed_chunks"] += len(file_paths)
+            else:
+                self._stats["errors"] += len(file_paths)
+            for file_path in file_paths:
+                self._pending_chunks[file_path] -= 1
+                if self._pending_chunks[file_path] == 0:
+                    del self._pending_chunks[file_path]
+                    self._stats["processed_files"] += 1
+        self._report()
+
+    def _forget(self, item: Dict[str, Any]):
+        """Account for an item dropped after a stage failure so progress still completes."""
+        if "source" in item:
+            # A single chunk failed to embed; the rest of its file carries on
+            self._finish_chunks([item["source"]["file_path"]], indexed=False)
+        else:
+            with self._lock:
+                self._stats["processed_files"] += 1
+
+    def _report(self, current_file: Optional[str] = None, force: bool = False):
+        """Forward progress to the callback at most every PROGRESS_INTERVAL seconds."""
+        if not self.progress_callback:
+            return
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_progress < PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+            progress = {
+                "processed_files": self._stats["processed_files"],
+                "total_files": self._stats["total_files"]
+            }
+        if current_file is not None:
+            progress["current_file"] = current_file
+        try:
+            self.progress_callback(progress)
+        except Exception as e:
+            logger.error(f"Error reporting pipeline progress: {str(e)}")
@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+from typing import List, Dict, Optional, Iterable
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "sharded" spreads each extension directory over two levels of hashed prefix
+# directories (<ext>/ab/cd/<file>), "flat" keeps every file directly in <ext>/
+REPOSITORY_LAYOUT = os.getenv("REPOSITORY_LAYOUT", "sharded")
+REPOSITORY_LAYOUTS = {"sharded", "flat"}
+
+# Small summary read by /status, and the full file listing read by get_all_code_files
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FILES_FILE = "manifest_files.json"
+
+# Guards the manifests across clone worker threads
+_manifest_lock = threading.Lock()
+# Parsed file listings per base directory, with the mtime they were read at
+_manifest_cache: Dict[str, Dict] = {}
+
+def get_layout() -> str:
+    """Returns the configured layout, falling back to sharded for unknown values."""
+    if REPOSITORY_LAYOUT not in REPOSITORY_LAYOUTS:
+        logger.warning(f"Unknown REPOSITORY_LAYOUT '{REPOSITORY_LAYOUT}', using sharded")
+        return "sharded"
+    return REPOSITORY_LAYOUT
+
+def get_shard_dir(file_name: str) -> str:
+    """Returns the two-level prefix directory (e.g. "3f/a2") a file name hashes to."""
+    digest = hashlib.sha1(file_name.encode("utf-8")).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+def get_layout_path(base_dir: str, ext: str, file_name: str) -> str:
+    """Returns where a normalized file named file_name is stored under the configured layout."""
+    if get_layout() == "flat":
+        return os.path.join(base_dir, ext, file_name)
+    return os.path.join(base_dir, ext, get_shard_dir(file_name), file_name)
+
+def _write_json(path: str, data: Dict):
+    """Write a JSON file atomically, so readers never see a partial manifest."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _load_files(base_dir: str) -> Optional[Dict[str, List[str]]]:
+    """Load the file listing of a base directory, reusing the parsed copy while it is unchanged."""
+    path = os.path.join(base_dir, MANIFEST_FILES_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        _manifest_cache.pop(base_dir, None)
+        return None
+
+    cached = _manifest_cache.get(base_dir)
+    if cached and cached["mtime"] == mtime:
+        return cached["files"]
+
+    with open(path, "r", encoding="utf-8") as f:
+        files = json.load(f)
+    _manifest_cache[base_dir] = {"mtime": mtime, "files": files}
+    return files
+
+def _scan_files(base_dir: str) -> Dict[str, List[str]]:
+    """Walk a directory written before it had a manifest, in either layout, once."""
+    files = {}
+    if not os.path.isdir(base_dir):
+        return files
+    for ext in os.listdir(base_dir):
+        ext_dir = os.path.join(base_dir, ext)
+        if not os.path.isdir(ext_dir):
+            continue
+        for root, _, names in os.walk(ext_dir):
+            files.setdefault(ext, []).extend(
+                os.path.relpath(os.path.join(root, name), base_dir) for name in names
+            )
+    return files
+
+def load_manifest(base_dir: str) -> Optional[Dict]:
+    """
+    Load the manifest summary of a normalized repositories directory.
+
+    Returns:
+        The layout, file counts per extension and total, or None when the
+        directory has no manifest (e.g. it was written before manifests existed).
+    """
+    try:
+        path = os.path.join(base_dir, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading manifest: {str(e)}")
+    return None
+
+def list_manifest_files(base_dir: str) -> Optional[List[str]]:
+    """
+    List every normalized file recorded in a directory's manifest.
+
+    Returns:
+        Absolute paths, or None when the directory has no manifest.
+    """
+    try:
+        with _manifest_lock:
+            files = _load_files(base_dir)
+    except Exception as e:
+        logger.error(f"Error loading manifest file listing: {str(e)}")
+        return None
+    if files is None:
+        return None
+    return [os.path.join(base_dir, rel_path) for paths in files.values() for rel_path in paths]
+
+def record_files(base_dir: str, added: Iterable[str] = (), removed: Iterable[str] = ()):
+    """
+    Record normalized files written to or deleted from base_dir in its manifest.
+
+    Args:
+        base_dir: The normalized repositories directory.
+        added: Paths of files that were written.
+        removed: Paths of files that were deleted.
+    """
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return
+
+    with _manifest_lock:
+        try:
+            current = _load_files(base_dir)
+            if current is None:
+                # Adopt files already on disk, e.g. a flat directory from before manifests
+                current = _scan_files(base_dir)
+            files = {ext: set(paths) for ext, paths in current.items()}
+            for path, present in [(path, False) for path in removed] + [(path, True) for path in added]:
+                rel_path = os.path.relpath(path, base_dir)
+                ext = rel_path.split(os.sep, 1)[0]
+                if present:
+                    files.setdefault(ext, set()).add(rel_path)
+                elif ext in files:
+                    files[ext].discard(rel_path)
+
+            listing = {ext: sorted(paths) for ext, paths in files.items() if paths}
+            counts = {ext: len(paths) for ext, paths in listing.items()}
+            os.makedirs(base_dir, exist_ok=True)
+            files_path = os.path.join(base_dir, MANIFEST_FILES_FILE)
+            _write_json(files_path, listing)
+            _manifest_cache[base_dir] = {"mtime": os.stat(files_path).st_mtime_ns, "files": listing}
+            _write_json(os.path.join(base_dir, MANIFEST_FILE), {
+                "layout": get_layout(),
+                "file_extensions": counts,
+                "total_files": sum(counts.values()),
+                "last_update": time.time()
+            })
+        except Exception as e:
+            logger.error(f"Error updating manifest: {str(e)}")
@@ -0,0 +1,210 @@
+import re
+import ast
+import bisect
+import logging
+from typing import List, Dict, Any, Optional, Callable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Languages whose top-level units are found by matching braces
+BRACE_LANGUAGES = {
+    "c", "h", "cpp", "hpp", "cs", "java", "js", "jsx", "ts", "tsx",
+    "go", "rs", "kt", "swift", "php", "scss", "css"
+}
+
+# Tokens the brace scanner has to see: strings and comments (so braces inside them are
+# ignored), braces, statement ends, and any other run of code
+_BRACE_TOKENS = re.compile(
+    r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`(?:[^`\\]|\\[\s\S])*`'
+    r'|//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)'
+    r'|[{};]|[^\s{};"\'`/]+|/'
+)
+
+# Lines opening a unit in Python code whose indentation was lost to normalization
+_PYTHON_UNIT_START = re.compile(r'(?:async\s+def|def|class)\s|@')
+
+# Closing braces and other lines too trivial to be embedded on their own
+_TRIVIAL = re.compile(r'[\s{}();,\]]*')
+
+def _node(start_line: int, end_line: int) -> Dict[str, Any]:
+    return {"start_line": start_line, "end_line": end_line, "children": []}
+
+def find_python_units(code: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Find the top-level functions and classes of Python source with ast.
+
+    Methods become the children of their class. Decorators belong to the unit
+    they decorate.
+
+    Returns:
+        Unit nodes with 1-based inclusive line spans, or None if the code does
+        not parse (e.g. normalized code without indentation).
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    def units(body) -> List[Dict[str, Any]]:
+        nodes = []
+        for item in body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([item.lineno] + [decorator.lineno for decorator in item.decorator_list])
+                node = _node(start, item.end_lineno)
+                if isinstance(item, ast.ClassDef):
+                    node["children"] = units(item.body)
+                nodes.append(node)
+        return nodes
+
+    return units(tree.body)
+
+def find_python_units_normalized(code: str) -> List[Dict[str, Any]]:
+    """
+    Find function and class units in normalized Python code.
+
+    Without indentation, nesting is unknown, so every def, class or decorator
+    line that follows a non-decorator line starts a new unit running to the
+    next one.
+    """
+    starts = []
+    previous_decorator = False
+    for number, line in enumerate(code.split('\n'), start=1):
+        is_start = bool(_PYTHON_UNIT_START.match(line))
+        if is_start and not previous_decorator:
+            starts.append(number)
+        previous_decorator = line.startswith('@')
+
+    total = code.count('\n') + 1
+    return [
+        _node(start, (starts[i + 1] - 1) if i + 1 < len(starts) else total)
+        for i, start in enumerate(starts)
+    ]
+
+def find_brace_units(code: str) -> List[Dict[str, Any]]:
+    """
+    Find the brace-delimited units of C-family code (functions, classes, methods).
+
+    A unit runs from the start of the statement that opens a block (so
+    annotations, doc comments and multi-line signatures are included) to the
+    brace closing it. Blocks nested in a unit become its children.
+    """
+    newlines = [match.start() for match in re.finditer('\n', code)]
+
+    def line_of(position: int) -> int:
+        return bisect.bisect_right(newlines, position - 1) + 1
+
+    root = _node(1, len(newlines) + 1)
+    stack = [root]
+    # Where the statement currently being read started, per open block
+    statement_start = [None]
+
+    for match in _BRACE_TOKENS.finditer(code):
+        token = match.group()
+        if statement_start[-1] is None:
+            statement_start[-1] = match.start()
+
+        if token == '{':
+            node = _node(line_of(statement_start[-1]), line_of(match.start()))
+            stack[-1]["children"].append(node)
+            stack.append(node)
+            statement_start.append(None)
+        elif token == '}':
+            if len(stack) == 1:
+                continue  # Unbalanced closing brace
+            node = stack.pop()
+            node["end_line"] = line_of(match.start())
+            statement_start.pop()
+            statement_start[-1] = None
+        elif token == ';':
+            statement_start[-1] = None
+
+    # Blocks left open by truncated code run to the end
+    for node in stack[1:]:
+        node["end_line"] = root["end_line"]
+    return root["children"]
+
+def find_code_units(code: str, language: Optional[str], normalized: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Find the syntactic units of a file, or None if its language is not supported.
+
+    Args:
+        code: The code.
+        language: The file extension.
+        normalized: Whether the code was normalized (Python then has no indentation).
+    """
+    if language == "py":
+        units = None if normalized else find_python_units(code)
+        return units if units is not None else find_python_units_normalized(code)
+    if language in BRACE_LANGUAGES:
+        return find_brace_units(code)
+    return None
+
+def split_units(
+    code: str,
+    language: Optional[str],
+    chunker: Callable[[str], List[Dict[str, Any]]],
+    normalized: bool = False
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Split code into one chunk per top-level function, method or class.
+
+    A unit that the chunker cuts into several chunks is split into its nested
+    units instead (e.g. a class into its methods), and only units without any
+    left fall back to the chunker's token windows. Code between units (imports,
+    fields, class headers) becomes one chunk per run of consecutive lines.
+
+    Args:
+        code: The code.
+        language: The file extension.
+        chunker: Turns a unit's text into chunk dicts (token windows).
+        normalized: Whether the code was normalized.
+
+    Returns:
+        The chunk dicts with start_line and end_line (1-based, inclusive, in
+        code), or None if the language has no structural mode.
+    """
+    units = find_code_units(code, language, normalized)
+    if units is None:
+        return None
+
+    lines = code.split('\n')
+    chunks = []
+
+    def emit(unit_chunks: List[Dict[str, Any]], start_line: int, end_line: int):
+        for chunk in unit_chunks:
+            chunk["start_line"], chunk["end_line"] = start_line, end_line
+            chunks.append(chunk)
+
+    def emit_skeleton(line_numbers: List[int]):
+        # Each run of consecutive skeleton lines becomes its own chunk, so line spans stay exact
+        runs = []
+        for number in line_numbers:
+            if runs and runs[-1][1] == number - 1:
+                runs[-1][1] = number
+            else:
+                runs.append([number, number])
+        for start_line, end_line in runs:
+            text = '\n'.join(lines[start_line - 1:end_line])
+            if not _TRIVIAL.fullmatch(text):
+                emit(chunker(text), start_line, end_line)
+
+    def split(children: List[Dict[str, Any]], start_line: int, end_line: int):
+        # Lines of the enclosing span not covered by any child form its skeleton
+        covered = set()
+        for child in children:
+            covered.update(range(child["start_line"], child["end_line"] + 1))
+        emit_skeleton([number for number in range(start_line, end_line + 1) if number not in covered])
+
+        for child in children:
+            text = '\n'.join(lines[child["start_line"] - 1:child["end_line"]])
+            unit_chunks = chunker(text)
+            if len(unit_chunks) > 1 and child["children"]:
+                split(child["children"], child["start_line"], child["end_line"])
+            elif not _TRIVIAL.fullmatch(text):
+                emit(unit_chunks, child["start_line"], child["end_line"])
+
+    split(units, 1, len(lines))
+    # Keep chunks in file order
+    chunks.sort(key=lambda chunk: chunk["start_line"])
+    return chunks
@@ -1,10 +1,17 @@
 import os
+import bisect
+import codecs
 import logging
-from typing import List, Dict, Callable, Optional
+import threading
+import zlib
+from functools import lru_cache
+from typing import List, Dict, Callable, Optional, Tuple, Iterator
 import magic
 import tiktoken
 import re 
 
+from app.repository_layout import list_manifest_files
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -24,80 +31,257 @@ IGNORED_EXTENSIONS = {
 }
 
 MAX_FILE_SIZE_BYTES = 1 * 1024 * 1024  # 1 MB
+BINARY_SNIFF_BYTES = 8192  # Leading bytes inspected before falling back to libmagic
+
+# Binary classification per (path, size, mtime), kept for the duration of a job
+_binary_cache: Dict[Tuple[str, int, int], bool] = {}
+_binary_cache_lock = threading.Lock()
+
+# String literals, kept verbatim so comment markers inside them survive
+_DOUBLE_QUOTED = r'"[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"'
+_SINGLE_QUOTED = r"'[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'"
+_BACKTICK_QUOTED = r'`[^`\\]*(?:\\[\s\S][^`\\]*)*`'
+_TRIPLE_QUOTED = r'"""[\s\S]*?(?:"""|\Z)|' r"'''[\s\S]*?(?:'''|\Z)"
+_SQL_QUOTED = r"'[^'\n]*(?:''[^'\n]*)*'"
+
+# Comments and docstrings, removed
+_BLOCK_COMMENT = r'/\*[\s\S]*?(?:\*/|\Z)'
+_SLASH_COMMENT = r'//[^\n]*'
+_HASH_COMMENT = r'#[^\n]*'
+# Docstring: a triple-quoted string opening the body of a block header ("def f():", "class A:",
+# where any other block's bare string is just as inert), or the first statement of the module.
+# Triple-quoted call arguments and values are string literals like any other.
+_DOCSTRING_START = r'(?:(:)[ \t]*(?:#[^\n]*)?(\n)\s*|\A(?:[ \t]*(?:#[^\n]*)?\n)*[ \t]*)[rRuU]?'
+_DOCSTRING = _DOCSTRING_START + r'(?:' + _TRIPLE_QUOTED + r')'
+_DOCSTRING_OPENER = r'(?::[ \t]*(?:#[^\n]*)?\n\s*|\A(?:[ \t]*(?:#[^\n]*)?\n)*[ \t]*)[rRuU]?(?:"""|\'\'\')'
+
+# Lexer specification per language family:
+# (string literals, comments, comment openers, characters that may start either)
+LANGUAGE_FAMILIES = {
+    "c": ([_DOUBLE_QUOTED, _SINGLE_QUOTED, _BACKTICK_QUOTED], [_BLOCK_COMMENT, _SLASH_COMMENT], [r'/[/*]'], '"\'`/'),
+    "css": ([_DOUBLE_QUOTED, _SINGLE_QUOTED], [_BLOCK_COMMENT], [r'/\*'], '"\'/'),
+    # C comments plus "#" line comments
+    "php": ([_DOUBLE_QUOTED, _SINGLE_QUOTED, _BACKTICK_QUOTED], [_BLOCK_COMMENT, _SLASH_COMMENT, _HASH_COMMENT],
+            [r'/[/*]', r'#'], '"\'`/#'),
+    "python": ([_TRIPLE_QUOTED, _DOUBLE_QUOTED, _SINGLE_QUOTED], [_DOCSTRING, _HASH_COMMENT],
+               [r'#', _DOCSTRING_OPENER], '"\'#:\n'),
+    # "#" only starts a comment at the beginning of a word, so "${#list[@]}" and "a#b" survive
+    "shell": ([_DOUBLE_QUOTED, _SINGLE_QUOTED], [r'(?<!\S)' + _HASH_COMMENT], [r'(?<!\S)#'], '"\'#'),
+    # "#" line comments are MySQL's
+    "sql": ([_DOUBLE_QUOTED, _SQL_QUOTED], [_BLOCK_COMMENT, r'--[^\n]*', _HASH_COMMENT], [r'/\*', r'--', r'#'], '"\'/-#'),
+    "markup": ([], [r'<!--[\s\S]*?(?:-->|\Z)'], [r'<!--'], '<'),
+    # Language unknown (e.g. a pasted snippet): every comment style the old regexes removed
+    "generic": ([_TRIPLE_QUOTED, _DOUBLE_QUOTED, _SINGLE_QUOTED], [_DOCSTRING, _BLOCK_COMMENT, _SLASH_COMMENT, _HASH_COMMENT],
+                [r'/[/*]', r'#', _DOCSTRING_OPENER], '"\'/#:\n'),
+}
+
+EXTENSION_FAMILIES = {
+    "c": "c", "h": "c", "cpp": "c", "hpp": "c", "cs": "c", "java": "c",
+    "js": "c", "jsx": "c", "ts": "c", "tsx": "c", "go": "c", "rs": "c",
+    "kt": "c", "swift": "c", "scss": "c", "json": "c",
+    "php": "php",
+    "css": "css",
+    "py": "python",
+    "sh": "shell", "bash": "shell", "yaml": "shell", "yml": "shell", "rb": "shell",
+    "sql": "sql",
+    "html": "markup", "xml": "markup", "md": "markup",
+}
+
+def _compile_lexer(strings: List[str], comments: List[str], openers: List[str], specials: str) -> "re.Pattern":
+    """
+    Compile a family's lexer into a single pattern.
+
+    Each match is a run of code and string literals (group 1) followed by at
+    most one comment. Substituting group 1 (and the colon and newline of the
+    header in front of a docstring, groups 2 and 3) removes every comment in
+    one pass, with one match per comment rather than one per token.
 
-def normalize_code(code: str) -> str:
+    The branches of the run start with different characters, and the comment
+    after it is optional so the match never fails and the run is never
+    backtracked into: plain greedy repeats behave like possessive ones, which
+    Python only has from 3.11.
+    """
+    specials = re.escape(specials)
+    code = [f'[^{specials}]+'] + strings + [f'(?!{"|".join(openers)})[{specials}]']
+    return re.compile(f'((?:{"|".join(code)})*)(?:{"|".join(comments)})?')
+
+_FAMILY_LEXERS = {family: _compile_lexer(*spec) for family, spec in LANGUAGE_FAMILIES.items()}
+
+def get_language_family(language: Optional[str]) -> str:
+    """Maps a file extension or family name to a lexer family, defaulting to generic."""
+    if not language:
+        return "generic"
+    language = language.lower().lstrip('.')
+    if language in LANGUAGE_FAMILIES:
+        return language
+    return EXTENSION_FAMILIES.get(language, "generic")
+
+def normalize_code(code: str, language: Optional[str] = None) -> str:
     """
     Normalize code by:
-    - Removing comments
+    - Removing comments (and docstrings) in a single lexer pass that leaves string literals intact
     - Converting to lowercase
     - Normalizing indentation and whitespace
+    
+    Args:
+        code: The source code.
+        language: File extension or family (c, css, php, python, shell, sql, markup);
+            unknown code is lexed with every comment style.
     """
     if not isinstance(code, str):
         code = str(code)
 
-    # Remove single-line comments
-    code = re.sub(r'(//.*?$)|(#.*?$)', '', code, flags=re.MULTILINE)
-    
-    # Remove multi-line comments
-    code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
-    
-    # Remove docstrings
-    code = re.sub(r'""".*?"""', '', code, flags=re.DOTALL)
-    code = re.sub(r"'''.*?'''", '', code, flags=re.DOTALL)
-    
-    # Normalize indentation (convert to spaces, standardize)
-    lines = [line.strip() for line in code.split('\n') if line.strip()]
-    
-    # Convert to lowercase
-    lines = [line.lower() for line in lines]
-    
-    # Normalize indentation
-    return '\n'.join(lines)
+    lexer = _FAMILY_LEXERS[get_language_family(language)]
+    template = r'\1\2\3' if lexer.groups > 1 else r'\1'
+    # The leading newline puts the start of the file on a character where a module docstring is looked for
+    code = lexer.sub(template, '\n' + code)
+
+    # Strip indentation, drop blank lines and lowercase in one sweep
+    return '\n'.join([line for line in map(str.strip, code.lower().split('\n')) if line])
 
 def get_file_extension(file_path: str) -> str:
     """Returns the file extension (without dot), or filename if none."""
     _, ext = os.path.splitext(file_path)
     return ext[1:].lower() if ext else os.path.basename(file_path)
 
+def sniff_binary(head: bytes) -> Optional[bool]:
+    """
+    Cheap binary check on the leading bytes of a file.
+    
+    Returns True for a NUL byte, False for valid UTF-8 (a multi-byte sequence cut
+    off at the end of the sample is allowed), or None when only libmagic can tell.
+    Empty input is left to libmagic, which does not report it as text.
+    """
+    if not head:
+        return None
+    if b'\x00' in head:
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return False
+    except UnicodeDecodeError:
+        return None
+
 def is_binary_file(file_path: str) -> bool:
-    """Detects if a file is binary using python-magic."""
+    """Detects if a file is binary, sniffing the first bytes and falling back to python-magic."""
     try:
+        with open(file_path, 'rb') as f:
+            verdict = sniff_binary(f.read(BINARY_SNIFF_BYTES))
+        if verdict is not None:
+            return verdict
+
         file_type = magic.from_file(file_path, mime=True)
         return not file_type.startswith(('text/', 'application/json', 'application/xml'))
     except Exception as e:
         logger.error(f"Error checking if file is binary: {str(e)}")
         return True  # Assume binary if detection fails
 
-def is_valid_code_file(file_path: str) -> bool:
-    """Checks if the given file should be treated as code."""
+def is_binary_content(data: bytes) -> bool:
+    """Detects if an in-memory blob is binary, sniffing the first bytes and falling back to python-magic."""
+    verdict = sniff_binary(data[:BINARY_SNIFF_BYTES])
+    if verdict is not None:
+        return verdict
+
+    try:
+        file_type = magic.from_buffer(data[:BINARY_SNIFF_BYTES], mime=True)
+        return not file_type.startswith(('text/', 'application/json', 'application/xml'))
+    except Exception as e:
+        logger.error(f"Error checking if content is binary: {str(e)}")
+        return True  # Assume binary if detection fails
+
+def clear_binary_cache():
+    """Forget memoized binary classifications, called at the start of each job."""
+    with _binary_cache_lock:
+        _binary_cache.clear()
+
+def is_code_extension(file_path: str) -> bool:
+    """Checks the extension allow-list without touching the file."""
     ext = get_file_extension(file_path)
+    return ext not in IGNORED_EXTENSIONS and ext in CODE_EXTENSIONS
 
-    if ext in IGNORED_EXTENSIONS:
-        return False
-    if ext not in CODE_EXTENSIONS:
+def is_valid_code_file(file_path: str, memoize: bool = True) -> bool:
+    """
+    Checks if the given file should be treated as code.
+    
+    The extension allow-list answers first, then the size from a single stat, and
+    only then is the content classified, memoized per (path, size, mtime).
+    
+    Args:
+        file_path: The file to check.
+        memoize: Cache the content classification; long-lived worker processes that
+            see every file once pass False so their cache does not outlive a job.
+    """
+    if not is_code_extension(file_path):
         return False
-    if is_binary_file(file_path):
+
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
+        logger.error(f"Error reading file {file_path}: {str(e)}")
         return False
-    if os.path.getsize(file_path) > MAX_FILE_SIZE_BYTES:
+
+    if stat.st_size > MAX_FILE_SIZE_BYTES:
         logger.warning(f"File {file_path} is too large (>1MB), skipping")
         return False
 
-    return True
+    if not memoize:
+        return not is_binary_file(file_path)
+
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+    binary = _binary_cache.get(key)
+    if binary is None:
+        binary = is_binary_file(file_path)
+        with _binary_cache_lock:
+            _binary_cache[key] = binary
+
+    return not binary
+
+def iter_code_files(directory: str) -> Iterator[str]:
+    """
+    Recursively yields valid code files from the given directory as they are found.
+    
+    A normalized repositories directory with a manifest is not walked; its
+    recorded files are yielded instead.
+    """
+    manifest_files = list_manifest_files(directory)
+    if manifest_files is not None:
+        yield from manifest_files
+        return
 
-def get_all_code_files(directory: str) -> List[str]:
-    """Recursively collects all valid code files from the given directory."""
-    code_files = []
     for root, _, files in os.walk(directory):
         for file in files:
             path = os.path.join(root, file)
             if is_valid_code_file(path):
-                code_files.append(path)
-    return code_files
+                yield path
+
+def get_all_code_files(directory: str) -> List[str]:
+    """Recursively collects all valid code files from the given directory."""
+    return list(iter_code_files(directory))
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base") -> "tiktoken.Encoding":
+    """Returns the tiktoken encoding, loaded once per process."""
+    return tiktoken.get_encoding(encoding_name)
 
 def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
     """Returns the number of tokens in a string using the specified encoding."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    return len(encoding.encode(string))
+    return len(get_encoding(encoding_name).encode(string))
+
+def count_line_tokens(lines: List[str], token_counter: Optional[Callable[[str], int]] = None) -> List[int]:
+    """
+    Returns the token count of every line (with its newline), counting each distinct line once.
+    
+    Args:
+        lines: The lines, without newlines.
+        token_counter: Function to count tokens (defaults to tiktoken, encoded as one batch)
+    """
+    unique = list(dict.fromkeys(lines))
+    if token_counter is None:
+        counts = [len(tokens) for tokens in get_encoding().encode_batch([line + '\n' for line in unique])]
+    else:
+        counts = [token_counter(line + '\n') for line in unique]
+    sizes = dict(zip(unique, counts))
+    return [sizes[line] for line in lines]
 
 def count_tokens_with_huggingface(string: str, tokenizer) -> int:
     """
@@ -133,34 +317,129 @@ def chunk_code(
         return [code]
 
     lines = code.split('\n')
+    n = len(lines)
+
+    # prefix[i] is the token count of lines[:i], so any run of lines is sized in O(1)
+    prefix = [0]
+    for size in count_line_tokens(lines, token_counter):
+        prefix.append(prefix[-1] + size)
+
     chunks = []
-    current_chunk = []
-    current_size = 0
+    # The open chunk holds lines[start:end]; its last line was added regardless of the budget
+    start, end = 0, 1
+    while True:
+        # The first line that no longer fits closes the chunk
+        overflow = bisect.bisect_right(prefix, prefix[start] + chunk_size, end + 1, n + 1)
+        if overflow > n:
+            break
+        last = overflow - 1
+        chunks.append('\n'.join(lines[start:last]))
+
+        # Longest suffix of the closed chunk within the overlap budget
+        start = bisect.bisect_left(prefix, prefix[last] - chunk_overlap, start, last)
+        end = last + 1
 
-    for line in lines:
-        line_size = counter(line + '\n')
+    chunks.append('\n'.join(lines[start:]))
+    return chunks
 
-        if current_size + line_size > chunk_size and current_chunk:
-            chunks.append('\n'.join(current_chunk))
+def chunk_token_spans(
+    code: str,
+    offsets: List[Tuple[int, int]],
+    chunk_size: int = 510,
+    chunk_overlap: int = 100
+) -> List[Tuple[int, int]]:
+    """
+    Splits a tokenized text into overlapping token windows, ideally aligned to newlines.
+    
+    Works on the embedding model's own tokens, so every window fits the model
+    exactly and nothing is truncated: a line longer than the window is cut
+    between tokens instead.
+    
+    Args:
+        code: The text that was tokenized.
+        offsets: (start, end) character offsets of every token, without special tokens.
+        chunk_size: Max tokens per chunk.
+        chunk_overlap: Tokens to overlap between chunks.
+
+    Returns:
+        (start, end) token index ranges, one per chunk.
+    """
+    total = len(offsets)
+    if total <= chunk_size:
+        return [(0, total)]
 
-            # Build overlap
-            overlap_size = 0
-            overlap_lines = []
-            for prev_line in reversed(current_chunk):
-                size = counter(prev_line + '\n')
-                if overlap_size + size <= chunk_overlap:
-                    overlap_lines.insert(0, prev_line)
-                    overlap_size += size
-                else:
-                    break
+    # Token index at which every line starts (just after the token holding its newline)
+    starts = [start for start, _ in offsets]
+    boundaries = sorted({0, total} | {
+        bisect.bisect_right(starts, newline.start())
+        for newline in re.finditer('\n', code)
+    })
 
-            current_chunk = overlap_lines
-            current_size = overlap_size
+    spans = []
+    start = 0
+    while total - start > chunk_size:
+        # Last line boundary that fits the window, or the full window if no line does
+        end = boundaries[bisect.bisect_right(boundaries, start + chunk_size) - 1]
+        cut_mid_line = end <= start
+        if cut_mid_line:
+            end = start + chunk_size
+        spans.append((start, end))
+
+        # Earliest line boundary within the overlap budget
+        next_start = boundaries[bisect.bisect_left(boundaries, end - chunk_overlap)]
+        if not start < next_start < end:
+            next_start = max(end - chunk_overlap, start + 1) if cut_mid_line else end
+        start = next_start
+
+    spans.append((start, total))
+    return spans
+
+def content_defined_spans(
+    lines: List[str],
+    line_token_counts: List[int],
+    min_tokens: int = 256,
+    max_tokens: int = 510,
+    boundary_bits: int = 3
+) -> List[Tuple[int, int]]:
+    """
+    Groups lines into content-defined chunks whose boundaries survive local edits.
+    
+    A rolling hash over the line hashes ends a chunk after any line where its
+    low boundary_bits bits are all zero. Those bits only depend on the last
+    boundary_bits lines, so inserting or changing a line only moves the
+    boundaries next to it, and chunks further away are cut the same as before.
+    Chunks do not overlap, since an overlap would make each chunk depend on its
+    neighbour.
+    
+    Args:
+        lines: The normalized lines.
+        line_token_counts: Tokens per line.
+        min_tokens: No content-defined boundary is placed before a chunk has this many tokens.
+        max_tokens: A chunk is cut before the line that would take it past this many tokens.
+        boundary_bits: Past min_tokens, a boundary follows a line with probability 2**-boundary_bits.
+
+    Returns:
+        (start, end) line index ranges, one per chunk. A single line longer than
+        max_tokens is a chunk of its own.
+    """
+    mask = (1 << boundary_bits) - 1
+    spans = []
+    start = 0
+    tokens = 0
+    rolling = 0
 
-        current_chunk.append(line)
-        current_size += line_size
+    for i, (line, count) in enumerate(zip(lines, line_token_counts)):
+        if tokens and tokens + count > max_tokens:
+            spans.append((start, i))
+            start, tokens = i, 0
+        tokens += count
 
-    if current_chunk:
-        chunks.append('\n'.join(current_chunk))
+        # Low bits of a shift-and-add hash only depend on the last few lines (crc32 is stable across runs)
+        rolling = ((rolling << 1) + zlib.crc32(line.encode('utf-8'))) & 0xFFFFFFFF
+        if tokens >= min_tokens and not rolling & mask:
+            spans.append((start, i + 1))
+            start, tokens = i + 1, 0
 
-    return chunks
\ No newline at end of file
+    if start < len(lines):
+        spans.append((start, len(lines)))
+    return spans
@@ -1,164 +1,628 @@
 import os
 import json
+import time
 import logging
+import threading
 import numpy as np
 import faiss
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+# "flat" searches exactly; "ivf" and "hnsw" are approximate and only used once the store holds
+# VECTOR_INDEX_MIN_VECTORS vectors, smaller stores stay flat
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+VECTOR_INDEX_MIN_VECTORS = int(os.getenv("VECTOR_INDEX_MIN_VECTORS", "100000"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # Inverted lists (0 = 4 * sqrt(vectors))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))  # Lists scanned per query, unless the request says otherwise
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", "100000"))  # Vectors k-means is trained on (at least 40 per list)
+HNSW_M = int(os.getenv("HNSW_M", "32"))  # Graph neighbours per vector
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))  # Candidates kept per query, unless the request says otherwise
+# HNSW cannot delete from its graph: removed vectors stay in it, skipped by searches, until they make up this fraction
+HNSW_REBUILD_RATIO = float(os.getenv("HNSW_REBUILD_RATIO", "0.2"))
+
+# Metadata fields describing where a chunk came from, kept for each of its provenances
+PROVENANCE_FIELDS = (
+    "file_path", "file_name", "file_extension", "file_size", "chunk_index", "total_chunks",
+    "start_line", "end_line", "repo_url", "archive", "source_path"
+)
+
+def get_provenance(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the provenance fields of a chunk's metadata."""
+    return {key: metadata[key] for key in PROVENANCE_FIELDS if key in metadata}
+
+def get_provenances(metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Returns every (file, chunk_index) a stored chunk came from, its own first."""
+    return metadata.get("provenances") or [get_provenance(metadata)]
+
+def get_provenance_view(metadata: Dict[str, Any], provenance: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the metadata of one provenance of a stored chunk: the chunk's own
+    fields (hash, tokens...) with only that provenance's source fields, so
+    repo_url or archive of another provenance never leak into it.
+    """
+    view = {k: v for k, v in metadata.items() if k not in PROVENANCE_FIELDS and k != "provenances"}
+    view.update(provenance)
+    return view
+
+def get_index_type(index: faiss.Index) -> str:
+    """Returns "flat", "ivf" or "hnsw" for an index, including one read from disk."""
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+def get_index_params(index: faiss.Index) -> Dict[str, int]:
+    """Returns the construction parameters of an index, which faiss saves with it."""
+    index_type = get_index_type(index)
+    if index_type == "ivf":
+        return {"nlist": index.nlist}
+    if index_type == "hnsw":
+        return {"M": index.hnsw.nb_neighbors(1), "ef_construction": index.hnsw.efConstruction}
+    return {}
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", params: Optional[Dict[str, int]] = None) -> faiss.Index:
+    """
+    Build an inner-product index of the given type holding vectors, with ids in row order.
+    
+    IVF lists are trained with k-means on a random sample of the vectors, and
+    keep a hashtable direct map so vectors can be reconstructed and removed by id.
+    
+    Args:
+        vectors: Unit-normalized float32 vectors, one per row.
+        index_type: "flat", "ivf" or "hnsw".
+        params: Construction parameters ("nlist"; "M", "ef_construction"), defaulting to the environment's.
+        
+    Returns:
+        The populated index.
+        
+    Raises:
+        ValueError: If the index type is unknown.
+    """
+    params = params or {}
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dimension = vectors.shape
+    if index_type == "flat":
+        # Use IndexFlatIP because all embeddings are unit-normalized
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "ivf":
+        nlist = params.get("nlist") or IVF_NLIST or int(4 * np.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // 39))  # k-means wants 39+ training points per list
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample_size = min(num_vectors, max(IVF_TRAIN_SAMPLE, 40 * nlist))
+        sample = np.random.default_rng(0).choice(num_vectors, sample_size, replace=False)
+        index.train(vectors[np.sort(sample)])
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params.get("M") or HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params.get("ef_construction") or HNSW_EF_CONSTRUCTION
+    else:
+        raise ValueError(f"Unknown index type {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+    add_vectors(index, vectors, 0)
+    return index
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray, first_id: int) -> np.ndarray:
+    """
+    Add vectors to an index with consecutive ids from first_id, and return the ids.
+    
+    Flat and HNSW indexes number vectors by position, so first_id must be their
+    ntotal; IVF stores the ids it is given, which its hashtable map requires.
+    """
+    ids = np.arange(first_id, first_id + len(vectors), dtype=np.int64)
+    if get_index_type(index) == "ivf":
+        index.add_with_ids(vectors, ids)
+    else:
+        index.add(vectors)
+    return ids
+
+def get_search_params(
+    index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector: Optional[faiss.IDSelector] = None
+):
+    """Search parameters of one query batch: nprobe for IVF, ef_search (and the live vectors) for HNSW, or the defaults."""
+    index_type = get_index_type(index)
+    if index_type == "ivf":
+        return faiss.SearchParametersIVF(nprobe=min(nprobe or IVF_NPROBE, index.nlist))
+    if index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or HNSW_EF_SEARCH)
+        if selector is not None:
+            params.sel = selector
+        return params
+    return None
+
 class CodeVectorStore:
     """
     Stores and retrieves code embeddings using FAISS.
     """
     
-    def __init__(self, vector_dimension: int = 768):
+    def __init__(self, vector_dimension: int = 768, embedding_space: Optional[str] = None):
         self.vector_dimension = vector_dimension
+        # Model (and precision, e.g. "...:int8") the vectors come from; None accepts any
+        self.embedding_space = embedding_space
         self.index = None
         self.metadata = []
         self.chunks = []
         self.index_path = os.path.join(os.getcwd(), "vector_store")
         os.makedirs(self.index_path, exist_ok=True)
+        # Ingestion adds batches while searches are being served
+        self._lock = threading.RLock()
+        # Held while an index is rebuilt outside _lock, and removals seen, to detect overlapping ones
+        self._rebuild_lock = threading.Lock()
+        self._removals = 0
+        # Row of every stored chunk_hash; None until first needed, and after rows move
+        self._hash_rows = None
+        # Index id of each row, increasing; ids are rows until vectors are removed from an IVF or HNSW index
+        self._ids = np.empty(0, dtype=np.int64)
+        # Live vectors of an HNSW index holding removed ones, as (ntotal, bitmap, selector); None until searched
+        self._selector = None
+
+    def _get_hash_rows(self) -> Dict[str, int]:
+        """Map each stored chunk_hash to its row, rebuilding the map after rows moved."""
+        if self._hash_rows is None:
+            self._hash_rows = {
+                meta["chunk_hash"]: i for i, meta in enumerate(self.metadata) if meta.get("chunk_hash")
+            }
+        return self._hash_rows
+
+    def _add_vectors(self, vectors: np.ndarray):
+        """Add the vectors of new rows to the index, after the ids already given out."""
+        if get_index_type(self.index) == "ivf":
+            first_id = int(self._ids[-1]) + 1 if len(self._ids) else 0
+        else:
+            first_id = self.index.ntotal
+        self._ids = np.concatenate([self._ids, add_vectors(self.index, vectors, first_id)])
+
+    def _get_selector(self) -> Optional[faiss.IDSelector]:
+        """Selector of the live vectors of an HNSW index holding removed ones, None if it holds none."""
+        if get_index_type(self.index) != "hnsw" or self.index.ntotal == len(self._ids):
+            return None
+        if self._selector is None or self._selector[0] != self.index.ntotal:
+            live = np.zeros(self.index.ntotal, dtype=bool)
+            live[self._ids] = True
+            bitmap = np.packbits(live, bitorder="little")
+            # The selector reads the bitmap, which is kept alongside it
+            self._selector = (self.index.ntotal, bitmap, faiss.IDSelectorBitmap(self.index.ntotal, faiss.swig_ptr(bitmap)))
+        return self._selector[2]
+
+    def has_chunk(self, chunk_hash: Optional[str]) -> bool:
+        """Checks whether a chunk with this hash is already stored (so it need not be embedded)."""
+        with self._lock:
+            return bool(chunk_hash) and chunk_hash in self._get_hash_rows()
 
     def add_embeddings(self, embeddings_data: List[Dict[str, Any]]) -> bool:
         """
         Add code embeddings and metadata to the store.
+        
+        Chunks are deduplicated by chunk_hash: a chunk that is already stored is
+        not indexed again, its file and chunk_index are added to the stored
+        chunk's provenances instead. Such items may come without an embedding.
         """
-        if not embeddings_data:
-            logger.warning("No embeddings data provided.")
-            return False
+        with self._lock:
+            if not embeddings_data:
+                logger.warning("No embeddings data provided.")
+                return False
 
-        try:
-            vectors = np.array([item["embedding"] for item in embeddings_data], dtype=np.float32)
+            try:
+                hash_rows = self._get_hash_rows()
+                new_items = []
+                duplicates = 0
+                for item in embeddings_data:
+                    chunk_hash = item["metadata"].get("chunk_hash")
+                    row = hash_rows.get(chunk_hash) if chunk_hash else None
+                    if row is not None:
+                        # The first copy may be earlier in this same batch
+                        stored = self.metadata[row] if row < len(self.metadata) else new_items[row - len(self.metadata)]["metadata"]
+                        self._add_provenance(stored, item["metadata"])
+                        duplicates += 1
+                    elif item.get("embedding") is None:
+                        logger.warning(f"Skipping chunk of {item['metadata'].get('file_path')} without an embedding")
+                    else:
+                        if chunk_hash:
+                            hash_rows[chunk_hash] = len(self.metadata) + len(new_items)
+                        new_items.append(item)
 
+                if new_items:
+                    vectors = np.array([item["embedding"] for item in new_items], dtype=np.float32)
+
+                    if self.index is None:
+                        self.index = build_index(np.empty((0, self.vector_dimension), dtype=np.float32))
+
+                    self._add_vectors(vectors)
+
+                    self.metadata.extend([item["metadata"] for item in new_items])
+                    self.chunks.extend([item["chunk"] for item in new_items])
+
+                logger.info(f"Added {len(new_items)} embeddings to vector store ({duplicates} duplicates).")
+            except Exception as e:
+                # Rows may not match the map any more
+                self._hash_rows = None
+                logger.error(f"Failed to add embeddings: {e}")
+                return False
+
+        # Outside the lock, so searches are served while an approximate index is built
+        self._maybe_rebuild_index()
+        return True
+
+    def _maybe_rebuild_index(self):
+        """
+        Rebuild the index once it is due: a flat one as VECTOR_INDEX_TYPE once it
+        holds VECTOR_INDEX_MIN_VECTORS vectors, an HNSW one once removed vectors
+        make up HNSW_REBUILD_RATIO of its graph.
+        """
+        with self._lock:
             if self.index is None:
-                # Use IndexFlatIP because all embeddings are unit-normalized
-                self.index = faiss.IndexFlatIP(self.vector_dimension)
+                return
+            index_type = get_index_type(self.index)
+            if index_type == "flat":
+                if VECTOR_INDEX_TYPE == "flat" or self.index.ntotal < VECTOR_INDEX_MIN_VECTORS:
+                    return
+                index_type = VECTOR_INDEX_TYPE
+            elif index_type != "hnsw" or self.index.ntotal - len(self._ids) <= HNSW_REBUILD_RATIO * self.index.ntotal:
+                return
+        self._rebuild_index(index_type)
 
-            self.index.add(vectors)
+    def _rebuild_index(self, index_type: str):
+        """
+        Rebuild the index as index_type without holding up searches.
+        
+        The live vectors are copied under the lock, the new index is trained and
+        built outside it, then swapped in under the lock along with the vectors
+        added meanwhile, renumbering the ids to rows. A build that overlapped a
+        removal, clear or load is dropped, and the next add or removal tries again.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            return  # Another thread is already rebuilding
+        try:
+            with self._lock:
+                index, removals, rows = self.index, self._removals, len(self._ids)
+                vectors = index.reconstruct_batch(self._ids)
+                # An HNSW graph rebuilt to drop removed vectors keeps its construction parameters
+                params = get_index_params(index) if get_index_type(index) == index_type else None
 
-            self.metadata.extend([item["metadata"] for item in embeddings_data])
-            self.chunks.extend([item["chunk"] for item in embeddings_data])
+            start = time.time()
+            try:
+                new_index = build_index(vectors, index_type, params)
+            except Exception as e:
+                # The current index is still complete and searched as before
+                logger.error(f"Failed to build a {index_type} index, keeping the {get_index_type(index)} one: {str(e)}")
+                return
+            del vectors
 
-            logger.info(f"Added {len(embeddings_data)} embeddings to vector store.")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to add embeddings: {e}")
-            return False
+            with self._lock:
+                if self.index is not index or self._removals != removals:
+                    logger.warning(f"Vector store changed while building a {index_type} index, dropping it")
+                    return
+                added = index.reconstruct_batch(self._ids[rows:]) if len(self._ids) > rows else None
+                self.index, self._ids, self._selector = new_index, np.arange(rows, dtype=np.int64), None
+                if added is not None:
+                    self._add_vectors(added)
+                logger.info(
+                    f"Rebuilt the vector store as a {index_type} index {get_index_params(new_index)} "
+                    f"of {new_index.ntotal} vectors in {time.time() - start:.1f}s"
+                )
+        finally:
+            self._rebuild_lock.release()
 
-    def search(self, query_embedding: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+    def _add_provenance(self, stored: Dict[str, Any], metadata: Dict[str, Any]):
+        """Record that a stored chunk also occurs at the (file, chunk_index) of metadata."""
+        provenance = get_provenance(metadata)
+        provenances = get_provenances(stored)
+        if provenance not in provenances:
+            stored["provenances"] = provenances + [provenance]
+
+    def remove_embeddings(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """
+        Remove every stored chunk whose metadata matches the predicate.
+        
+        The predicate is applied to each provenance of a deduplicated chunk (with
+        the chunk's other metadata), so only the matching provenances are dropped
+        and the chunk itself is removed once it has none left.
+        
+        Returns:
+            The number of chunk occurrences removed.
+        """
+        with self._lock:
+            if self.index is None or not self.metadata:
+                return 0
+
+            try:
+                stale_ids = []
+                removed = 0
+                for i, meta in enumerate(self.metadata):
+                    provenances = get_provenances(meta)
+                    kept = [p for p in provenances if not predicate(get_provenance_view(meta, p))]
+                    removed += len(provenances) - len(kept)
+                    if not kept:
+                        stale_ids.append(i)
+                    elif len(kept) < len(provenances):
+                        # The first remaining provenance becomes the chunk's own
+                        for key in PROVENANCE_FIELDS:
+                            meta.pop(key, None)
+                        meta.update(kept[0])
+                        if len(kept) > 1:
+                            meta["provenances"] = kept
+                        else:
+                            meta.pop("provenances", None)
+
+                if stale_ids:
+                    stale = set(stale_ids)
+                    index_type = get_index_type(self.index)
+                    if index_type != "hnsw":
+                        # IVF drops the ids from its lists; IndexFlat also compacts, renumbering the rest
+                        self.index.remove_ids(self._ids[stale_ids])
+                    # HNSW vectors stay in the graph, skipped by searches, until it is rebuilt
+                    self._ids = np.arange(self.index.ntotal, dtype=np.int64) if index_type == "flat" else np.delete(self._ids, stale_ids)
+                    self._selector = None
+                    self.metadata = [m for i, m in enumerate(self.metadata) if i not in stale]
+                    self.chunks = [c for i, c in enumerate(self.chunks) if i not in stale]
+                    self._hash_rows = None
+                    self._removals += 1
+
+                if removed:
+                    logger.info(f"Removed {removed} embeddings from vector store ({len(stale_ids)} vectors).")
+            except Exception as e:
+                self._hash_rows = None
+                logger.error(f"Failed to remove embeddings: {e}")
+                return 0
+
+        if stale_ids:
+            self._maybe_rebuild_index()
+        return removed
+
+    def has_provenance(self, predicate: Callable[[Dict[str, Any]], bool]) -> bool:
+        """Checks whether any provenance of a stored chunk matches the predicate."""
+        with self._lock:
+            return any(predicate(get_provenance_view(meta, p)) for meta in self.metadata for p in get_provenances(meta))
+
+    def export_embeddings(self, predicate: Callable[[Dict[str, Any]], bool]) -> Dict[str, List[float]]:
+        """
+        Collect the vectors of stored chunks matching the predicate, by chunk_hash.
+        
+        Taken before chunks are retired, so the ones that come back unchanged
+        can reuse their vectors instead of being embedded again.
+        
+        Returns:
+            Vectors keyed by chunk_hash; chunks stored without a hash are skipped.
+        """
+        with self._lock:
+            if self.index is None or not self.metadata:
+                return {}
+
+            try:
+                rows = [
+                    i for i, meta in enumerate(self.metadata)
+                    if meta.get("chunk_hash") and any(predicate(get_provenance_view(meta, p)) for p in get_provenances(meta))
+                ]
+                if not rows:
+                    return {}
+
+                vectors = self.index.reconstruct_batch(self._ids[rows])
+                return {
+                    self.metadata[row]["chunk_hash"]: vector.tolist()
+                    for row, vector in zip(rows, vectors)
+                }
+            except Exception as e:
+                logger.error(f"Failed to export embeddings: {e}")
+                return {}
+
+    def search(
+        self, query_embedding: List[float], top_k: int = 5, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for the top_k most similar code chunks.
         """
-        if self.index is None or not self.metadata:
-            logger.warning("Vector store is empty.")
-            return []
+        return self.search_batch([query_embedding], top_k, nprobe, ef_search)[0]
 
-        try:
-            query = np.array([query_embedding], dtype=np.float32)
-            distances, indices = self.index.search(query, min(top_k, len(self.metadata)))
-
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if 0 <= idx < len(self.metadata):
-                    # Convert L2 distance to a similarity score (higher is better)
-                    # For CodeBERT, we can use a simple normalization
-                    distance = float(distances[0][i])
-                    max_distance = float(self.vector_dimension)  # Theoretical max L2 distance for normalized vectors
-                    similarity = 1.0 - (distance / max_distance)
-                    
-                    results.append({
-                        "chunk": self.chunks[idx],
-                        "metadata": self.metadata[idx],
-                        "distance": distance,
-                        "similarity": similarity
-                    })
-            
-            return results
-        except Exception as e:
-            logger.error(f"Search error: {e}")
-            return []
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for the top_k most similar code chunks of many queries with one index search.
+        
+        Args:
+            query_embeddings: Query vectors.
+            top_k: Results per query.
+            nprobe: IVF lists scanned, instead of IVF_NPROBE (ignored by other indexes).
+            ef_search: HNSW candidates kept, instead of HNSW_EF_SEARCH (ignored by other indexes).
+        
+        Returns:
+            The results of each query, in query order.
+        """
+        with self._lock:
+            if self.index is None or not self.metadata:
+                logger.warning("Vector store is empty.")
+                return [[] for _ in query_embeddings]
+
+            try:
+                queries = np.array(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+                distances, ids = self.index.search(
+                    queries, min(top_k, len(self.metadata)),
+                    params=get_search_params(self.index, nprobe, ef_search, self._get_selector())
+                )
+                # Ids increase with rows; approximate indexes pad with -1 when they find fewer than top_k candidates
+                indices = np.searchsorted(self._ids, ids)
+                found = (ids >= 0) & (indices < len(self._ids))
+                found[found] = self._ids[indices[found]] == ids[found]
+
+                all_results = []
+                for row in range(len(queries)):
+                    results = []
+                    for i, idx in enumerate(indices[row]):
+                        if found[row][i]:
+                            # Convert L2 distance to a similarity score (higher is better)
+                            # For CodeBERT, we can use a simple normalization
+                            distance = float(distances[row][i])
+                            max_distance = float(self.vector_dimension)  # Theoretical max L2 distance for normalized vectors
+                            similarity = 1.0 - (distance / max_distance)
+
+                            results.append({
+                                "chunk": self.chunks[idx],
+                                "metadata": self.metadata[idx],
+                                "provenances": get_provenances(self.metadata[idx]),
+                                "distance": distance,
+                                "similarity": similarity
+                            })
+                    all_results.append(results)
+
+                return all_results
+            except Exception as e:
+                logger.error(f"Search error: {e}")
+                return [[] for _ in query_embeddings]
 
     def save(self, filename: str = "code_vector_store") -> bool:
         """
         Persist the vector store index and metadata to disk.
         """
-        try:
-            if self.index is None:
-                logger.warning("No index to save.")
-                return False
+        with self._lock:
+            try:
+                if self.index is None:
+                    logger.warning("No index to save.")
+                    return False
+
+                info_path = os.path.join(self.index_path, f"{filename}_info.json")
+                stored_space = self._read_embedding_space(info_path)
+                if stored_space and self.embedding_space and stored_space != self.embedding_space:
+                    logger.error(
+                        f"Refusing to overwrite a vector store of {stored_space} vectors "
+                        f"with {self.embedding_space} vectors"
+                    )
+                    return False
                 
-            faiss.write_index(self.index, os.path.join(self.index_path, f"{filename}.index"))
+                faiss.write_index(self.index, os.path.join(self.index_path, f"{filename}.index"))
+
+                with open(os.path.join(self.index_path, f"{filename}_metadata.json"), "w", encoding="utf-8") as f:
+                    json.dump(self.metadata, f)
 
-            with open(os.path.join(self.index_path, f"{filename}_metadata.json"), "w", encoding="utf-8") as f:
-                json.dump(self.metadata, f)
+                with open(os.path.join(self.index_path, f"{filename}_chunks.json"), "w", encoding="utf-8") as f:
+                    json.dump(self.chunks, f)
 
-            with open(os.path.join(self.index_path, f"{filename}_chunks.json"), "w", encoding="utf-8") as f:
-                json.dump(self.chunks, f)
+                np.save(os.path.join(self.index_path, f"{filename}_ids.npy"), self._ids)
 
-            logger.info(f"Saved vector store to {self.index_path}")
-            return True
-        except Exception as e:
-            logger.error(f"Error saving vector store: {e}")
-            return False
+                with open(info_path, "w", encoding="utf-8") as f:
+                    json.dump({
+                        "embedding_space": self.embedding_space,
+                        "vector_dimension": self.vector_dimension,
+                        # Also stored in the index file; recorded here to be read without loading it
+                        "index_type": get_index_type(self.index),
+                        "index_params": get_index_params(self.index)
+                    }, f)
+
+                logger.info(f"Saved vector store to {self.index_path}")
+                return True
+            except Exception as e:
+                logger.error(f"Error saving vector store: {e}")
+                return False
 
     def load(self, filename: str = "code_vector_store") -> bool:
         """
         Load the vector store from disk.
         """
-        try:
-            index_path = os.path.join(self.index_path, f"{filename}.index")
-            meta_path = os.path.join(self.index_path, f"{filename}_metadata.json")
-            chunks_path = os.path.join(self.index_path, f"{filename}_chunks.json")
+        with self._lock:
+            try:
+                index_path = os.path.join(self.index_path, f"{filename}.index")
+                meta_path = os.path.join(self.index_path, f"{filename}_metadata.json")
+                chunks_path = os.path.join(self.index_path, f"{filename}_chunks.json")
 
-            if not all(os.path.exists(p) for p in [index_path, meta_path, chunks_path]):
-                logger.warning(f"Vector store files not found in {self.index_path}")
-                return False
+                if not all(os.path.exists(p) for p in [index_path, meta_path, chunks_path]):
+                    logger.warning(f"Vector store files not found in {self.index_path}")
+                    return False
 
-            self.index = faiss.read_index(index_path)
-            self.vector_dimension = self.index.d  # Update dimension from loaded index
+                stored_space = self._read_embedding_space(os.path.join(self.index_path, f"{filename}_info.json"))
+                if stored_space and self.embedding_space and stored_space != self.embedding_space:
+                    logger.error(
+                        f"Vector store holds {stored_space} vectors but {self.embedding_space} vectors "
+                        f"are produced; not loading it (re-ingest, or switch back the embedding backend)"
+                    )
+                    return False
 
-            with open(meta_path, "r", encoding="utf-8") as f:
-                self.metadata = json.load(f)
+                self.index = faiss.read_index(index_path)
+                self.vector_dimension = self.index.d  # Update dimension from loaded index
+                if get_index_type(self.index) == "ivf" and self.index.direct_map.type != faiss.DirectMap.Hashtable:
+                    # Saved with an array direct map, which cannot remove vectors
+                    self.index.set_direct_map_type(faiss.DirectMap.Hashtable)
+                ids_path = os.path.join(self.index_path, f"{filename}_ids.npy")
+                # Stores saved before ids were recorded never had vectors removed without compacting
+                self._ids = np.load(ids_path) if os.path.exists(ids_path) else np.arange(self.index.ntotal, dtype=np.int64)
+                self._selector = None
 
-            with open(chunks_path, "r", encoding="utf-8") as f:
-                self.chunks = json.load(f)
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    self.metadata = json.load(f)
 
-            logger.info(f"Loaded vector store from {self.index_path}")
-            return True
-        except Exception as e:
-            logger.error(f"Error loading vector store: {e}")
-            return False
+                with open(chunks_path, "r", encoding="utf-8") as f:
+                    self.chunks = json.load(f)
+                self._hash_rows = None
+
+                logger.info(
+                    f"Loaded vector store from {self.index_path} "
+                    f"({get_index_type(self.index)} index {get_index_params(self.index)}, {self.index.ntotal} vectors)"
+                )
+                return True
+            except Exception as e:
+                logger.error(f"Error loading vector store: {e}")
+                return False
+
+    def _read_embedding_space(self, info_path: str) -> Optional[str]:
+        """Returns the embedding space of a saved store, if there is one."""
+        if not os.path.exists(info_path):
+            if self.embedding_space and os.path.exists(info_path.replace("_info.json", ".index")):
+                # Stores saved before they were tagged hold unquantized vectors
+                return self.embedding_space.split(":", 1)[0]
+            return None
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("embedding_space")
 
     def clear(self) -> bool:
         """
         Reset the vector store in memory.
         """
-        try:
-            self.index = None
-            self.metadata.clear()
-            self.chunks.clear()
-            logger.info("Cleared vector store.")
-            return True
-        except Exception as e:
-            logger.error(f"Error clearing vector store: {e}")
-            return False
+        with self._lock:
+            try:
+                self.index = None
+                self.metadata.clear()
+                self.chunks.clear()
+                self._hash_rows = None
+                self._ids = np.empty(0, dtype=np.int64)
+                self._selector = None
+                logger.info("Cleared vector store.")
+                return True
+            except Exception as e:
+                logger.error(f"Error clearing vector store: {e}")
+                return False
 
     def get_stats(self) -> Dict[str, Any]:
         """
         Get summary statistics of the vector store.
         """
-        return {
-            "total_embeddings": len(self.metadata),
-            "vector_dimension": self.vector_dimension,
-            "file_extensions": list({m.get("file_extension", "unknown") for m in self.metadata}),
-            "total_files": len({m.get("file_path", "unknown") for m in self.metadata}),
-            "total_tokens": sum(m.get("token_count", 0) for m in self.metadata)
-        }
+        with self._lock:
+            provenances = [p for m in self.metadata for p in get_provenances(m)]
+            return {
+                "total_embeddings": len(self.metadata),
+                "total_chunks": len(provenances),  # Including duplicates stored once
+                "vector_dimension": self.vector_dimension,
+                "embedding_space": self.embedding_space,
+                "index_type": get_index_type(self.index) if self.index is not None else None,
+                "index_params": get_index_params(self.index) if self.index is not None else {},
+                # Removed vectors an HNSW graph still holds until it is rebuilt
+                "removed_vectors": self.index.ntotal - len(self._ids) if self.index is not None else 0,
+                "file_extensions": list({p.get("file_extension", "unknown") for p in provenances}),
+                "total_files": len({p.get("file_path", "unknown") for p in provenances}),
+                "total_tokens": sum(m.get("token_count", 0) for m in self.metadata)
+            }
 
 
-def create_vector_store() -> CodeVectorStore:
-    return CodeVectorStore()
+def create_vector_store(embedding_space: Optional[str] = None) -> CodeVectorStore:
+    return CodeVectorStore(embedding_space=embedding_space)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import base64
+import binascii
+import numpy as np
+
+# Clients sending this in Accept get embeddings as base64 strings instead of JSON float lists
+EMBEDDING_B64_MEDIA_TYPE = "application/vnd.embedding.b64+json"
+
+def encode_embedding(embedding: np.ndarray) -> str:
+    """Encode a vector as base64 of its little-endian float32 bytes (4 bytes a dimension, no float formatting)."""
+    return base64.b64encode(np.asarray(embedding, dtype='<f4').tobytes()).decode('ascii')
+
+def decode_embedding(encoded: str) -> np.ndarray:
+    """
+    Decode a vector encoded by encode_embedding.
+
+    Raises:
+        ValueError: If the text is not base64 of whole float32 values.
+    """
+    try:
+        data = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 embedding: {str(e)}")
+    if not data or len(data) % 4:
+        raise ValueError(f"Base64 embedding has {len(data)} bytes, not a whole number of float32 values")
+    return np.frombuffer(data, dtype='<f4').astype(np.float32)
+
+def accepts_b64(accept: str) -> bool:
+    """Whether an Accept header asks for base64 embeddings."""
+    return EMBEDDING_B64_MEDIA_TYPE in [media_type.split(';')[0].strip() for media_type in accept.split(',')]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark recall@k vs. query latency of IVF-Flat and HNSW indexes against the flat index.
+
+Builds a synthetic corpus of --vectors unit vectors of --dimension, drawn
+around --clusters random centres the way embeddings of similar code cluster,
+and queries that are noisy copies of corpus vectors (a lightly edited copy of
+stored code). The flat index gives the exact top --top-k of each query; IVF
+is then swept over --nprobe and HNSW over --ef-search, reporting build time,
+recall@k against the exact results, and p50/p99 latency of single queries as
+the service runs them. Indexes are built with the service's build_index.
+
+The corpus takes vectors * dimension * 4 bytes and each index about as much
+again (2M x 768 is 6 GB each), and only one index is held at a time.
+
+Usage (from the service root):
+    python -m benchmarks.bench_ann_index
+    python -m benchmarks.bench_ann_index --vectors 500000 --dimension 256 --nprobe 4 16 64 --ef-search 32 128
+"""
+import time
+import argparse
+import numpy as np
+import faiss
+
+from app.vector_store import build_index, get_index_params, get_search_params
+
+def make_corpus(num_vectors: int, dimension: int, clusters: int, spread: float, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around random centres, generated a block at a time."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    vectors = np.empty((num_vectors, dimension), dtype=np.float32)
+    for start in range(0, num_vectors, 100000):
+        end = min(start + 100000, num_vectors)
+        block = centres[rng.integers(0, clusters, end - start)]
+        block += rng.standard_normal(block.shape, dtype=np.float32) * (spread / np.sqrt(dimension))
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int = 1) -> np.ndarray:
+    """Noisy copies of random corpus vectors."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), count, replace=False)].copy()
+    queries += rng.standard_normal(queries.shape, dtype=np.float32) * (noise / np.sqrt(vectors.shape[1]))
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def time_queries(index: faiss.Index, queries: np.ndarray, top_k: int, params=None):
+    """Search the queries one at a time; returns the result ids and per-query latencies in ms."""
+    ids = np.empty((len(queries), top_k), dtype=np.int64)
+    latencies = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids[i] = index.search(queries[i:i + 1], top_k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return ids, np.array(latencies)
+
+def recall_at_k(ids: np.ndarray, exact: np.ndarray) -> float:
+    """Fraction of the exact top k found, averaged over the queries."""
+    return float(np.mean([len(set(found) & set(truth)) / len(truth) for found, truth in zip(ids, exact)]))
+
+def report(name: str, setting: str, ids: np.ndarray, latencies: np.ndarray, exact: np.ndarray, baseline: float):
+    p50 = np.percentile(latencies, 50)
+    print(
+        f"{name:>5} {setting:<14} recall@k {recall_at_k(ids, exact):.3f}, p50 {p50:>8.3f} ms, "
+        f"p99 {np.percentile(latencies, 99):>8.3f} ms, {baseline / p50:>7.1f}x"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=2000000, help="Vectors in the synthetic corpus")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector dimension")
+    parser.add_argument("--clusters", type=int, default=20000, help="Centres the corpus is drawn around")
+    parser.add_argument("--spread", type=float, default=1.5, help="Distance of corpus vectors from their centre")
+    parser.add_argument("--noise", type=float, default=1.0, help="Distance of queries from the vector they copy")
+    parser.add_argument("--queries", type=int, default=500, help="Queries timed per setting")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = IVF_NLIST or 4 * sqrt(vectors))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64, 256], help="IVF nprobe values to sweep")
+    parser.add_argument("--hnsw-m", type=int, default=0, help="HNSW neighbours per vector (0 = HNSW_M)")
+    parser.add_argument("--ef-construction", type=int, default=0, help="HNSW build candidates (0 = HNSW_EF_CONSTRUCTION)")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256], help="HNSW efSearch values to sweep")
+    parser.add_argument("--types", nargs="+", default=["ivf", "hnsw"], help="Approximate index types to compare")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vectors = make_corpus(args.vectors, args.dimension, args.clusters, args.spread)
+    queries = make_queries(vectors, args.queries, args.noise)
+    print(
+        f"{args.vectors:,} x {args.dimension} corpus ({vectors.nbytes / 2**30:.1f} GB) generated in "
+        f"{time.perf_counter() - start:.1f}s, {args.queries} queries, top {args.top_k}, {faiss.omp_get_max_threads()} threads"
+    )
+
+    start = time.perf_counter()
+    index = build_index(vectors, "flat")
+    print(f" flat built in {time.perf_counter() - start:.1f}s")
+    exact, latencies = time_queries(index, queries, args.top_k)
+    baseline = np.percentile(latencies, 50)
+    report("flat", "exact", exact, latencies, exact, baseline)
+    del index
+
+    for index_type in args.types:
+        params = {"nlist": args.nlist, "M": args.hnsw_m, "ef_construction": args.ef_construction}
+        start = time.perf_counter()
+        index = build_index(vectors, index_type, params)
+        print(f"{index_type:>5} {get_index_params(index)} built in {time.perf_counter() - start:.1f}s")
+        if index_type == "ivf":
+            settings = [(f"nprobe={n}", get_search_params(index, nprobe=n)) for n in args.nprobe]
+        else:
+            settings = [(f"efSearch={ef}", get_search_params(index, ef_search=ef)) for ef in args.ef_search]
+        for setting, search_params in settings:
+            ids, latencies = time_queries(index, queries, args.top_k, search_params)
+            report(index_type, setting, ids, latencies, exact, baseline)
+        del index
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunk_code on large files.
+
+Compares the previous chunker (one token count per line, again per line while
+building every overlap) with the prefix-sum chunker in app.utils, and checks
+that both produce the same chunks. Large inputs are built by concatenating the
+code files found under --path.
+
+Usage (from the service root):
+    python -m benchmarks.bench_chunking --path ../repositories --sizes 100000 1000000
+    python -m benchmarks.bench_chunking --counter bytes   # without the tiktoken encoding download
+"""
+import os
+import time
+import argparse
+import tiktoken
+
+from app.utils import chunk_code, iter_code_files
+
+def legacy_chunk_code(code, chunk_size=510, chunk_overlap=100, token_counter=None):
+    """The chunker before prefix sums, kept verbatim for comparison."""
+    counter = token_counter or (lambda s: len(tiktoken.get_encoding("cl100k_base").encode(s)))
+    if counter(code) <= chunk_size:
+        return [code]
+
+    lines = code.split('\n')
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for line in lines:
+        line_size = counter(line + '\n')
+        if current_size + line_size > chunk_size and current_chunk:
+            chunks.append('\n'.join(current_chunk))
+            overlap_size = 0
+            overlap_lines = []
+            for prev_line in reversed(current_chunk):
+                size = counter(prev_line + '\n')
+                if overlap_size + size <= chunk_overlap:
+                    overlap_lines.insert(0, prev_line)
+                    overlap_size += size
+                else:
+                    break
+            current_chunk = overlap_lines
+            current_size = overlap_size
+        current_chunk.append(line)
+        current_size += line_size
+    if current_chunk:
+        chunks.append('\n'.join(current_chunk))
+    return chunks
+
+# cl100k_base's pre-tokenizer, used with a byte-level vocabulary when the real one cannot be downloaded
+CL100K_PATTERN = (
+    r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*"""
+    r"""|\s*[\r\n]|\s+(?!\S)|\s+"""
+)
+
+def get_counter(name: str):
+    """Returns the token counter to benchmark with; None selects chunk_code's default (cl100k_base)."""
+    if name == "bytes":
+        # tiktoken's own regex and BPE machinery, so each call costs about what a real encoding does
+        encoding = tiktoken.Encoding(
+            "bytes", pat_str=CL100K_PATTERN,
+            mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+        )
+        return lambda text: len(encoding.encode(text))
+    if name == "words":
+        return lambda text: len(text.split()) + 1
+    return None
+
+def build_input(directory: str, size: int) -> str:
+    corpus = []
+    for file_path in iter_code_files(directory):
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            corpus.append(f.read())
+    if not corpus:
+        raise SystemExit(f"No code files found in {directory}")
+    # Repeated copies are tagged per line so they do not collapse into already counted lines
+    text = '\n'.join(corpus)
+    copies, length = [], 0
+    while length < size:
+        copy = '\n'.join(f"{line} {len(copies)}" for line in text.split('\n'))
+        copies.append(copy)
+        length += len(copy) + 1
+    return '\n'.join(copies)[:size]
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.path.join(os.getcwd(), "repositories"), help="Directory of code to build inputs from")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Input sizes in characters")
+    parser.add_argument("--counter", choices=["tiktoken", "bytes", "words"], default="tiktoken", help="Token counter")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs per variant and size")
+    args = parser.parse_args()
+
+    counter = get_counter(args.counter)
+    for size in args.sizes:
+        code = build_input(args.path, size)
+        before, legacy = timed(lambda: legacy_chunk_code(code, token_counter=counter), args.rounds)
+        after, chunks = timed(lambda: chunk_code(code, token_counter=counter), args.rounds)
+        print(
+            f"{size:>10,} chars, {code.count(chr(10)) + 1:>7,} lines: "
+            f"{before * 1000:>9.1f} ms before, {after * 1000:>8.1f} ms after, "
+            f"{before / after:>5.1f}x, {len(chunks)} chunks, identical: {legacy == chunks}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark how embedding throughput scales with the number of embedding processes.
+
+Chunks the code files under --path like ingestion does and embeds them
+in-process (0 workers, on --threads torch threads) and with pools of each
+given size, whose workers share the same threads between them unless
+--threads-per-worker is set. Reports chunks per second and the speedup
+over in-process embedding. Model loading in the workers is not timed.
+
+Usage (from the service root):
+    python -m benchmarks.bench_embedding_pool --path ../repositories
+    python -m benchmarks.bench_embedding_pool --workers 0 2 4 --threads 8 --max-chunks 400
+"""
+import os
+import time
+import argparse
+import torch
+
+from app.embedding_pool import EmbeddingPool
+from app import codebert_embedder
+from benchmarks.bench_inference import load_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.path.join(os.getcwd(), "repositories"), help="Directory of code to embed")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4], help="Pool sizes to compare (0 = in-process)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Torch threads shared out between the workers")
+    parser.add_argument("--threads-per-worker", type=int, help="Torch threads of each worker (default: --threads / workers)")
+    parser.add_argument("--max-chunks", type=int, default=500, help="Chunks embedded per run")
+    args = parser.parse_args()
+
+    if not codebert_embedder.load_model():
+        raise SystemExit("The embedding model could not be loaded")
+    id_lists = load_chunks(args.path, args.max_chunks)
+    tokens = sum(len(ids) for ids in id_lists)
+    dimension = codebert_embedder.model.config.hidden_size
+    print(f"{len(id_lists)} chunks, {tokens:,} tokens, {codebert_embedder.MODEL_NAME}, {args.threads} threads")
+
+    baseline = None
+    for workers in args.workers:
+        if workers == 0:
+            torch.set_num_threads(args.threads)
+            codebert_embedder._embed_id_batches(id_lists[:8])
+            start = time.perf_counter()
+            codebert_embedder._embed_id_batches(id_lists)
+            elapsed = time.perf_counter() - start
+            threads = args.threads
+        else:
+            threads = args.threads_per_worker or max(1, args.threads // workers)
+            pool = EmbeddingPool(workers, threads)
+            try:
+                pool.wait_ready()
+                pool.embed(id_lists[:8], dimension)
+                start = time.perf_counter()
+                pool.embed(id_lists, dimension)
+                elapsed = time.perf_counter() - start
+            finally:
+                pool.close()
+
+        baseline = baseline or elapsed
+        print(
+            f"{workers:>2} workers x {threads:>2} threads: {len(id_lists) / elapsed:>8.1f} chunks/s, "
+            f"{tokens / elapsed:>10,.0f} tokens/s, {baseline / elapsed:>5.2f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the embedding backends and check their parity with PyTorch fp32.
+
+Chunks the code files under --path like ingestion does, embeds them with
+every backend (PyTorch and ONNX Runtime, fp32 and dynamic int8) and reports
+throughput and the cosine similarity of each chunk's vector to the PyTorch
+fp32 vector of the same chunk. ONNX rows are skipped when onnx/onnxruntime
+are not installed.
+
+Usage (from the service root):
+    python -m benchmarks.bench_inference --path ../repositories
+    python -m benchmarks.bench_inference --backends torch onnx-int8 --max-chunks 200
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+from app.utils import iter_code_files, normalize_code, get_file_extension
+from app.inference_backend import load_encoder
+from app import codebert_embedder
+
+BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+
+def load_chunks(directory: str, max_chunks: int):
+    """Token ids (with special tokens) of the chunks of the code files under directory."""
+    id_lists = []
+    for file_path in iter_code_files(directory):
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            code = normalize_code(f.read(), get_file_extension(file_path))
+        for chunk in codebert_embedder.split_code(code, get_file_extension(file_path)):
+            if chunk["input_ids"]:
+                id_lists.append(codebert_embedder._chunk_ids(chunk["input_ids"]))
+        if len(id_lists) >= max_chunks:
+            break
+    if not id_lists:
+        raise SystemExit(f"No code files found in {directory}")
+    return id_lists[:max_chunks]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.path.join(os.getcwd(), "repositories"), help="Directory of code to embed")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS, help="Backends to compare")
+    parser.add_argument("--max-chunks", type=int, default=500, help="Chunks embedded per backend")
+    args = parser.parse_args()
+
+    if not codebert_embedder.load_model():
+        raise SystemExit("The embedding model could not be loaded")
+    id_lists = load_chunks(args.path, args.max_chunks)
+    tokens = sum(len(ids) for ids in id_lists)
+    print(f"{len(id_lists)} chunks, {tokens:,} tokens, {codebert_embedder.MODEL_NAME}")
+
+    # Reference vectors, also timing the default backend
+    reference_encoder, _ = load_encoder(codebert_embedder.model, codebert_embedder.MODEL_NAME, "cpu", "torch", "none")
+    reference = None
+    baseline = None
+    for name in args.backends:
+        backend, _, quantize = name.partition("-")
+        try:
+            encoder, used = load_encoder(
+                codebert_embedder.model, codebert_embedder.MODEL_NAME, "cpu", backend, quantize or "none"
+            )
+        except RuntimeError as e:
+            print(f"{name:>10}: unavailable ({e})")
+            continue
+        if used != name:
+            print(f"{name:>10}: unavailable (fell back to {used})")
+            continue
+
+        # Warm up (ONNX Runtime allocates its arenas on the first runs)
+        codebert_embedder._embed_id_batches(id_lists[:8], encoder)
+        start = time.perf_counter()
+        vectors = codebert_embedder._embed_id_batches(id_lists, encoder)
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = vectors if name == "torch" else codebert_embedder._embed_id_batches(id_lists, reference_encoder)
+        baseline = baseline or elapsed
+        cosine = (reference * vectors).sum(axis=1)
+        print(
+            f"{name:>10}: {len(id_lists) / elapsed:>8.1f} chunks/s, {baseline / elapsed:>5.2f}x, "
+            f"cosine to torch fp32 mean {cosine.mean():.5f}, min {cosine.min():.5f}, "
+            f"p1 {np.percentile(cosine, 1):.5f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the latency of the health and status endpoints while embeddings saturate the service.
+
+Against a running service (--url), probes / and /status on their own, then
+again while --concurrency clients keep posting code from --path to
+/get-embedding for --duration seconds. Reports p50/p99 probe latency in both
+phases, embedding throughput, and how many embedding requests were turned
+away with 429.
+
+Usage (from the service root, with the service running):
+    python -m benchmarks.bench_serving --url http://localhost:8000 --path ../repositories
+    python -m benchmarks.bench_serving --concurrency 128 --duration 30
+"""
+import os
+import time
+import asyncio
+import argparse
+import numpy as np
+import httpx
+
+from app.utils import iter_code_files
+
+PROBES = ["/", "/status"]
+
+def load_snippets(directory: str, count: int = 200):
+    """The beginning of the first code files under directory, as embedding requests."""
+    snippets = []
+    for file_path in iter_code_files(directory):
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            snippets.append(f.read(2000))
+        if len(snippets) >= count:
+            break
+    if not snippets:
+        raise SystemExit(f"No code files found in {directory}")
+    return snippets
+
+async def probe(client: httpx.AsyncClient, latencies: dict, stop: asyncio.Event, interval: float):
+    """Time the probe endpoints every interval seconds until stopped."""
+    while not stop.is_set():
+        for path in PROBES:
+            start = time.perf_counter()
+            await client.get(path)
+            latencies[path].append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+async def load(client: httpx.AsyncClient, snippets, statuses: dict, stop: asyncio.Event, offset: int):
+    """Post embedding requests back to back until stopped."""
+    i = offset
+    while not stop.is_set():
+        response = await client.post("/get-embedding", json={"code": snippets[i % len(snippets)]})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        i += 1
+
+async def run_phase(args, snippets, concurrency: int):
+    latencies = {path: [] for path in PROBES}
+    statuses = {}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=concurrency + len(PROBES) + 1)
+    async with httpx.AsyncClient(base_url=args.url, timeout=120, limits=limits) as client:
+        tasks = [asyncio.create_task(probe(client, latencies, stop, 0.05))]
+        tasks += [asyncio.create_task(load(client, snippets, statuses, stop, i)) for i in range(concurrency)]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies, statuses
+
+def report(name: str, latencies: dict, statuses: dict, duration: float):
+    for path, samples in latencies.items():
+        values = np.array(samples) * 1000
+        print(
+            f"{name:>6} {path:<8} p50 {np.percentile(values, 50):>8.1f} ms, p99 {np.percentile(values, 99):>8.1f} ms "
+            f"({len(values)} probes)"
+        )
+    if statuses:
+        print(f"{name:>6} embeddings: {statuses.get(200, 0) / duration:.1f}/s, responses by status {statuses}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the running service")
+    parser.add_argument("--path", default=os.path.join(os.getcwd(), "repositories"), help="Directory of code to embed")
+    parser.add_argument("--concurrency", type=int, default=64, help="Clients posting embedding requests")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per phase")
+    args = parser.parse_args()
+
+    snippets = load_snippets(args.path)
+    print(f"{len(snippets)} snippets, {args.concurrency} clients, {args.duration:.0f}s per phase, {args.url}")
+    for name, concurrency in [("idle", 0), ("loaded", args.concurrency)]:
+        latencies, statuses = asyncio.run(run_phase(args, snippets, concurrency))
+        report(name, latencies, statuses, args.duration)
+
+if __name__ == "__main__":
+    main()
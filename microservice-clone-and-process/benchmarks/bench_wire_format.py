@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark the serialization cost of sending an embedding as JSON floats vs. base64 float32.
+
+Replays what one check costs in serialization: /get-embedding encodes the
+vector into its response and the client parses it, then the client encodes
+the /search-similar request and the service parses and validates it with
+pydantic. Reports microseconds per check and bytes per hop for each format.
+No model is needed; vectors are random unit vectors of --dimension.
+
+Usage (from the service root):
+    python -m benchmarks.bench_wire_format
+    python -m benchmarks.bench_wire_format --dimension 768 --iterations 5000
+"""
+import json
+import time
+import argparse
+from typing import List, Optional
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.wire_format import encode_embedding, decode_embedding
+
+class SearchQuery(BaseModel):
+    # Same fields as the service's SimilaritySearchRequest
+    embedding: Optional[List[float]] = None
+    embedding_b64: Optional[str] = None
+    top_k: int = 5
+
+def json_check(vector: np.ndarray):
+    """One check with float lists; returns the bytes sent on each hop."""
+    response = json.dumps(jsonable_encoder({"embedding": vector.tolist()})).encode()
+    embedding = json.loads(response)["embedding"]
+    request = json.dumps({"embedding": embedding, "top_k": 5}).encode()
+    query = SearchQuery.model_validate_json(request)
+    np.asarray(query.embedding, dtype=np.float32)
+    return len(response), len(request)
+
+def b64_check(vector: np.ndarray):
+    """One check with base64 float32, passed through by the client; returns the bytes sent on each hop."""
+    response = json.dumps(jsonable_encoder({"embedding_b64": encode_embedding(vector)})).encode()
+    embedding_b64 = json.loads(response)["embedding_b64"]
+    request = json.dumps({"embedding_b64": embedding_b64, "top_k": 5}).encode()
+    query = SearchQuery.model_validate_json(request)
+    decode_embedding(query.embedding_b64)
+    return len(response), len(request)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--iterations", type=int, default=2000, help="Checks timed per format")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((64, args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    print(f"{args.dimension} dimensions, {args.iterations} checks per format")
+    baseline = None
+    for name, check in [("json", json_check), ("base64", b64_check)]:
+        for vector in vectors[:8]:
+            check(vector)  # Warm up
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            sizes = check(vectors[i % len(vectors)])
+        elapsed = (time.perf_counter() - start) / args.iterations * 1e6
+        baseline = baseline or elapsed
+        print(
+            f"{name:>7}: {elapsed:>8.1f} us per check, {baseline / elapsed:>5.1f}x, "
+            f"{sizes[0]:,} bytes response, {sizes[1]:,} bytes request"
+        )
+
+if __name__ == "__main__":
+    main()
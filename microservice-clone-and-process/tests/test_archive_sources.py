@@ -0,0 +1,70 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from app import archive_sources
+from app.archive_sources import extract_archive, iter_archive_files, resolve_archive_path
+
+CODE = b"def handler(event):\n    return event\n"
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    root = tmp_path / "archives"
+    root.mkdir()
+    monkeypatch.setattr(archive_sources, "ARCHIVE_DIR", str(root))
+    return root
+
+def test_archive_paths_are_confined_to_the_archive_dir(archive_dir, tmp_path):
+    (archive_dir / "dump.tar.gz").write_bytes(b"")
+    (tmp_path / "secret.zip").write_bytes(b"")
+    os.symlink(tmp_path / "secret.zip", archive_dir / "link.zip")
+    (archive_dir / "notes.txt").write_bytes(b"")
+
+    assert resolve_archive_path("dump.tar.gz") == os.path.realpath(archive_dir / "dump.tar.gz")
+    assert resolve_archive_path(str(archive_dir / "dump.tar.gz")) == os.path.realpath(archive_dir / "dump.tar.gz")
+    for outside in ("../secret.zip", str(tmp_path / "secret.zip"), "link.zip"):
+        with pytest.raises(ValueError, match="outside"):
+            resolve_archive_path(outside)
+    with pytest.raises(ValueError, match="not found"):
+        resolve_archive_path("missing.zip")
+    with pytest.raises(ValueError, match="Unsupported"):
+        resolve_archive_path("notes.txt")
+
+def write_tar(path, members):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+@pytest.mark.parametrize("name, write", [("dump.tar.gz", write_tar), ("dump.zip", write_zip)])
+def test_traversing_members_are_extracted_inside_base_dir(tmp_path, name, write):
+    archive_path = tmp_path / "in" / name
+    archive_path.parent.mkdir()
+    write(archive_path, {
+        "../../escape.py": CODE,
+        "src/../../escape.py": CODE,
+        "/etc/absolute.py": CODE,
+        "./src/../src/app.py": CODE,
+        ".git/hooks/hook.py": CODE,
+        "src/image.py": b"\x00\x01\x02" * 10,
+    })
+
+    # Members climbing out of the archive are dropped, absolute ones made relative
+    assert sorted(path for path, _ in iter_archive_files(str(archive_path))) == ["etc/absolute.py", "src/app.py"]
+
+    base_dir = tmp_path / "out" / "repositories"
+    files = extract_archive(str(archive_path), str(base_dir))["py"]
+    assert len(files) == 2
+    for path in files:
+        assert os.path.commonpath([str(base_dir), os.path.realpath(path)]) == str(base_dir)
+    written = [os.path.join(root, f) for root, _, names in os.walk(tmp_path) for f in names]
+    assert all(path.startswith(str(base_dir)) or path == str(archive_path) for path in written)
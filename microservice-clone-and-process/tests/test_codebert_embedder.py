@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import torch
+
+from app import codebert_embedder
+from app.embedding_cache import EmbeddingCache
+from app.inference_backend import TorchEncoder
+
+@pytest.fixture
+def tiny_embedder(monkeypatch):
+    from tokenizers import ByteLevelBPETokenizer
+    from tokenizers.processors import RobertaProcessing
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaModel
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(
+        [f"value_{i} = compute(value_{i - 1}, offset={i})" for i in range(200)],
+        vocab_size=300, special_tokens=["<s>", "<pad>", "</s>", "<unk>"]
+    )
+    bpe.post_processor = RobertaProcessing(("</s>", 2), ("<s>", 0))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe._tokenizer, bos_token="<s>", cls_token="<s>", eos_token="</s>", sep_token="</s>",
+        pad_token="<pad>", unk_token="<unk>"
+    )
+    torch.manual_seed(0)
+    model = RobertaModel(RobertaConfig(
+        vocab_size=tokenizer.vocab_size, hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=32, max_position_embeddings=64, pad_token_id=1
+    )).eval()
+
+    monkeypatch.setattr(codebert_embedder, "tokenizer", tokenizer)
+    monkeypatch.setattr(codebert_embedder, "model", model)
+    monkeypatch.setattr(codebert_embedder, "encoder", TorchEncoder(model))
+    monkeypatch.setattr(codebert_embedder, "get_embedding_cache", lambda: None)
+    monkeypatch.setitem(codebert_embedder._model_status, "status", "ready")
+    monkeypatch.setattr(codebert_embedder, "MAX_TOKENS_PER_CHUNK", 24)
+    monkeypatch.setattr(codebert_embedder, "CHUNK_OVERLAP", 4)
+
+def test_full_length_chunk_is_embedded_untruncated(tiny_embedder):
+    code = " ".join(f"value_{i} = compute(value_{i - 1}, offset={i})" for i in range(1, 30))
+    chunk = codebert_embedder.split_code(code)[0]
+    assert len(chunk["input_ids"]) == 24
+
+    ids = codebert_embedder._chunk_ids(chunk["input_ids"])
+    assert codebert_embedder._text_ids([chunk["text"]]) == [ids]
+    np.testing.assert_allclose(
+        codebert_embedder.get_embeddings([chunk["text"]])[0],
+        codebert_embedder._embed_id_batches([ids])[0],
+        atol=1e-6
+    )
+
+def test_cached_embeddings_are_keyed_by_the_embedding_configuration(tiny_embedder, tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(codebert_embedder, "get_embedding_cache", lambda: cache)
+    texts = ["value_1 = compute(value_0, offset=1)", "value_2 = compute(value_1, offset=2)"]
+
+    first = codebert_embedder.get_embeddings(texts)
+    np.testing.assert_array_equal(codebert_embedder.get_embeddings(texts), first)
+    assert (cache.get_stats()["hits"], cache.get_stats()["misses"]) == (2, 2)
+
+    # Another window or embedding space must not be served the vectors cached for this one
+    monkeypatch.setattr(codebert_embedder, "MAX_TOKENS_PER_CHUNK", 16)
+    codebert_embedder.get_embeddings(texts)
+    monkeypatch.setattr(codebert_embedder, "EMBEDDING_SPACE", "tiny:torch-int8")
+    codebert_embedder.get_embeddings(texts)
+    assert (cache.get_stats()["hits"], cache.get_stats()["misses"]) == (2, 6)
+    assert cache.get_stats()["entries"] == 6
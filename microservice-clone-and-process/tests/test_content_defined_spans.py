@@ -0,0 +1,29 @@
+from app.utils import content_defined_spans
+
+LINES = [f"value_{i} = compute({i * 7 % 13}, {i})" for i in range(400)]
+
+def chunk_texts(lines):
+    spans = content_defined_spans(lines, [4] * len(lines), min_tokens=16, max_tokens=64)
+    return [tuple(lines[start:end]) for start, end in spans]
+
+def test_spans_cover_every_line_within_the_token_bounds():
+    spans = content_defined_spans(LINES, [4] * len(LINES), min_tokens=16, max_tokens=64)
+    assert spans[0][0] == 0 and spans[-1][1] == len(LINES)
+    assert all(previous[1] == current[0] for previous, current in zip(spans, spans[1:]))
+    assert all(4 * (end - start) <= 64 for start, end in spans)
+    assert all(4 * (end - start) >= 16 for start, end in spans[:-1])
+
+def test_inserted_line_only_changes_the_chunks_next_to_it():
+    before = chunk_texts(LINES)
+    edited = LINES[:200] + ["print('inserted')"] + LINES[200:]
+    after = chunk_texts(edited)
+
+    assert len(before) > 10
+    changed = [chunk for chunk in after if chunk not in set(before)]
+    assert "print('inserted')" in changed[0]
+    assert len(changed) <= 2
+    assert len(set(before) - set(after)) <= 2
+
+def test_long_line_is_a_chunk_of_its_own():
+    lines = ["a = 1", "b = " + "x" * 100, "c = 3"]
+    assert content_defined_spans(lines, [3, 100, 3], min_tokens=16, max_tokens=64) == [(0, 1), (1, 2), (2, 3)]
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app import embedding_cache
+from app.embedding_cache import EmbeddingCache
+
+def vector(value: float) -> np.ndarray:
+    return np.full(8, value, dtype=np.float32)  # 32 bytes
+
+def test_least_recently_used_vectors_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: next(clock)))
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=4 * 32)
+    keys = [EmbeddingCache.make_key("config", f"text {i}") for i in range(5)]
+    for i, key in enumerate(keys[:4]):
+        cache.put_many({key: vector(i)})
+
+    # Reading the oldest entry makes it the most recently used
+    assert list(cache.get_many([keys[0]])) == [keys[0]]
+    cache.put_many({keys[4]: vector(4)})
+
+    assert set(cache.get_many(keys)) == {keys[0], keys[3], keys[4]}
+    stats = cache.get_stats()
+    assert stats["evictions"] == 2
+    assert stats["entries"] == 3
+    assert stats["size_bytes"] <= stats["max_bytes"]
+
+def test_vectors_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = EmbeddingCache.make_key("config", "text")
+    EmbeddingCache(path, max_bytes=1024).put_many({key: vector(0.5)})
+
+    found = EmbeddingCache(path, max_bytes=1024).get_many([key, EmbeddingCache.make_key("config", "other")])
+    assert list(found) == [key]
+    np.testing.assert_array_equal(found[key], vector(0.5))
+
+def test_key_depends_on_the_configuration():
+    assert EmbeddingCache.make_key("codebert|510|text", "x = 1") == EmbeddingCache.make_key("codebert|510|text", "x = 1")
+    assert EmbeddingCache.make_key("codebert|510|text", "x = 1") != EmbeddingCache.make_key("codebert|510|ids", "x = 1")
+    assert EmbeddingCache.make_key("codebert|510|text", "x = 1") != EmbeddingCache.make_key("codebert:onnx-int8|510|text", "x = 1")
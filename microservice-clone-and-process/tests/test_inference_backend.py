@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import torch
+
+from app import inference_backend
+from app.inference_backend import get_embedding_space, load_encoder
+
+def test_int8_spaces_name_the_backend():
+    assert get_embedding_space("codebert", "none", "torch") == get_embedding_space("codebert", "none", "onnx") == "codebert"
+    assert get_embedding_space("codebert", "int8", "torch") == "codebert:torch-int8"
+    assert get_embedding_space("codebert", "int8", "onnx") == "codebert:onnx-int8"
+
+@pytest.fixture
+def tiny_model():
+    from transformers import RobertaConfig, RobertaModel
+
+    torch.manual_seed(0)
+    config = RobertaConfig(
+        vocab_size=100, hidden_size=32, num_hidden_layers=2, num_attention_heads=4,
+        intermediate_size=64, max_position_embeddings=40, pad_token_id=1
+    )
+    return RobertaModel(config).eval()
+
+def test_onnx_export_and_int8_quantization_run(tiny_model, tmp_path, monkeypatch):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(inference_backend, "ONNX_CACHE_DIR", str(tmp_path))
+    input_ids = np.random.default_rng(0).integers(3, 100, (3, 12)).astype(np.int64)
+    attention_mask = np.ones_like(input_ids)
+    attention_mask[1, 8:] = 0
+    input_ids[attention_mask == 0] = 1
+
+    reference, used = load_encoder(tiny_model, "tiny", "cpu", "torch", "none")
+    assert used == "torch"
+    fp32, used = load_encoder(tiny_model, "tiny", "cpu", "onnx", "none")
+    assert used == "onnx"
+    int8, used = load_encoder(tiny_model, "tiny", "cpu", "onnx", "int8")
+    assert used == "onnx-int8"
+    assert (tmp_path / "tiny" / "model.onnx").exists() and (tmp_path / "tiny" / "model.int8.onnx").exists()
+
+    expected = reference(input_ids, attention_mask)
+    np.testing.assert_allclose(fp32(input_ids, attention_mask), expected, atol=1e-4)
+    quantized = int8(input_ids, attention_mask)
+    assert quantized.shape == expected.shape
+    cosine = (quantized * expected).sum(axis=1) / np.linalg.norm(quantized, axis=1) / np.linalg.norm(expected, axis=1)
+    assert cosine.min() > 0.9
+
+def test_onnx_int8_does_not_fall_back_to_torch(tiny_model, monkeypatch):
+    def unavailable(*args):
+        raise ImportError("onnxruntime is not installed")
+
+    monkeypatch.setattr(inference_backend, "load_onnx_encoder", unavailable)
+    assert load_encoder(tiny_model, "tiny", "cpu", "onnx", "none")[1] == "torch"
+    with pytest.raises(RuntimeError):
+        load_encoder(tiny_model, "tiny", "cpu", "onnx", "int8")
@@ -0,0 +1,27 @@
+import threading
+import pytest
+
+from app.micro_batcher import MicroBatcher, QueueFullError
+
+def test_submit_many_counts_every_item_against_max_queue():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher("test", process, max_batch_size=1, max_wait_ms=0, max_queue=4)
+    # Keep the worker busy so the next requests stay queued
+    running = batcher.submit("running")
+    while batcher._queue.qsize():
+        pass
+
+    queued = batcher.submit_many(["a", "b"])
+    with pytest.raises(QueueFullError):
+        batcher.submit_many(["c", "d", "e"])
+    assert batcher._queue.qsize() == 2
+
+    queued += batcher.submit_many(["c", "d"])
+    release.set()
+    assert running.result(5) == "running"
+    assert [future.result(5) for future in queued] == ["a", "b", "c", "d"]
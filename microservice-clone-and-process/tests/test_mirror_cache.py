@@ -0,0 +1,48 @@
+import git
+import pytest
+
+from app.mirror_cache import diff_commits
+
+LONG_FILE = "".join(f"def handler_{i}(event):\n    return event + {i}\n" for i in range(20))
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = git.Repo.init(tmp_path / "repo")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "Test")
+        config.set_value("user", "email", "test@example.com")
+    yield repo
+    repo.close()
+
+def commit(repo, files=None):
+    for path, text in (files or {}).items():
+        full_path = repo.working_tree_dir + "/" + path
+        with open(full_path, "w") as f:
+            f.write(text)
+        repo.git.add(path)
+    repo.git.commit("-m", "change", "--allow-empty")
+    return repo.head.commit.hexsha
+
+def test_deleted_and_renamed_files_are_retired(repo):
+    first = commit(repo, {"keep.py": "x = 1\n", "gone.py": "y = 2\n", "old.py": LONG_FILE})
+    repo.git.rm("gone.py")
+    repo.git.mv("old.py", "new.py")
+    second = commit(repo, {"keep.py": "x = 3\n", "added.py": "z = 4\n"})
+
+    changed, deleted, full = diff_commits(repo, first, second)
+
+    assert not full
+    assert sorted(changed) == ["added.py", "keep.py", "new.py"]
+    assert sorted(deleted) == ["gone.py", "old.py"]
+
+def test_unchanged_commit_has_nothing_to_do(repo):
+    first = commit(repo, {"keep.py": "x = 1\n"})
+    assert diff_commits(repo, first, first) == ([], [], False)
+
+def test_missing_previous_commit_ingests_the_whole_tree(repo):
+    head = commit(repo, {"a.py": "x = 1\n", "b.py": "y = 2\n"})
+    for old_sha in (None, "0" * 40):
+        changed, deleted, full = diff_commits(repo, old_sha, head)
+        assert full
+        assert sorted(changed) == ["a.py", "b.py"]
+        assert deleted == []
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from app.utils import normalize_code, _FAMILY_LEXERS
+
+RAW_SOURCES = [
+    pytest.param(
+        'def f(x):\n    """Docstring."""\n    # comment\n    return x  # trailing\n', "py",
+        'def f(x):\nreturn x',
+        id="python comments and docstring"
+    ),
+    pytest.param(
+        'url = "http://example.com/#anchor"  # real comment\ns = \'#not a comment\'\n', "py",
+        'url = "http://example.com/#anchor"\ns = \'#not a comment\'',
+        id="python comment markers in strings"
+    ),
+    pytest.param(
+        'msg = "she said \'hi # there\'"\nother = \'a "quoted # word" here\'\nesc = "a \\" # still string"\n', "py",
+        'msg = "she said \'hi # there\'"\nother = \'a "quoted # word" here\'\nesc = "a \\" # still string"',
+        id="python nested and escaped quotes"
+    ),
+    pytest.param(
+        'x = """multi\n# inside\n"""  # gone\n', "py",
+        'x = """multi\n# inside\n"""',
+        id="python triple-quoted string"
+    ),
+    pytest.param(
+        'const url = "http://x.com"; // comment\nconst re = \'/* not */\'; /* block\n comment */ '
+        'let t = `a // b ${"c /* d */"}`;\n', "js",
+        'const url = "http://x.com";\nconst re = \'/* not */\';  let t = `a // b ${"c /* d */"}`;',
+        id="js comment markers in strings and template literals"
+    ),
+    pytest.param(
+        'char *s = "it\'s // fine"; /* c */ int y = \'"\'; // done\n', "c",
+        'char *s = "it\'s // fine";  int y = \'"\';',
+        id="c quotes inside other quotes"
+    ),
+    pytest.param(
+        'echo "${#arr[@]}" # count\necho \'# quoted\' a#b\n', "sh",
+        'echo "${#arr[@]}"\necho \'# quoted\' a#b',
+        id="shell hashes that are not comments"
+    ),
+    pytest.param(
+        "SELECT 'it''s -- not' AS a -- comment\n/* block */ FROM t;\n", "sql",
+        "select 'it''s -- not' as a\nfrom t;",
+        id="sql doubled quotes"
+    ),
+    pytest.param(
+        "SELECT a # mysql comment\nFROM t; -- standard\n", "sql",
+        "select a\nfrom t;",
+        id="sql hash comments"
+    ),
+    pytest.param(
+        '<?php\n# hash comment\n$url = "http://x.com/#top"; // slash\n/* block */ $c = \'#f00\'; # trailing\n', "php",
+        '<?php\n$url = "http://x.com/#top";\n$c = \'#f00\';',
+        id="php hash, slash and block comments"
+    ),
+    pytest.param(
+        '#!/usr/bin/env python\n"""Module docstring."""\nclass A:  # note\n    r\'\'\'Class doc.\'\'\'\n', "py",
+        'class a:',
+        id="python module and class docstrings"
+    ),
+    pytest.param(
+        'run(\n    """SELECT 1 # not a comment""",\n    params,\n)\nx = {\n    "key": """value""",\n}\n', "py",
+        'run(\n"""select 1 # not a comment""",\nparams,\n)\nx = {\n"key": """value""",\n}',
+        id="python triple-quoted call argument and value"
+    ),
+    pytest.param(
+        'a = "unterminated # string\nb = 1 # comment\n', "py",
+        'a = "unterminated\nb = 1',
+        id="unterminated string ends at the line"
+    ),
+]
+
+@pytest.mark.parametrize("code, language, expected", RAW_SOURCES)
+def test_normalize_raw_source(code, language, expected):
+    assert normalize_code(code, language) == expected
+
+@pytest.mark.parametrize("family", sorted(_FAMILY_LEXERS))
+def test_lexers_avoid_syntax_newer_than_python_3_10(family):
+    # Possessive quantifiers and atomic groups only compile from Python 3.11
+    pattern = _FAMILY_LEXERS[family].pattern
+    assert not re.search(r'(?<!\\)[+*?}]\+|\(\?>', pattern)
@@ -0,0 +1,51 @@
+from app import codebert_embedder
+from app.pipeline import IngestionPipeline, iter_directory_sources
+from app.vector_store import CodeVectorStore, get_provenances
+
+def test_files_without_chunks_count_as_processed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    (source_dir / "blank.py").write_text("\n\n")
+    (source_dir / "comments.py").write_text("# nothing but a comment\n")
+    # Files that normalize to nothing give no chunks, as with a slow tokenizer
+    monkeypatch.setattr(codebert_embedder, "split_code", lambda code, language=None, normalized=True: [])
+    updates = []
+
+    stats = IngestionPipeline(CodeVectorStore(8), progress_callback=updates.append).run(
+        iter_directory_sources(str(source_dir))
+    )
+
+    assert stats["total_files"] == 2
+    assert stats["processed_files"] == 2
+    assert stats["indexed_chunks"] == 0
+    assert updates[-1] == {"processed_files": 2, "total_files": 2}
+
+def test_identical_chunks_are_embedded_once_and_keep_every_provenance(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    for name in ("a.py", "b.py", "c.py"):
+        (source_dir / name).write_text("def shared():\n    return 1\n")
+    (source_dir / "d.py").write_text("def other():\n    return 2\n")
+    monkeypatch.setattr(codebert_embedder, "split_code", lambda code, language=None, normalized=True: [{
+        "text": code, "token_count": 4, "start_line": 1, "end_line": 2,
+        "chunk_hash": codebert_embedder.get_chunk_hash(code)
+    }])
+    embedded = []
+    def embed_chunks(chunks, reuse_embeddings=None, pool=None):
+        embedded.extend(chunk["text"] for chunk in chunks)
+        return [[1.0] + [float(len(chunk["text"]))] * 7 for chunk in chunks]
+    monkeypatch.setattr(codebert_embedder, "embed_chunks", embed_chunks)
+    store = CodeVectorStore(8)
+
+    stats = IngestionPipeline(store, embed_workers=2, index_batch=1).run(iter_directory_sources(str(source_dir)))
+
+    assert sorted(embedded) == ["def other():\n    return 2\n", "def shared():\n    return 1\n"]
+    assert stats["indexed_chunks"] == 4
+    assert stats["deduplicated_chunks"] == 2
+    assert stats["processed_files"] == 4
+    assert store.index.ntotal == 2
+    shared_hash = codebert_embedder.get_chunk_hash("def shared():\n    return 1\n")
+    shared = next(meta for meta in store.metadata if meta["chunk_hash"] == shared_hash)
+    assert sorted(p["file_name"] for p in get_provenances(shared)) == ["a.py", "b.py", "c.py"]
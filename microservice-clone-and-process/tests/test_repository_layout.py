@@ -0,0 +1,49 @@
+import os
+
+from app import repository_layout
+from app.repository_layout import get_layout_path, list_manifest_files, load_manifest, record_files
+
+def write(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x = 1\n")
+    return path
+
+def test_sharded_and_flat_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository_layout, "REPOSITORY_LAYOUT", "sharded")
+    sharded = get_layout_path(str(tmp_path), "py", "repo_a.py")
+    assert os.path.relpath(sharded, tmp_path).split(os.sep)[0] == "py"
+    assert len(os.path.relpath(sharded, tmp_path).split(os.sep)) == 4
+    assert get_layout_path(str(tmp_path), "py", "repo_a.py") == sharded
+
+    monkeypatch.setattr(repository_layout, "REPOSITORY_LAYOUT", "flat")
+    assert get_layout_path(str(tmp_path), "py", "repo_a.py") == str(tmp_path / "py" / "repo_a.py")
+
+def test_manifest_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository_layout, "REPOSITORY_LAYOUT", "sharded")
+    base_dir = str(tmp_path / "repositories")
+    files = [write(get_layout_path(base_dir, ext, name)) for ext, name in [
+        ("py", "repo_a.py"), ("py", "repo_b.py"), ("js", "repo_c.js")
+    ]]
+
+    record_files(base_dir, added=files)
+    assert sorted(list_manifest_files(base_dir)) == sorted(files)
+    assert load_manifest(base_dir)["file_extensions"] == {"py": 2, "js": 1}
+
+    record_files(base_dir, removed=files[:1])
+    # Cleared in-process cache: the listing is read back from disk
+    repository_layout._manifest_cache.clear()
+    assert sorted(list_manifest_files(base_dir)) == sorted(files[1:])
+    manifest = load_manifest(base_dir)
+    assert manifest["layout"] == "sharded"
+    assert (manifest["file_extensions"], manifest["total_files"]) == ({"py": 1, "js": 1}, 2)
+
+def test_directory_without_manifest_is_adopted(tmp_path, monkeypatch):
+    monkeypatch.setattr(repository_layout, "REPOSITORY_LAYOUT", "flat")
+    base_dir = str(tmp_path / "repositories")
+    existing = write(os.path.join(base_dir, "py", "repo_old.py"))
+    assert list_manifest_files(base_dir) is None and load_manifest(base_dir) is None
+
+    added = write(os.path.join(base_dir, "py", "repo_new.py"))
+    record_files(base_dir, added=[added])
+    assert sorted(list_manifest_files(base_dir)) == sorted([existing, added])
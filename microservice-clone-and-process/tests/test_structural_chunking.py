@@ -0,0 +1,60 @@
+from app.structural_chunking import find_brace_units, find_code_units, split_units
+
+PYTHON = """import os
+
+@cache
+def load(path):
+    return open(path).read()
+
+class Store:
+    def get(self, key):
+        return self.data[key]
+
+    async def put(self, key, value):
+        self.data[key] = value
+"""
+
+JAVA = """package demo;
+
+/** A counter. */
+public class Counter {
+    private int count;
+
+    public void add(String label) {
+        if (label.equals("}")) {
+            return;
+        }
+        count++; // never below zero {
+    }
+}
+"""
+
+def spans(units):
+    return [(unit["start_line"], unit["end_line"], spans(unit["children"])) for unit in units]
+
+def test_python_units_come_from_ast():
+    assert spans(find_code_units(PYTHON, "py")) == [
+        (3, 5, []),
+        (7, 12, [(8, 9, []), (11, 12, [])])
+    ]
+
+def test_normalized_python_units_start_at_definitions():
+    normalized = "import os\n@cache\ndef load(path):\nreturn 1\nclass Store:\ndef get(self):\nreturn 2"
+    assert spans(find_code_units(normalized, "py", normalized=True)) == [(2, 4, []), (5, 5, []), (6, 7, [])]
+
+def test_brace_units_skip_braces_in_strings_and_comments():
+    assert spans(find_brace_units(JAVA)) == [(3, 13, [(7, 12, [(8, 10, [])])])]
+
+def test_unsupported_language_has_no_units():
+    assert find_code_units("key: value", "yaml") is None
+    assert split_units("key: value", "yaml", lambda text: [{"code": text}]) is None
+
+def test_split_units_falls_back_to_nested_units_for_large_units():
+    def chunker(text):
+        # Anything longer than four lines needs several token windows
+        lines = text.split('\n')
+        return [{"code": '\n'.join(lines[i:i + 4])} for i in range(0, len(lines), 4)]
+
+    chunks = split_units(PYTHON, "py", chunker)
+    assert [(chunk["start_line"], chunk["end_line"]) for chunk in chunks] == [(1, 2), (3, 5), (7, 7), (8, 9), (11, 12)]
+    assert chunks[3]["code"] == "    def get(self, key):\n        return self.data[key]"
@@ -0,0 +1,131 @@
+import threading
+import numpy as np
+import pytest
+
+from app import vector_store
+from app.vector_store import CodeVectorStore, get_index_type
+
+DIMENSION = 8
+
+def make_item(i: int, chunk_hash: str, **provenance):
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    vector[i % DIMENSION] = 1.0
+    return {
+        "embedding": vector.tolist(),
+        "chunk": f"chunk {chunk_hash}",
+        "metadata": {"chunk_hash": chunk_hash, "chunk_index": 0, **provenance}
+    }
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return CodeVectorStore(DIMENSION)
+
+def test_mixed_provenance_chunk_keeps_the_provenance_not_matched(store):
+    # The same chunk comes from a cloned repository and from an uploaded archive
+    store.add_embeddings([
+        make_item(0, "shared", file_path="/repos/a.py", repo_url="https://example.com/repo.git"),
+        make_item(0, "shared", file_path="/archives/a.py", archive="upload.zip")
+    ])
+    in_repo = lambda meta: meta.get("repo_url") == "https://example.com/repo.git"
+
+    exported = store.export_embeddings(in_repo)
+    removed = store.remove_embeddings(in_repo)
+
+    assert list(exported) == ["shared"]
+    assert removed == 1
+    assert store.index.ntotal == 1
+    assert store.metadata[0]["file_path"] == "/archives/a.py"
+    assert "repo_url" not in store.metadata[0]
+    assert store.remove_embeddings(in_repo) == 0
+
+def test_chunk_is_removed_with_its_last_provenance(store):
+    store.add_embeddings([
+        make_item(0, "shared", file_path="/repos/a.py", repo_url="https://example.com/repo.git"),
+        make_item(0, "shared", file_path="/archives/a.py", archive="upload.zip"),
+        make_item(1, "other", file_path="/archives/b.py", archive="upload.zip")
+    ])
+
+    assert store.remove_embeddings(lambda meta: meta.get("archive") == "upload.zip") == 2
+    assert store.remove_embeddings(lambda meta: meta.get("repo_url") is not None) == 1
+    assert store.index.ntotal == 0
+    assert store.metadata == []
+
+def test_index_is_converted_outside_the_lock(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_MIN_VECTORS", 4)
+    build_index = vector_store.build_index
+    searches = []
+
+    def build_while_serving(vectors, index_type="flat", params=None):
+        if index_type == "hnsw":
+            # Searches and adds go on while the approximate index is built
+            searcher = threading.Thread(target=lambda: searches.append(store.search(make_item(0, "q")["embedding"])))
+            searcher.start()
+            searcher.join(5)
+            store.add_embeddings([make_item(5, "late", file_path="/repos/late.py")])
+        return build_index(vectors, index_type, params)
+
+    monkeypatch.setattr(vector_store, "build_index", build_while_serving)
+    store.add_embeddings([make_item(i, f"h{i}", file_path=f"/repos/{i}.py") for i in range(4)])
+
+    assert len(searches) == 1 and searches[0]
+    assert get_index_type(store.index) == "hnsw"
+    assert store.index.ntotal == len(store.metadata) == 5
+    assert store.search(make_item(5, "q")["embedding"], top_k=1)[0]["metadata"]["chunk_hash"] == "late"
+
+def make_items(count: int, seed: int = 0):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [
+        {"embedding": vector.tolist(), "chunk": f"chunk {i}", "metadata": {"chunk_hash": f"h{i}", "file_path": f"/repos/{i}.py"}}
+        for i, vector in enumerate(vectors)
+    ]
+
+def top_hashes(store, items):
+    return [
+        store.search(item["embedding"], top_k=1, nprobe=1000, ef_search=1000)[0]["metadata"]["chunk_hash"] for item in items
+    ]
+
+def test_ivf_removes_vectors_by_id_without_rebuilding(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_TYPE", "ivf")
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_MIN_VECTORS", 80)
+    items = make_items(100)
+    store.add_embeddings(items[:80])
+    store.add_embeddings(items[80:])
+    index = store.index
+
+    assert store.remove_embeddings(lambda meta: int(meta["chunk_hash"][1:]) % 3 == 0) == 34
+
+    kept = [item for i, item in enumerate(items) if i % 3]
+    assert store.index is index and index.ntotal == len(store.metadata) == 66
+    assert top_hashes(store, kept) == [item["metadata"]["chunk_hash"] for item in kept]
+    exported = store.export_embeddings(lambda meta: True)
+    assert all(np.allclose(exported[item["metadata"]["chunk_hash"]], item["embedding"]) for item in kept)
+
+    assert store.save() and store.load()
+    store.add_embeddings(make_items(1, seed=1))
+    assert top_hashes(store, kept) == [item["metadata"]["chunk_hash"] for item in kept]
+
+def test_hnsw_skips_removed_vectors_until_they_are_worth_a_rebuild(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(vector_store, "VECTOR_INDEX_MIN_VECTORS", 50)
+    items = make_items(50)
+    store.add_embeddings(items)
+    index = store.index
+    number = lambda meta: int(meta["chunk_hash"][1:])
+
+    assert store.remove_embeddings(lambda meta: number(meta) < 5) == 5
+    assert store.index is index and store.get_stats()["removed_vectors"] == 5
+    results = store.search(items[0]["embedding"], top_k=50)
+    assert len(results) == 45 and all(number(r["metadata"]) >= 5 for r in results)
+    assert top_hashes(store, items[5:]) == [item["metadata"]["chunk_hash"] for item in items[5:]]
+
+    assert store.save() and store.load()
+    assert store.get_stats()["removed_vectors"] == 5
+
+    # 15 of 50 removed is past HNSW_REBUILD_RATIO
+    assert store.remove_embeddings(lambda meta: number(meta) < 15) == 10
+    assert get_index_type(store.index) == "hnsw" and store.index.ntotal == 35
+    assert store.get_stats()["removed_vectors"] == 0
+    assert top_hashes(store, items[15:]) == [item["metadata"]["chunk_hash"] for item in items[15:]]
@@ -0,0 +1,32 @@
+import base64
+
+import numpy as np
+import pytest
+
+from app.wire_format import EMBEDDING_B64_MEDIA_TYPE, accepts_b64, decode_embedding, encode_embedding
+
+def test_round_trip_is_bit_exact():
+    embedding = np.random.default_rng(0).standard_normal(768).astype(np.float32)
+    encoded = encode_embedding(embedding)
+
+    assert len(base64.b64decode(encoded)) == 768 * 4
+    decoded = decode_embedding(encoded)
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, embedding)
+
+def test_float64_input_is_sent_as_float32():
+    assert decode_embedding(encode_embedding([0.1, -2.5])).tolist() == pytest.approx([0.1, -2.5])
+
+@pytest.mark.parametrize("encoded", [
+    base64.b64encode(b"\x00" * 6).decode("ascii"),  # not whole float32 values
+    "",
+    "not base64!",
+])
+def test_malformed_embeddings_are_rejected(encoded):
+    with pytest.raises(ValueError):
+        decode_embedding(encoded)
+
+def test_accept_header_selects_base64():
+    assert accepts_b64(f"application/json, {EMBEDDING_B64_MEDIA_TYPE}; q=0.9")
+    assert not accepts_b64("application/json")
+    assert not accepts_b64("*/*")
@@ -7,8 +7,6 @@ from openai import OpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
-from app.utils import normalize_code
-
 load_dotenv()
 
 # Configure logging
@@ -130,22 +130,11 @@ async def check_plagiarism(request: PlagiarismCheckRequest):
         Plagiarism analysis result with LLM's determination
     """
     try:
-        # First, get embeddings from processing service
+        # Embed the code and search for similar chunks in one call to the processing service
         async with httpx.AsyncClient() as client:
-            embedding_response = await client.post(
-                f"{PROCESSING_SERVICE_URL}/get-embedding", 
-                json={"code": request.code}
-            )
-            embedding_response.raise_for_status()
-            code_embedding = embedding_response.json()['embedding']
-            
-            # Then, search for similar chunks
             similar_response = await client.post(
-                f"{PROCESSING_SERVICE_URL}/search-similar", 
-                json={
-                    "embedding": code_embedding, 
-                    "top_k": request.top_k
-                }
+                f"{PROCESSING_SERVICE_URL}/search-code", 
+                json={"code": request.code, "top_k": request.top_k, "normalize": False}
             )
             similar_response.raise_for_status()
             results = similar_response.json()['similar_chunks']
@@ -1,13 +1,13 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Optional
 import os
 import logging
 import httpx
 from dotenv import load_dotenv
 
 from app.similarity_threshold import SimilarityAnalyzer
-from app.utils import normalize_code 
 
 # Load environment variables
 load_dotenv()
@@ -48,6 +48,7 @@ class CodeSimilarityRequest(BaseModel):
     code: str
     top_k: int = 10
     analyze_plagiarism: bool = True  # Default to true for code similarity checks
+    language: Optional[str] = None  # File extension or language family, used to strip comments correctly
 
 @app.post("/clone-and-process")
 async def clone_repos(request: RepositoryRequest):
@@ -108,22 +109,11 @@ async def generate_embedding(request: CodeSimilarityRequest):
 async def search_similar_code(request: CodeSimilarityRequest):
     """Search for similar code chunks for the provided code using vector store and thresholds."""
     try:
-        # Normalize the code before embedding
-        normalized_code = normalize_code(request.code)
-        
-        # Get embedding from processing service
+        # The processing service normalizes, embeds and searches the code in one call
         async with httpx.AsyncClient() as client:
-            embedding_response = await client.post(
-                f"{PROCESSING_SERVICE_URL}/get-embedding", 
-                json={"code": normalized_code}
-            )
-            embedding_response.raise_for_status()
-            code_embedding = embedding_response.json()['embedding']
-
-            # Search for similar code chunks using the embedding
             search_response = await client.post(
-                f"{PROCESSING_SERVICE_URL}/search-similar", 
-                json={"embedding": code_embedding, "top_k": request.top_k}
+                f"{PROCESSING_SERVICE_URL}/search-code", 
+                json={"code": request.code, "language": request.language, "top_k": request.top_k}
             )
             search_response.raise_for_status()
             similar_chunks = search_response.json()['similar_chunks']